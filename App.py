@@ -1,103 +1,58 @@
 import sqlite3
-import csv
-import bcrypt
-import re
-from datetime import datetime
+import sys
+
+import audit
+import db
+import metrics
+import migrations
+import repository
+import shards
+import write_queue
+from validation import (
+    canonical_category,
+    parse_ticket_ids,
+    validate_date,
+    validate_password,
+    validate_priority,
+    validate_status,
+    validate_username,
+)
+
+# Feature modules (auth with bcrypt and its thread pool, exporter and
+# importer with csv, gzip and json) are imported by the menu actions that
+# use them, so starting the CLI, or just picking Exit, loads only what the
+# menus themselves need.
+#
+# With arguments App.py runs one command instead of the menus:
+#
+#   python App.py update-status Closed --ids 12,15,20-80
+#   python App.py update-status Closed --category Network --current-status Open
+#   python App.py stats | export FILE [options] | import FILE
 
-DB_NAME = "database.db"
 REPORT_FILE = "tickets_report.csv"
-LOG_FILE = "audit_log.txt"
+PARQUET_FILE = "tickets_report.parquet"
+PARQUET_DATASET = "tickets_parquet"
+METRICS_FILE = "metrics.prom"
+PAGE_SIZE = 20
 
 
 # ================= LOGGING =================
 
 def write_log(action, username="System"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] | User: {username} | Action: {action}\n"
-
-    with open(LOG_FILE, "a", encoding="utf-8") as file:
-        file.write(log_entry)
+    audit.log(action, username)
 
 
 # ================= DATABASE =================
 
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-
 def initialize_database():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password BLOB NOT NULL,
-            role TEXT NOT NULL
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            category TEXT NOT NULL,
-            description TEXT NOT NULL,
-            priority TEXT NOT NULL,
-            status TEXT DEFAULT 'Open',
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )
-    """)
-
-    conn.commit()
-    conn.close()
-
-
-# ================= VALIDATION =================
-
-def validate_username(username):
-    return len(username) >= 4 and username.isalnum() and " " not in username
-
-
-def validate_password(password):
-    return (
-        len(password) >= 6
-        and re.search(r"[A-Za-z]", password)
-        and re.search(r"\d", password)
-    )
-
-
-def validate_priority(priority):
-    return priority in ("Low", "Medium", "High")
-
-
-def validate_status(status):
-    return status in ("Open", "In Progress", "Closed")
-
-
-def ticket_exists(ticket_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT ticket_id FROM tickets WHERE ticket_id=?", (ticket_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
-
-
-# ================= SECURITY =================
-
-def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-
-
-def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode(), hashed)
+    migrations.migrate()
 
 
 # ================= REGISTER =================
 
 def register_user():
+    import auth
+
     print("\n=== User Registration ===")
 
     username = input("Enter username: ").strip()
@@ -116,18 +71,10 @@ def register_user():
         print("❌ Role must be Employee or Admin.")
         return
 
-    hashed = hash_password(password)
+    hashed = auth.hash_password(password)
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, hashed, role)
-        )
-
-        conn.commit()
+        write_queue.run(repository.create_user, username, hashed, role)
         print("✅ User registered securely!")
         write_log("User Registered", username)
 
@@ -135,38 +82,23 @@ def register_user():
         print("❌ Username already exists.")
     except Exception as e:
         print("❌ Registration error:", e)
-    finally:
-        conn.close()
 
 
 # ================= LOGIN =================
 
 def login_user():
+    import auth
+
     print("\n=== User Login ===")
 
     username = input("Username: ").strip()
     password = input("Password: ").strip()
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT user_id, password, role FROM users WHERE username=?",
-            (username,)
-        )
-
-        user = cursor.fetchone()
-        conn.close()
-
-        if not user:
-            print("❌ Invalid credentials.")
-            write_log("Failed Login Attempt", username)
-            return
-
-        user_id, stored_password, role = user
+        user = auth.authenticate(username, password)
 
-        if verify_password(password, stored_password):
+        if user:
+            user_id, role = user
             print(f"\n✅ Login successful! Role: {role}")
             write_log("Successful Login", username)
 
@@ -195,41 +127,33 @@ def raise_ticket(user_id, username):
         print("❌ Fields cannot be empty.")
         return
 
+    category = canonical_category(category)
+    if category is None:
+        print("❌ Invalid category.")
+        return
+
     if not validate_priority(priority):
         print("❌ Invalid priority.")
         return
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO tickets (user_id, category, description, priority)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, category, description, priority))
-
-        conn.commit()
-        print("✅ Ticket created successfully!")
+        ticket_id = shards.create_ticket(user_id, category, description, priority)
+        print(f"✅ Ticket {ticket_id} created successfully!")
         write_log("Ticket Created", username)
 
     except Exception as e:
         print("❌ Ticket creation error:", e)
-    finally:
-        conn.close()
+        return
+
+    similar = shards.similar_tickets(description, exclude_id=ticket_id)
+    if similar:
+        print("⚠️ This looks like a duplicate of ticket(s):",
+              ", ".join(str(row[0]) for row in similar))
 
 
 def view_my_tickets(user_id):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT ticket_id, category, description, priority, status
-            FROM tickets WHERE user_id=?
-        """, (user_id,))
-
-        tickets = cursor.fetchall()
-        conn.close()
+        tickets = shards.tickets_for_user(user_id)
 
         if not tickets:
             print("❌ No tickets found.")
@@ -246,41 +170,139 @@ def view_my_tickets(user_id):
         print("❌ Error retrieving tickets:", e)
 
 
-def view_all_tickets():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
+def ask_ticket_filters():
+    print("Filters (press Enter to skip)")
+    status = input("Status (Open/In Progress/Closed): ").strip() or None
+    priority = input("Priority (Low/Medium/High): ").strip().capitalize() or None
+    category = input("Category: ").strip() or None
+    user_id = input("User ID: ").strip() or None
+    include_archived = input("Include archived tickets? (y/N): ").strip().lower() == "y"
+
+    if status and not validate_status(status):
+        print("❌ Invalid status.")
+        return None
 
-        cursor.execute("SELECT * FROM tickets")
-        tickets = cursor.fetchall()
-        conn.close()
+    if priority and not validate_priority(priority):
+        print("❌ Invalid priority.")
+        return None
 
-        if not tickets:
-            print("❌ No tickets available.")
-            return
+    if user_id and not user_id.isdigit():
+        print("❌ User ID must be numeric.")
+        return None
 
-        print("\n--- All Tickets ---")
-        for ticket in tickets:
-            print(f"Ticket ID: {ticket[0]} | User ID: {ticket[1]}")
-            print(f"Category: {ticket[2]} | Priority: {ticket[4]} | Status: {ticket[5]}")
-            print(f"Description: {ticket[3]}")
-            print("-" * 40)
+    return {
+        "status": status,
+        "priority": priority,
+        "category": category,
+        "user_id": int(user_id) if user_id else None,
+        "include_archived": include_archived,
+    }
+
+
+def view_all_tickets():
+    filters = ask_ticket_filters()
+    if filters is None:
+        return
+
+    after_id = before_id = None
+    page = 1
+
+    try:
+        while True:
+            tickets, has_more = shards.list_tickets(
+                after_id=after_id, before_id=before_id, page_size=PAGE_SIZE, **filters
+            )
+
+            if not tickets:
+                print("❌ No tickets available.")
+                return
+
+            # has_more only describes the direction we just moved in
+            has_next = has_more if before_id is None else True
+            has_prev = page > 1
+
+            print(f"\n--- All Tickets (page {page}) ---")
+            for ticket in tickets:
+                print(f"Ticket ID: {ticket[0]} | User ID: {ticket[1]}")
+                print(f"Category: {ticket[2]} | Priority: {ticket[4]} | Status: {ticket[5]}")
+                print(f"Description: {ticket[3]}")
+                print("-" * 40)
+
+            options = []
+            if has_next:
+                options.append("N=Next")
+            if has_prev:
+                options.append("P=Previous")
+            if not options:
+                return
+
+            choice = input(f"{', '.join(options)}, Enter=Back: ").strip().upper()
+
+            if choice == "N" and has_next:
+                after_id, before_id = tickets[-1][0], None
+                page += 1
+            elif choice == "P" and has_prev:
+                after_id, before_id = None, tickets[0][0]
+                page -= 1
+            else:
+                return
 
     except Exception as e:
         print("❌ Error retrieving tickets:", e)
 
 
-def update_ticket_status(username):
-    ticket_id = input("Enter Ticket ID: ").strip()
+def search_tickets():
+    text = input("Search for: ").strip()
 
-    if not ticket_id.isdigit():
-        print("❌ Ticket ID must be numeric.")
+    if not text:
+        print("❌ Search text required.")
         return
 
-    ticket_id = int(ticket_id)
+    page = 1
 
-    if not ticket_exists(ticket_id):
-        print("❌ Ticket does not exist.")
+    try:
+        while True:
+            results, has_more = shards.search_tickets(text, page=page, page_size=PAGE_SIZE)
+
+            if not results:
+                print("❌ No matching tickets.")
+                return
+
+            print(f"\n--- Search Results (page {page}) ---")
+            for ticket_id, user_id, category, priority, status, snippet in results:
+                print(f"Ticket ID: {ticket_id} | User ID: {user_id}")
+                print(f"Category: {category} | Priority: {priority} | Status: {status}")
+                print(f"Match: {snippet}")
+                print("-" * 40)
+
+            options = []
+            if has_more:
+                options.append("N=Next")
+            if page > 1:
+                options.append("P=Previous")
+            if not options:
+                return
+
+            choice = input(f"{', '.join(options)}, Enter=Back: ").strip().upper()
+
+            if choice == "N" and has_more:
+                page += 1
+            elif choice == "P" and page > 1:
+                page -= 1
+            else:
+                return
+
+    except Exception as e:
+        print("❌ Search error:", e)
+
+
+def update_ticket_status(username):
+    text = input("Ticket ID(s) (e.g. 12 or 12,15,20-80): ").strip()
+
+    try:
+        ticket_ids, ranges = parse_ticket_ids(text)
+    except ValueError:
+        print("❌ Ticket IDs must be numbers or ranges like 20-80.")
         return
 
     new_status = input("New Status (Open/In Progress/Closed): ").strip()
@@ -289,80 +311,293 @@ def update_ticket_status(username):
         print("❌ Invalid status.")
         return
 
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
+    if len(ticket_ids) == 1 and not ranges:
+        set_one_ticket_status(ticket_ids[0], new_status, username)
+    else:
+        set_ticket_statuses(new_status, username, ticket_ids, ranges)
 
-        cursor.execute(
-            "UPDATE tickets SET status=? WHERE ticket_id=?",
-            (new_status, ticket_id)
-        )
 
-        conn.commit()
-        print("✅ Status updated successfully!")
+def set_one_ticket_status(ticket_id, new_status, username):
+    try:
+        # The update itself finds live tickets; only a miss looks further
+        if shards.set_ticket_status(ticket_id, new_status):
+            print("✅ Status updated successfully!")
+        elif shards.get_archived_ticket(ticket_id) is None:
+            print("❌ Ticket does not exist.")
+            return
+        elif new_status == "Closed":
+            print("ℹ️ Ticket is archived and already Closed.")
+            return
+        else:
+            # Any other status moves the ticket back out of the archive
+            shards.reopen_ticket(ticket_id, new_status)
+            print("✅ Archived ticket reopened!")
         write_log(f"Updated Ticket {ticket_id} to {new_status}", username)
 
     except Exception as e:
         print("❌ Update error:", e)
-    finally:
-        conn.close()
 
 
-def view_ticket_statistics():
+def describe_selection(ticket_ids, ranges, filters):
+    # For the audit entry, e.g. "IDs 12,15,20-80 where category=Network"
+    ticket_ids = ticket_ids or []
+    parts = [str(ticket_id) for ticket_id in ticket_ids[:10]]
+    if len(ticket_ids) > 10:
+        parts.append(f"...({len(ticket_ids)} listed)")
+    parts += [f"{first}-{last}" for first, last in ranges or ()]
+    conditions = " and ".join(f"{name}={value}" for name, value in filters.items() if value is not None)
+
+    text = f"IDs {','.join(parts)}" if parts else "all tickets"
+    return f"{text} where {conditions}" if conditions else text
+
+
+def set_ticket_statuses(new_status, username, ticket_ids=None, ranges=None, **filters):
+    # Shared by the menu and the update-status command. Returns how many
+    # tickets changed, or None on error. The batch gets one audit entry.
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
+        changed = shards.set_ticket_statuses(new_status, ticket_ids, ranges, **filters)
+    except Exception as e:
+        print("❌ Update error:", e)
+        return None
+
+    print(f"✅ {changed} tickets set to {new_status}.")
+    write_log(
+        f"Updated {changed} Tickets to {new_status} "
+        f"({describe_selection(ticket_ids, ranges, filters)})",
+        username
+    )
+    return changed
+
+
+def claim_next_ticket(username):
+    try:
+        ticket = shards.claim_next(username)
+
+        if ticket is None:
+            print("✅ No open tickets waiting.")
+            return
+
+        ticket_id, user_id, category, description, priority, _ = ticket
+        print(f"✅ Claimed ticket {ticket_id} [{priority}] {category}: {description}")
+        print(f"   Raised by user {user_id}; now In Progress and assigned to you.")
+        write_log(f"Claimed Ticket {ticket_id}", username)
+
+    except Exception as e:
+        print("❌ Claim error:", e)
+
+
+def merge_duplicate_tickets(username):
+    parent_id = input("Parent Ticket ID: ").strip()
+
+    if not parent_id.isdigit():
+        print("❌ Ticket ID must be numeric.")
+        return
+
+    parent_id = int(parent_id)
+    cluster = shards.duplicate_cluster(parent_id)
+
+    if cluster is None:
+        print("❌ Ticket does not exist.")
+        return
+
+    if not cluster:
+        print("✅ No open duplicates found.")
+        return
 
-        cursor.execute("SELECT COUNT(*) FROM tickets")
-        total = cursor.fetchone()[0]
+    print(f"\n{'ID':<10}{'Match':<8}{'Status':<14}Description")
+    for ticket_id, score, status, description in cluster:
+        print(f"{ticket_id:<10}{score:<8.0%}{status:<14}{description}")
 
-        cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='Open'")
-        open_count = cursor.fetchone()[0]
+    confirm = input(f"Merge and close these {len(cluster)} tickets into {parent_id}? (Y/N): ")
+    if confirm.strip().upper() != "Y":
+        print("ℹ️ Nothing merged.")
+        return
+
+    try:
+        merged = shards.merge_tickets(parent_id, [row[0] for row in cluster], username)
+        print(f"✅ Merged {merged} tickets into {parent_id}.")
+        write_log(f"Merged {merged} Tickets into {parent_id}", username)
 
-        cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='In Progress'")
-        progress_count = cursor.fetchone()[0]
+    except Exception as e:
+        print("❌ Merge error:", e)
 
-        cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='Closed'")
-        closed_count = cursor.fetchone()[0]
 
-        conn.close()
+def view_ticket_statistics():
+    try:
+        stats = shards.ticket_statistics()
+        counts = stats["status"]
 
         print("\n===== Ticket Statistics =====")
-        print(f"Total Tickets : {total}")
-        print(f"Open          : {open_count}")
-        print(f"In Progress   : {progress_count}")
-        print(f"Closed        : {closed_count}")
+        print(f"Total Tickets : {stats['Total']}")
+        print(f"Open          : {counts['Open']}")
+        print(f"In Progress   : {counts['In Progress']}")
+        print(f"Closed        : {counts['Closed']}")
+
+        for dimension in ("priority", "category"):
+            print(f"\n--- By {dimension.capitalize()} ---")
+            for value, count in sorted(stats[dimension].items()):
+                print(f"{value:<14}: {count}")
 
     except Exception as e:
         print("❌ Statistics error:", e)
 
 
+def ask_export_filters():
+    print("Filters (press Enter to skip)")
+    status = input("Status (Open/In Progress/Closed): ").strip() or None
+    created_from = input("Created from (YYYY-MM-DD): ").strip() or None
+    created_to = input("Created to (YYYY-MM-DD): ").strip() or None
+    include_archived = input("Include archived tickets? (y/N): ").strip().lower() == "y"
+
+    if status and not validate_status(status):
+        print("❌ Invalid status.")
+        return None
+
+    if not all(validate_date(value) for value in (created_from, created_to) if value):
+        print("❌ Dates must be YYYY-MM-DD.")
+        return None
+
+    return {
+        "status": status,
+        "created_from": created_from,
+        "created_to": created_to,
+        "include_archived": include_archived,
+    }
+
+
+def export_tickets(username):
+    file_format = input("Format (CSV/Parquet) [CSV]: ").strip().lower() or "csv"
+
+    if file_format == "csv":
+        export_tickets_to_csv(username)
+    elif file_format == "parquet":
+        export_tickets_to_parquet(username)
+    else:
+        print("❌ Invalid format.")
+
+
 def export_tickets_to_csv(username):
+    import exporter
+
+    filters = ask_export_filters()
+    if filters is None:
+        return
+
+    compress = input("Compress with gzip? (y/N): ").strip().lower() == "y"
+    report_file = REPORT_FILE + ".gz" if compress else REPORT_FILE
+
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tickets")
-        tickets = cursor.fetchall()
-        conn.close()
+        count, seconds = exporter.export_csv(report_file, compress=compress, **filters)
 
-        if not tickets:
+        if not count:
             print("❌ No tickets to export.")
             return
 
-        with open(REPORT_FILE, "w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Ticket ID", "User ID", "Category", "Description", "Priority", "Status"])
-            writer.writerows(tickets)
-
-        print(f"✅ Tickets exported to {REPORT_FILE}")
+        rate = exporter.rows_per_second(count, seconds)
+        print(f"✅ {count} tickets exported to {report_file} in {seconds:.2f}s ({rate:,.0f} rows/s)")
         write_log("Exported Tickets to CSV", username)
 
     except PermissionError:
-        print("❌ Close tickets_report.csv before exporting.")
+        print(f"❌ Close {report_file} before exporting.")
+    except Exception as e:
+        print("❌ Export error:", e)
+
+
+def export_tickets_to_parquet(username):
+    import exporter
+
+    filters = ask_export_filters()
+    if filters is None:
+        return
+
+    partition_by = input("Partition by (status/month, Enter for none): ").strip().lower() or None
+    if partition_by and partition_by not in exporter.PARTITIONS:
+        print("❌ Invalid partitioning.")
+        return
+
+    incremental = input(
+        f"Only add tickets changed since the last export to {PARQUET_DATASET}/? (y/N): "
+    ).strip().lower() == "y"
+
+    try:
+        # A single file unless partitioned or appended to, which need the
+        # dataset directory and its export state
+        if partition_by or incremental:
+            target = PARQUET_DATASET
+            count, seconds = exporter.export_parquet_dataset(
+                target, partition_by, incremental, **filters
+            )
+        else:
+            target = PARQUET_FILE
+            count, seconds = exporter.write_parquet(target, **filters)
+
+        if not count:
+            print("✅ No tickets changed since the last export." if incremental else "❌ No tickets to export.")
+            return
+
+        rate = exporter.rows_per_second(count, seconds)
+        print(f"✅ {count} tickets exported to {target} in {seconds:.2f}s ({rate:,.0f} rows/s)")
+        write_log("Exported Tickets to Parquet", username)
+
+    except PermissionError:
+        print(f"❌ Close {target} before exporting.")
     except Exception as e:
         print("❌ Export error:", e)
 
 
+def import_tickets_from_file(username):
+    import importer
+
+    path = input("File to import (.csv/.jsonl, optionally .gz): ").strip()
+
+    if not path:
+        print("❌ File path required.")
+        return
+
+    try:
+        inserted, error_count, errors, seconds = importer.import_tickets(path)
+        importer.print_import_report(inserted, error_count, errors, seconds)
+        write_log(f"Imported {inserted} Tickets ({error_count} rejected) from {path}", username)
+        importer.index_imported_tickets()
+
+    except FileNotFoundError:
+        print("❌ File not found.")
+    except Exception as e:
+        print("❌ Import error:", e)
+
+
+def view_diagnostics():
+    print("\n=== Diagnostics (this session) ===")
+
+    statements = metrics.statement_summary(limit=10)
+    if not statements:
+        print("No queries recorded yet.")
+    else:
+        print(f"{'Calls':>7}{'Total ms':>11}{'Mean ms':>10}{'Rows':>9}  Statement")
+        for statement, calls, total_ms, mean_ms, rows in statements:
+            print(f"{calls:>7}{total_ms:>11.1f}{mean_ms:>10.2f}{rows:>9}  {statement[:80]}")
+
+    operations = metrics.operation_summary()
+    if operations:
+        print("\n--- Operations ---")
+        for operation, calls, total_ms, mean_ms in operations:
+            print(f"{operation:<22}{calls:>7} calls{mean_ms:>10.2f} ms avg")
+
+    print(f"\n--- Slow Queries (>= {metrics.SLOW_QUERY_MS:g} ms) ---")
+    if not metrics.slow_queries:
+        print("None.")
+    for entry in list(metrics.slow_queries)[-10:]:
+        print(f"[{entry['timestamp']}] {entry['ms']} ms | {entry['statement'][:80]}")
+        print(f"    Plan: {entry['plan'] or '-'}")
+
+    try:
+        with open(METRICS_FILE, "w", encoding="utf-8") as file:
+            file.write(metrics.render_prometheus())
+        print(f"\n✅ Prometheus metrics written to {METRICS_FILE}")
+    except OSError as e:
+        print("❌ Could not write metrics:", e)
+
+
 # ================= MENUS =================
 
 def employee_menu(user_id, username):
@@ -390,22 +625,37 @@ def admin_menu(username):
     while True:
         print("\n--- Admin Menu ---")
         print("1. View All Tickets")
-        print("2. Update Ticket Status")
-        print("3. View Ticket Statistics")
-        print("4. Export Tickets to CSV")
-        print("5. Logout")
+        print("2. Search Tickets")
+        print("3. Update Ticket Status")
+        print("4. Claim Next Ticket")
+        print("5. Merge Duplicate Tickets")
+        print("6. View Ticket Statistics")
+        print("7. Export Tickets (CSV/Parquet)")
+        print("8. Import Tickets (CSV/JSONL)")
+        print("9. Diagnostics")
+        print("10. Logout")
 
         choice = input("Choose: ").strip()
 
         if choice == "1":
             view_all_tickets()
         elif choice == "2":
-            update_ticket_status(username)
+            search_tickets()
         elif choice == "3":
-            view_ticket_statistics()
+            update_ticket_status(username)
         elif choice == "4":
-            export_tickets_to_csv(username)
+            claim_next_ticket(username)
         elif choice == "5":
+            merge_duplicate_tickets(username)
+        elif choice == "6":
+            view_ticket_statistics()
+        elif choice == "7":
+            export_tickets(username)
+        elif choice == "8":
+            import_tickets_from_file(username)
+        elif choice == "9":
+            view_diagnostics()
+        elif choice == "10":
             write_log("Admin Logout", username)
             print("👋 Logged out.")
             break
@@ -413,9 +663,109 @@ def admin_menu(username):
             print("❌ Invalid choice.")
 
 
+# ================= COMMANDS =================
+
+def run_command(argv):
+    # Non-interactive mode; returns the exit status. Commands act as the
+    # operating system user, the name recorded in the audit log.
+    import argparse
+    import getpass
+
+    import exporter
+
+    parser = argparse.ArgumentParser(
+        prog="App.py", description="IT Helpdesk System (run without arguments for the menus)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update-status", help="set the status of many tickets in one transaction")
+    update.add_argument("new_status", metavar="STATUS", help="Open, In Progress or Closed")
+    update.add_argument("--ids", help="ticket IDs and ranges, e.g. 12,15,20-80")
+    update.add_argument("--current-status", help="only tickets in this status")
+    update.add_argument("--priority", help="only tickets with this priority")
+    update.add_argument("--category", help="only tickets in this category")
+    update.add_argument("--user-id", type=int, help="only tickets raised by this user")
+
+    commands.add_parser("stats", help="print ticket statistics")
+
+    export = commands.add_parser("export", help="export tickets to CSV or Parquet")
+    exporter.add_arguments(export)
+
+    import_parser = commands.add_parser("import", help="import tickets from CSV/JSONL (optionally .gz)")
+    import_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+    username = getpass.getuser()
+    initialize_database()
+
+    if args.command == "update-status":
+        if not validate_status(args.new_status):
+            print("❌ Invalid status.")
+            return 1
+        for value, valid in ((args.current_status, validate_status), (args.priority, validate_priority)):
+            if value is not None and not valid(value):
+                print(f"❌ Invalid filter value: {value}")
+                return 1
+
+        ticket_ids = ranges = None
+        if args.ids:
+            try:
+                ticket_ids, ranges = parse_ticket_ids(args.ids)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return 1
+        elif not any(value is not None for value in (
+            args.current_status, args.priority, args.category, args.user_id
+        )):
+            print("❌ Select tickets with --ids and/or a filter.")
+            return 1
+
+        changed = set_ticket_statuses(
+            args.new_status, username, ticket_ids, ranges, status=args.current_status,
+            priority=args.priority, category=args.category, user_id=args.user_id
+        )
+        return 1 if changed is None else 0
+
+    if args.command == "stats":
+        view_ticket_statistics()
+        return 0
+
+    if args.command == "export":
+        if args.status is not None and not validate_status(args.status):
+            print("❌ Invalid status.")
+            return 1
+        if not all(validate_date(value) for value in (args.created_from, args.created_to) if value is not None):
+            print("❌ Dates must be YYYY-MM-DD.")
+            return 1
+        try:
+            count, seconds = exporter.export_from_args(args)
+        except Exception as e:
+            print("❌ Export error:", e)
+            return 1
+        rate = exporter.rows_per_second(count, seconds)
+        print(f"✅ {count} tickets exported to {args.output} in {seconds:.2f}s ({rate:,.0f} rows/s)")
+        write_log(f"Exported {count} Tickets to {args.output}", username)
+        return 0
+
+    import importer
+
+    try:
+        inserted, error_count, errors, seconds = importer.import_tickets(args.path)
+    except FileNotFoundError:
+        print("❌ File not found.")
+        return 1
+    except Exception as e:
+        print("❌ Import error:", e)
+        return 1
+    importer.print_import_report(inserted, error_count, errors, seconds)
+    write_log(f"Imported {inserted} Tickets ({error_count} rejected) from {args.path}", username)
+    importer.index_imported_tickets()
+    return 0
+
+
 # ================= MAIN =================
 
-def main():
+def run_menus():
     initialize_database()
 
     while True:
@@ -433,10 +783,19 @@ def main():
         elif choice == "3":
             write_log("System Exit")
             print("👋 Exiting system.")
-            break
+            return 0
         else:
             print("❌ Invalid option.")
 
 
+def main():
+    status = run_command(sys.argv[1:]) if len(sys.argv) > 1 else run_menus()
+
+    write_queue.shutdown()
+    audit.shutdown()
+    db.close_all()
+    return status
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import json
+import secrets
+import signal
+import sqlite3
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import audit
+import auth
+import db
+import exporter
+import metrics
+import migrations
+import repository
+import shards
+import write_queue
+from validation import (
+    canonical_category,
+    validate_date,
+    validate_password,
+    validate_priority,
+    validate_status,
+    validate_username,
+)
+
+HOST = "127.0.0.1"
+PORT = 8600
+
+# SQLite and bcrypt calls run here so the event loop never blocks on them
+DB_WORKERS = 8
+SESSION_TTL = 8 * 60 * 60
+SESSION_PURGE_INTERVAL = 60
+MAX_PAGE_SIZE = 500
+MAX_BODY_BYTES = 1024 * 1024
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized",
+    403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ================= SESSIONS =================
+
+_sessions = {}
+_next_purge = 0.0
+
+
+def _purge_sessions(now):
+    # Expired tokens are otherwise only dropped when presented again; sweep
+    # at most once per SESSION_PURGE_INTERVAL
+    global _next_purge
+    if now < _next_purge:
+        return
+    _next_purge = now + SESSION_PURGE_INTERVAL
+    for token in [token for token, session in _sessions.items() if session[0] < now]:
+        del _sessions[token]
+
+
+def _create_session(user_id, username, role):
+    _purge_sessions(time.monotonic())
+    token = secrets.token_urlsafe(24)
+    _sessions[token] = (time.monotonic() + SESSION_TTL, user_id, username, role)
+    return token
+
+
+def _session(request, role=None):
+    header = request["headers"].get("authorization", "")
+    token = header[7:] if header.lower().startswith("bearer ") else None
+    session = _sessions.get(token)
+
+    if session is None or session[0] < time.monotonic():
+        _sessions.pop(token, None)
+        raise ApiError(401, "Login required")
+
+    _, user_id, username, user_role = session
+    if role is not None and user_role != role:
+        raise ApiError(403, f"{role} role required")
+    return user_id, username, user_role
+
+
+# ================= HANDLERS =================
+
+def _field(body, name, required=True):
+    # Every field is text; a number or object is rejected here rather than
+    # failing in string handling after the write
+    value = body.get(name)
+    if value is not None and not isinstance(value, str):
+        raise ApiError(400, f"'{name}' must be a string")
+    if value is not None:
+        value = value.strip()
+    if required and not value:
+        raise ApiError(400, f"'{name}' is required")
+    return value
+
+
+async def register(api, request):
+    body = request["json"]
+    username = _field(body, "username")
+    password = _field(body, "password")
+    role = _field(body, "role").capitalize()
+
+    if not validate_username(username):
+        raise ApiError(400, "Username must be 4+ characters, no spaces, alphanumeric only")
+    if not validate_password(password):
+        raise ApiError(400, "Password must be 6+ characters and contain letters & numbers")
+    if role not in ("Employee", "Admin"):
+        raise ApiError(400, "Role must be Employee or Admin")
+
+    hashed = await api.run(auth.hash_password, password)
+    try:
+        user_id = await api.write(repository.create_user, username, hashed, role)
+    except sqlite3.IntegrityError:
+        raise ApiError(409, "Username already exists")
+
+    audit.log("User Registered (API)", username)
+    return 201, {"user_id": user_id, "username": username, "role": role}
+
+
+async def login(api, request):
+    body = request["json"]
+    username = _field(body, "username")
+    password = _field(body, "password")
+
+    user = await api.run(auth.authenticate, username, password)
+    if user is None:
+        audit.log("Failed Login Attempt (API)", username)
+        raise ApiError(401, "Invalid credentials")
+
+    user_id, role = user
+    audit.log("Successful Login (API)", username)
+    return 200, {"token": _create_session(user_id, username, role), "user_id": user_id, "role": role}
+
+
+async def raise_ticket(api, request):
+    user_id, username, _ = _session(request)
+    body = request["json"]
+    category = canonical_category(_field(body, "category"))
+    description = _field(body, "description")
+    priority = _field(body, "priority").capitalize()
+
+    if category is None:
+        raise ApiError(400, "Invalid category")
+    if not validate_priority(priority):
+        raise ApiError(400, "Invalid priority")
+
+    ticket_id = await api.write(
+        shards.insert_ticket, user_id, category, description, priority,
+        db_name=shards.for_user(user_id)
+    )
+    audit.log("Ticket Created (API)", username, ticket_id=ticket_id)
+    similar = await api.run(shards.similar_tickets, description, ticket_id)
+    return 201, {
+        "ticket_id": ticket_id,
+        "status": "Open",
+        "possible_duplicates": [row[0] for row in similar],
+    }
+
+
+async def list_tickets(api, request):
+    user_id, _, role = _session(request)
+    query = request["query"]
+    filters = {
+        "status": query.get("status"),
+        "priority": query.get("priority"),
+        "category": query.get("category"),
+        "user_id": int(query["user_id"]) if query.get("user_id", "").isdigit() else None,
+        "include_archived": query.get("include_archived") in ("1", "true"),
+    }
+
+    # Employees only ever see their own tickets
+    if role != "Admin":
+        filters["user_id"] = user_id
+
+    if filters["status"] and not validate_status(filters["status"]):
+        raise ApiError(400, "Invalid status")
+    if filters["priority"] and not validate_priority(filters["priority"]):
+        raise ApiError(400, "Invalid priority")
+
+    try:
+        after_id = int(query["after_id"]) if "after_id" in query else None
+        before_id = int(query["before_id"]) if "before_id" in query else None
+        page_size = int(query.get("page_size", repository.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, "after_id, before_id and page_size must be integers")
+    # A negative LIMIT would mean no limit at all
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ApiError(400, f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+
+    rows, has_more = await api.run(
+        lambda: shards.list_tickets(
+            after_id=after_id, before_id=before_id, page_size=page_size, **filters
+        )
+    )
+    return 200, {
+        "tickets": [dict(zip(repository.TICKET_COLUMNS, row)) for row in rows],
+        "has_more": has_more,
+    }
+
+
+async def update_status(api, request, ticket_id):
+    _, username, _ = _session(request, role="Admin")
+    status = _field(request["json"], "status")
+
+    if not validate_status(status):
+        raise ApiError(400, "Invalid status")
+
+    shard = shards.for_ticket(ticket_id)
+    if not await api.write(repository.set_ticket_status, ticket_id, status, db_name=shard):
+        # Not in the hot table. Archived tickets are already Closed; any
+        # other status moves them back.
+        if status == "Closed":
+            found = await api.run(shards.get_archived_ticket, ticket_id) is not None
+        else:
+            found = await api.run(shards.reopen_ticket, ticket_id, status)
+        if not found:
+            raise ApiError(404, "Ticket does not exist")
+
+    audit.log(f"Updated Ticket {ticket_id} to {status} (API)", username)
+    return 200, {"ticket_id": ticket_id, "status": status}
+
+
+async def claim_ticket(api, request):
+    _, username, _ = _session(request, role="Admin")
+    ticket = await api.run(shards.claim_next, username)
+
+    if ticket is None:
+        raise ApiError(404, "No open tickets waiting")
+
+    audit.log(f"Claimed Ticket {ticket[0]} (API)", username)
+    return 200, dict(zip(repository.TICKET_COLUMNS, ticket))
+
+
+async def ticket_duplicates(api, request, ticket_id):
+    _session(request, role="Admin")
+    cluster = await api.run(shards.duplicate_cluster, ticket_id)
+
+    if cluster is None:
+        raise ApiError(404, "Ticket does not exist")
+
+    return 200, [
+        {"ticket_id": child_id, "similarity": round(score, 3), "status": status,
+         "description": description}
+        for child_id, score, status, description in cluster
+    ]
+
+
+async def merge_duplicates(api, request, ticket_id):
+    # Closes the given tickets as duplicates of ticket_id; without a
+    # ticket_ids list, the whole duplicate cluster is merged
+    _, username, _ = _session(request, role="Admin")
+    child_ids = request["json"].get("ticket_ids")
+
+    if child_ids is None:
+        cluster = await api.run(shards.duplicate_cluster, ticket_id)
+        child_ids = [row[0] for row in cluster or ()]
+    elif not isinstance(child_ids, list) or not all(isinstance(value, int) for value in child_ids):
+        raise ApiError(400, "'ticket_ids' must be a list of integers")
+
+    try:
+        merged = await api.run(shards.merge_tickets, ticket_id, child_ids, username)
+    except ValueError:
+        raise ApiError(404, "Ticket does not exist")
+
+    audit.log(f"Merged {merged} Tickets into {ticket_id} (API)", username)
+    return 200, {"ticket_id": ticket_id, "merged": merged}
+
+
+async def statistics(api, request):
+    _session(request, role="Admin")
+    return 200, await api.run(shards.ticket_statistics)
+
+
+async def export(api, request):
+    _, username, _ = _session(request, role="Admin")
+    query = request["query"]
+    filters = {
+        "status": query.get("status"),
+        "created_from": query.get("created_from"),
+        "created_to": query.get("created_to"),
+        "include_archived": query.get("include_archived") in ("1", "true"),
+    }
+
+    if filters["status"] and not validate_status(filters["status"]):
+        raise ApiError(400, "Invalid status")
+    if not all(validate_date(value) for value in (filters["created_from"], filters["created_to"]) if value):
+        raise ApiError(400, "Dates must be YYYY-MM-DD")
+
+    # Export into a temp file on a worker thread, then stream it out
+    report = tempfile.TemporaryFile()
+    count, _ = await api.run(lambda: exporter.write_csv(report, **filters))
+    audit.log("Exported Tickets to CSV (API)", username, rows=count)
+    return 200, report
+
+
+async def prometheus_metrics(api, request):
+    # Unauthenticated, like most scrape targets; the API binds to
+    # localhost by default and statements carry no parameter values.
+    return 200, metrics.render_prometheus()
+
+
+ROUTES = {
+    ("POST", "/register"): register,
+    ("POST", "/login"): login,
+    ("POST", "/tickets"): raise_ticket,
+    ("GET", "/tickets"): list_tickets,
+    ("POST", "/tickets/claim"): claim_ticket,
+    ("GET", "/statistics"): statistics,
+    ("GET", "/export"): export,
+    ("GET", "/metrics"): prometheus_metrics,
+}
+
+
+# ================= HTTP =================
+
+class Api:
+    def __init__(self, workers=DB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-db")
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def write(self, func, *args, db_name=None):
+        # Writes go through the group-commit queue (of db_name's shard when
+        # given); awaiting its future directly keeps executor threads free
+        # for reads meanwhile.
+        return await asyncio.wrap_future(write_queue.get_queue(db_name).submit(func, *args))
+
+    def route(self, method, path):
+        handler = ROUTES.get((method, path))
+        if handler is not None:
+            return handler, ()
+
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "tickets" and parts[1].isdigit():
+            if method == "PATCH":
+                return update_status, (int(parts[1]),)
+            raise ApiError(405, "Method not allowed")
+
+        if len(parts) == 3 and parts[0] == "tickets" and parts[1].isdigit():
+            handlers = {
+                ("GET", "duplicates"): ticket_duplicates,
+                ("POST", "merge"): merge_duplicates,
+            }
+            if (method, parts[2]) in handlers:
+                return handlers[(method, parts[2])], (int(parts[1]),)
+            if parts[2] in ("duplicates", "merge"):
+                raise ApiError(405, "Method not allowed")
+
+        if any(route_path == path for _, route_path in ROUTES):
+            raise ApiError(405, "Method not allowed")
+        raise ApiError(404, "Not found")
+
+    async def read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Body must be a JSON object")
+
+        return {
+            "method": method,
+            "path": url.path,
+            "query": dict(parse_qsl(url.query)),
+            "headers": headers,
+            "json": payload,
+        }
+
+    async def write_response(self, writer, status, result, keep_alive):
+        connection = "keep-alive" if keep_alive else "close"
+
+        if hasattr(result, "read"):
+            size = result.seek(0, 2)
+            result.seek(0)
+            writer.write((
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Type: text/csv; charset=utf-8\r\n"
+                'Content-Disposition: attachment; filename="tickets_report.csv"\r\n'
+                f"Content-Length: {size}\r\nConnection: {connection}\r\n\r\n"
+            ).encode())
+            try:
+                while chunk := result.read(EXPORT_CHUNK_BYTES):
+                    writer.write(chunk)
+                    await writer.drain()
+            finally:
+                result.close()
+            return
+
+        if isinstance(result, str):
+            body, content_type = result.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(result).encode(), "application/json"
+        writer.write((
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n"
+        ).encode() + body)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request["headers"].get("connection", "").lower() != "close"
+                    handler, args = self.route(request["method"], request["path"])
+                    status, result = await handler(self, request, *args)
+                except ApiError as e:
+                    status, result = e.status, {"error": e.message}
+                except (ValueError, asyncio.LimitOverrunError):
+                    status, result, keep_alive = 400, {"error": "Malformed request"}, False
+                except Exception:
+                    # The details go to the server log, not to the client
+                    traceback.print_exc()
+                    status, result = 500, {"error": "Internal server error"}
+
+                await self.write_response(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT, ready=None):
+        # SIGTERM cancels the server task so shutdown runs the normal
+        # cleanup path instead of raising inside whatever callback is active.
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel
+        )
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IT Helpdesk JSON API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=DB_WORKERS)
+    args = parser.parse_args()
+
+    migrations.migrate()
+    # Build the dispatch heap before serving rather than on the first claim
+    shards.dispatch_queues()
+    api = Api(workers=args.workers)
+
+    try:
+        asyncio.run(api.serve(
+            args.host, args.port,
+            ready=lambda port: print(f"✅ Helpdesk API listening on http://{args.host}:{port}", flush=True)
+        ))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("👋 API stopped.")
+    finally:
+        api.close()
+        write_queue.shutdown()
+        audit.shutdown()
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
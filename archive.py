@@ -0,0 +1,283 @@
+import os
+import time
+from contextlib import contextmanager
+
+import db
+import migrations
+import rollups
+import write_queue
+
+# Closed tickets older than ARCHIVE_AFTER_DAYS move out of the hot `tickets`
+# table into a separate SQLite file, attached to every pooled connection as
+# `archive`. Listings, statistics and search read only the hot table; pass
+# include_archived=True to read through the `all_tickets` union view. The
+# archive keeps category, priority and status as text, so moves go through
+# the main `tickets` view (names) and write ticket_rows (codes).
+
+ARCHIVE_DB = os.environ.get("HELPDESK_ARCHIVE_DB")
+ARCHIVE_AFTER_DAYS = 90
+BATCH_SIZE = 1000
+# Pause between batches so interactive writers get the lock in between
+BATCH_PAUSE = 0.05
+
+COLUMNS = (
+    "ticket_id", "user_id", "category", "description", "priority", "status",
+    "assigned_to", "created_at", "updated_at", "closed_at",
+)
+_COLUMN_LIST = ", ".join(COLUMNS)
+
+
+def archive_path(db_name):
+    return ARCHIVE_DB or os.path.splitext(db_name)[0] + "_archive.db"
+
+
+@db.on_open
+def attach(conn, db_name):
+    # Run as a script this module is loaded twice (as __main__, and as
+    # archive by shards), so the hook can run twice on one connection
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list")):
+        return
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path(db_name),))
+    conn.execute("PRAGMA archive.journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive.tickets (
+            ticket_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            status TEXT NOT NULL,
+            assigned_to INTEGER,
+            created_at TEXT,
+            updated_at TEXT,
+            closed_at TEXT,
+            archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Archives created before tickets had closed_at
+    if "closed_at" not in {row[1] for row in conn.execute("PRAGMA archive.table_info(tickets)")}:
+        conn.execute("ALTER TABLE archive.tickets ADD COLUMN closed_at TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archive.idx_archived_tickets_user_id ON tickets(user_id)"
+    )
+    # Id ranges of a move between the files that has not finished yet
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive.moving (
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL
+        )
+    """)
+
+
+@contextmanager
+def connection(db_name=None):
+    # A pooled connection with the all_tickets view. Views cannot span
+    # databases unless they are TEMP, so each connection gets its own copy,
+    # made on first use rather than at open so it never sees a pre-migration
+    # tickets table.
+    with db.connection(db_name) as conn:
+        conn.execute(f"""
+            CREATE TEMP VIEW IF NOT EXISTS all_tickets AS
+            SELECT {_COLUMN_LIST} FROM main.tickets
+            UNION ALL
+            SELECT {_COLUMN_LIST} FROM archive.tickets
+        """)
+        yield conn
+
+
+def union_query(columns, where="", archived_where=None):
+    # The all_tickets union as an inline compound SELECT. Unlike the view,
+    # ORDER BY ticket_id on this merges two index scans instead of sorting
+    # every row. `where` applies to both halves (pass its params twice)
+    # unless archived_where is given for the archive's half.
+    return (
+        f"SELECT {columns} FROM main.tickets {where} "
+        f"UNION ALL SELECT {columns} FROM archive.tickets "
+        f"{where if archived_where is None else archived_where}"
+    )
+
+
+# ================= ARCHIVING =================
+
+_ARCHIVABLE = "status_code=3 AND COALESCE(closed_at, updated_at, created_at) < ?"
+
+
+# Under WAL a transaction spanning attached files commits each file on its
+# own, main first, so one transaction that deletes from one file and inserts
+# into the other could lose the tickets in a crash. Moves instead copy first,
+# recording the id range in archive.moving in the same archive transaction,
+# then delete the source in a transaction of its own. Until the range is
+# cleared a ticket can be in both files; the main copy is the live one.
+#
+# Each phase is its own write_queue.run, so it commits before the next one
+# starts. A queued write joins the batch's transaction, so the functions
+# running the phases must not themselves be queued.
+
+def _drop_moved_copies(first_id, last_id):
+    # Last phase of a move: archived copies of tickets still live in main
+    # are dropped (moved back, or changed before the delete), and the range
+    # is cleared
+    with db.transaction() as conn:
+        conn.execute("""
+            DELETE FROM archive.tickets WHERE ticket_id BETWEEN ? AND ?
+              AND ticket_id IN (SELECT ticket_id FROM main.ticket_rows WHERE ticket_id BETWEEN ? AND ?)
+        """, (first_id, last_id, first_id, last_id))
+        conn.execute("DELETE FROM archive.moving WHERE first_id=? AND last_id=?", (first_id, last_id))
+
+
+def _copy_batch(cutoff, batch_size):
+    # First phase: copies the next batch of archivable tickets and records
+    # its id range. Returns the range, or None once there are none left. A
+    # range a crash left unfinished is returned first.
+    with db.transaction() as conn:
+        moving = conn.execute("SELECT first_id, last_id FROM archive.moving LIMIT 1").fetchone()
+        if moving is not None:
+            return moving
+
+        ids = [row[0] for row in conn.execute(
+            f"SELECT ticket_id FROM main.ticket_rows WHERE {_ARCHIVABLE} ORDER BY ticket_id LIMIT ?",
+            (cutoff, batch_size)
+        )]
+        if not ids:
+            return None
+
+        moving = (ids[0], ids[-1])
+        conn.execute(f"""
+            INSERT OR REPLACE INTO archive.tickets ({_COLUMN_LIST})
+            SELECT {_COLUMN_LIST} FROM main.tickets
+            WHERE {_ARCHIVABLE} AND ticket_id BETWEEN ? AND ?
+        """, (cutoff, *moving))
+        conn.execute("INSERT INTO archive.moving (first_id, last_id) VALUES (?, ?)", moving)
+        return moving
+
+
+def _delete_copied(cutoff, first_id, last_id):
+    # Second phase: deletes the tickets whose archived copy is up to date
+    # (fewer than were copied if some changed meanwhile) and returns how
+    # many. The rollups read changes from main alone, so they catch up in
+    # the same transaction.
+    with db.transaction() as conn:
+        rollups.fold_changes(conn)
+        return conn.execute(f"""
+            DELETE FROM main.ticket_rows
+            WHERE {_ARCHIVABLE} AND ticket_id BETWEEN ? AND ?
+              AND EXISTS (SELECT 1 FROM archive.tickets a WHERE a.ticket_id=ticket_rows.ticket_id
+                          AND a.updated_at IS ticket_rows.updated_at)
+        """, (cutoff, first_id, last_id)).rowcount
+
+
+def archive_closed_tickets(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, pause=BATCH_PAUSE):
+    # Moves tickets Closed for more than `older_than_days` (by closed_at,
+    # falling back to updated_at) into the archive, a batch at a time with
+    # short write transactions. Returns (tickets moved, seconds).
+    start = time.perf_counter()
+
+    with db.connection() as conn:
+        cutoff = conn.execute(
+            "SELECT datetime('now', ?)", (f"-{int(older_than_days)} days",)
+        ).fetchone()[0]
+
+    moved = 0
+    while (moving := write_queue.run(_copy_batch, cutoff, batch_size)) is not None:
+        moved += write_queue.run(_delete_copied, cutoff, *moving)
+        write_queue.run(_drop_moved_copies, *moving)
+        time.sleep(pause)
+
+    return moved, time.perf_counter() - start
+
+
+def _mark_reopening(ticket_id):
+    with db.transaction() as conn:
+        if conn.execute("SELECT 1 FROM archive.tickets WHERE ticket_id=?", (ticket_id,)).fetchone() is None:
+            return False
+        conn.execute("INSERT INTO archive.moving (first_id, last_id) VALUES (?, ?)", (ticket_id, ticket_id))
+        return True
+
+
+def _insert_reopened(ticket_id, status):
+    replaced = {
+        "category": "main.ticket_categories.code",
+        "priority": "main.ticket_priorities.code",
+        "status": "(SELECT code FROM main.ticket_statuses WHERE name=?)",
+        "updated_at": "CURRENT_TIMESTAMP",
+        "closed_at": "NULL",
+    }
+    select = ", ".join(replaced.get(column, column) for column in COLUMNS)
+    columns = ", ".join(column + "_code" if column in ("category", "priority", "status") else column
+                        for column in COLUMNS)
+
+    with db.transaction() as conn:
+        # LEFT JOINs: a name missing from the lookups fails the insert
+        conn.execute(
+            f"INSERT INTO main.ticket_rows ({columns}) "
+            f"SELECT {select} FROM archive.tickets "
+            "LEFT JOIN main.ticket_categories ON main.ticket_categories.name=category "
+            "LEFT JOIN main.ticket_priorities ON main.ticket_priorities.name=priority "
+            "WHERE ticket_id=?",
+            (status, ticket_id)
+        )
+
+
+def reopen_ticket(ticket_id, status="Open"):
+    # Moves an archived ticket back into the hot table with the new status,
+    # in the same phases as archiving. Returns 1 if it was archived,
+    # otherwise 0.
+    if not write_queue.run(_mark_reopening, ticket_id):
+        return 0
+    try:
+        write_queue.run(_insert_reopened, ticket_id, status)
+    finally:
+        write_queue.run(_drop_moved_copies, ticket_id, ticket_id)
+    return 1
+
+
+def get_archived_ticket(ticket_id):
+    with db.connection() as conn:
+        return conn.execute(
+            "SELECT ticket_id, user_id, category, description, priority, status "
+            "FROM archive.tickets WHERE ticket_id=?",
+            (ticket_id,)
+        ).fetchone()
+
+
+def archived_count():
+    with db.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM archive.tickets").fetchone()[0]
+
+
+def main():
+    import argparse
+
+    import shards  # imports this module
+
+    parser = argparse.ArgumentParser(description="Move old closed tickets into the archive database")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive tickets closed for longer than this")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--reopen", type=int, metavar="TICKET_ID",
+                        help="move one archived ticket back and set it Open")
+    args = parser.parse_args()
+
+    migrations.migrate()
+
+    if args.reopen is not None:
+        if shards.reopen_ticket(args.reopen):
+            print(f"✅ Ticket {args.reopen} reopened.")
+        else:
+            print(f"❌ Ticket {args.reopen} is not archived.")
+    else:
+        # Each shard archives into its own file
+        for shard, (moved, seconds) in zip(shards.databases(), shards.fan_out(
+            archive_closed_tickets, args.days, args.batch_size
+        )):
+            with db.using(shard):
+                archived = archived_count()
+            print(f"✅ Archived {moved} tickets in {seconds:.1f}s "
+                  f"({archived} in {archive_path(shard)})")
+
+    write_queue.shutdown()
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
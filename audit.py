@@ -0,0 +1,203 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+
+import metrics
+
+LOG_FILE = os.environ.get("HELPDESK_AUDIT_LOG", "audit_log.txt")
+JSON_LOG_FILE = os.path.splitext(LOG_FILE)[0] + ".jsonl"
+
+# Set HELPDESK_AUDIT_JSONL=1 to also write JSON Lines next to the text log
+WRITE_JSONL = os.environ.get("HELPDESK_AUDIT_JSONL") == "1"
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+
+# ROTATE is "size" (keep BACKUP_COUNT numbered files of up to MAX_BYTES)
+# or "daily" (one dated file per day, keeping the last BACKUP_COUNT days)
+ROTATE = os.environ.get("HELPDESK_AUDIT_ROTATE", "size")
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 7
+
+
+# ================= FILES =================
+
+class RotatingFile:
+    def __init__(self, path, rotate=ROTATE, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = None
+        self._day = None
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        if os.path.exists(self.path) and self._file.tell():
+            self._day = date.fromtimestamp(os.path.getmtime(self.path))
+        else:
+            self._day = date.today()
+
+    def _rollover(self):
+        self.close()
+
+        if self.rotate == "daily":
+            os.replace(self.path, f"{self.path}.{self._day.isoformat()}")
+            old = sorted(glob.glob(f"{glob.escape(self.path)}.????-??-??"))
+            for path in old[:-self.backup_count]:
+                os.remove(path)
+        else:
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+
+        self._open()
+
+    def write(self, text):
+        if self._file is None:
+            self._open()
+
+        if self._file.tell():
+            if self.rotate == "daily":
+                due = date.today() != self._day
+            else:
+                due = self._file.tell() + len(text) > self.max_bytes
+            if due:
+                self._rollover()
+
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# ================= WRITER =================
+
+_STOP = object()
+
+
+class AuditWriter:
+    # Callers only enqueue records; one background thread drains the queue
+    # and writes them in batches, flushing when BATCH_SIZE records are waiting
+    # or the oldest has waited FLUSH_INTERVAL seconds, whichever comes first.
+    def __init__(self, log_file=LOG_FILE, json_log_file=None,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._text = RotatingFile(log_file)
+        self._json = RotatingFile(json_log_file) if json_log_file else None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, record):
+        self._queue.put(record)
+
+    def flush(self):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _write(self, batch):
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        self._text.write("".join(
+            f"[{record['timestamp']}] | User: {record['user']} | Action: {record['action']}\n"
+            for record in batch
+        ))
+        if self._json is not None:
+            self._json.write("".join(json.dumps(record) + "\n" for record in batch))
+
+        metrics.observe(metrics.OPERATION_SECONDS, "audit_write_batch", time.perf_counter() - start)
+        batch.clear()
+
+    def _run(self):
+        batch = []
+        # When the oldest buffered record is due on disk; None while empty
+        deadline = None
+
+        while True:
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(batch)
+                deadline = None
+                continue
+
+            if item is _STOP:
+                break
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                deadline = None
+                item.set()
+                continue
+
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                deadline = None
+
+        self._write(batch)
+        self._text.close()
+        if self._json is not None:
+            self._json.close()
+
+
+# ================= API =================
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(LOG_FILE, JSON_LOG_FILE if WRITE_JSONL else None)
+        return _writer
+
+
+@metrics.timed("audit_log")
+def log(action, username="System", **details):
+    record = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "user": username,
+        "action": action,
+    }
+    record.update(details)
+    get_writer().log(record)
+
+
+def flush():
+    if _writer is not None:
+        _writer.flush()
+
+
+def shutdown():
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+atexit.register(shutdown)
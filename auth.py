@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import metrics
+import repository
+import write_queue
+
+# Work factor for new hashes; existing hashes at a different cost are
+# upgraded (or downgraded) transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("HELPDESK_BCRYPT_ROUNDS", "12"))
+
+# bcrypt releases the GIL, so a small thread pool gives real parallelism
+# while bounding how many CPU-heavy hashes run at once during a login burst.
+AUTH_WORKERS = int(os.environ.get("HELPDESK_AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+
+_timing_lock = threading.Lock()
+# Running average of how long a verification at _verify_rounds takes, so
+# unknown-user logins can take as long without doing the work
+_verify_seconds = None
+_verify_rounds = None
+
+
+# ================= HASHING =================
+
+def _to_bytes(value):
+    return value if isinstance(value, bytes) else value.encode()
+
+
+def _record_verify_time(rounds, elapsed):
+    global _verify_seconds, _verify_rounds
+    with _timing_lock:
+        if _verify_seconds is None or _verify_rounds != rounds:
+            _verify_seconds, _verify_rounds = elapsed, rounds
+        else:
+            _verify_seconds = 0.9 * _verify_seconds + 0.1 * elapsed
+
+
+def _seed_verify_time(rounds):
+    # Hashing costs the same bcrypt work as checking a hash, so one timed
+    # hash stands in until real logins are measured
+    start = time.perf_counter()
+    bcrypt.hashpw(b"seed", bcrypt.gensalt(rounds))
+    _record_verify_time(rounds, time.perf_counter() - start)
+
+
+def _timed_checkpw(password, hashed):
+    start = time.perf_counter()
+    result = bcrypt.checkpw(password, hashed)
+    elapsed = time.perf_counter() - start
+
+    if hash_cost(hashed) == BCRYPT_ROUNDS:
+        _record_verify_time(BCRYPT_ROUNDS, elapsed)
+    return result
+
+
+# Seeded on the pool at startup, so the first unknown-user login has a
+# time to wait for without hashing on the request thread
+_seeding = _executor.submit(_seed_verify_time, BCRYPT_ROUNDS)
+
+
+@metrics.timed("auth_hash_password")
+def hash_password(password, rounds=None):
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    return _executor.submit(bcrypt.hashpw, password.encode(), salt).result()
+
+
+@metrics.timed("auth_verify_password")
+def verify_password(password, hashed):
+    return _executor.submit(_timed_checkpw, password.encode(), _to_bytes(hashed)).result()
+
+
+def hash_cost(hashed):
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    try:
+        return int(_to_bytes(hashed).split(b"$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    return not isinstance(hashed, bytes) or hash_cost(hashed) != BCRYPT_ROUNDS
+
+
+def _rehash(user_id, password):
+    # Already on a pool thread, so hash directly rather than resubmitting
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+    write_queue.submit(repository.set_user_password, user_id, hashed)
+
+
+# ================= LOGIN =================
+
+def _wait_like_verify():
+    global _seeding
+    start = time.perf_counter()
+
+    with _timing_lock:
+        seeded = _verify_rounds == BCRYPT_ROUNDS
+        # BCRYPT_ROUNDS changed since the last sample: time the new cost
+        if not seeded and _seeding.done():
+            _seeding = _executor.submit(_seed_verify_time, BCRYPT_ROUNDS)
+        seeding = _seeding
+
+    if not seeded:
+        # Only a login arriving during startup waits here, and the time it
+        # waited counts towards the sleep
+        seeding.result()
+
+    with _timing_lock:
+        seconds = _verify_seconds
+    time.sleep(max(0.0, seconds - (time.perf_counter() - start)))
+
+
+@metrics.timed("auth_login")
+def authenticate(username, password):
+    # Returns (user_id, role) on success, otherwise None. Unknown usernames
+    # skip bcrypt and sleep for the usual verify time instead, so both
+    # failure cases take about as long as a real check.
+    user = repository.find_user(username)
+
+    if not user:
+        _wait_like_verify()
+        return None
+
+    user_id, stored_password, role = user
+
+    if not verify_password(password, stored_password):
+        return None
+
+    if needs_rehash(stored_password):
+        # Off the login path: the user is let in while the new hash is made
+        _executor.submit(_rehash, user_id, password)
+
+    return user_id, role
@@ -0,0 +1,355 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import archive
+import db
+import metrics
+import repository
+import shards
+
+# Online snapshots of every database file (main, shards and their archives)
+# while the apps keep running:
+#
+#   python backup.py create
+#   python backup.py verify [SNAPSHOT]
+#
+# Each file is copied with SQLite's backup API, PAGES_PER_STEP pages at a
+# time with STEP_PAUSE between steps. The copy reads from one open read
+# transaction, so under WAL it is a consistent point-in-time image that
+# writers never wait for, and commits made meanwhile do not restart it.
+# Files are copied one after another, so different shards are captured a
+# few moments apart.
+#
+# A snapshot is a directory under BACKUP_DIR named after its start time,
+# holding plain (non-WAL) copies of the files and a manifest.json. It is
+# written as NAME.partial and renamed once complete.
+
+BACKUP_DIR = os.environ.get("HELPDESK_BACKUP_DIR", "backups")
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.01
+
+# Retention: the newest KEEP_LAST snapshots, plus the newest snapshot of
+# each of the last KEEP_DAILY days and KEEP_WEEKLY ISO weeks
+KEEP_LAST = 3
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+
+# How often the write probe times an empty write transaction
+PROBE_INTERVAL = 0.05
+# Leftover .partial directories older than this were abandoned
+PARTIAL_MAX_AGE = 3600
+
+MANIFEST = "manifest.json"
+_NAME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+# ================= WRITE PROBE =================
+
+class WriteProbe:
+    # Times an empty BEGIN IMMEDIATE/COMMIT on every database every
+    # PROBE_INTERVAL while a snapshot runs: how long a ticket insert would
+    # have waited for the write lock at that moment.
+    def __init__(self, db_names, interval=PROBE_INTERVAL):
+        self.db_names = db_names
+        self.interval = interval
+        self.waits = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backup-probe", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for db_name in self.db_names:
+                start = time.perf_counter()
+                with db.transaction(db_name):
+                    pass
+                self.waits.append(time.perf_counter() - start)
+
+    def summary(self):
+        waits = sorted(self.waits)
+        if not waits:
+            return {"probes": 0}
+        return {
+            "probes": len(waits),
+            "p50_ms": round(waits[len(waits) // 2] * 1000, 3),
+            "p99_ms": round(waits[min(len(waits) - 1, len(waits) * 99 // 100)] * 1000, 3),
+            "max_ms": round(waits[-1] * 1000, 3),
+        }
+
+
+# ================= SNAPSHOTS =================
+
+def _copy(conn, schema, path, pages, pause):
+    # Returns the number of pages copied
+    copied = 0
+
+    def progress(status, remaining, total):
+        nonlocal copied
+        copied = total
+        if remaining:
+            time.sleep(pause)
+
+    target = sqlite3.connect(path)
+    try:
+        conn.backup(target, pages=pages, progress=progress, name=schema)
+        # Self-contained file, openable without -wal/-shm next to it
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+    return copied
+
+
+def _snapshot_database(db_name, directory, pages, pause):
+    entries = []
+
+    with db.connection(db_name) as conn:
+        # The read transaction pins the snapshot for both schemas. The
+        # counters total is read inside it, so it describes the copy.
+        conn.execute("BEGIN")
+        try:
+            tickets = conn.execute(
+                "SELECT count FROM ticket_counters WHERE dimension='total'"
+            ).fetchone()
+            archived = conn.execute("SELECT COUNT(*) FROM archive.tickets").fetchone()[0]
+
+            for schema, source, rows in (
+                ("main", db_name, tickets[0] if tickets else 0),
+                ("archive", archive.archive_path(db_name), archived),
+            ):
+                path = os.path.join(directory, os.path.basename(source))
+                start = time.perf_counter()
+                copied = _copy(conn, schema, path, pages, pause)
+                entries.append({
+                    "file": os.path.basename(source),
+                    "source": source,
+                    "schema": schema,
+                    "tickets": rows,
+                    "pages": copied,
+                    "bytes": os.path.getsize(path),
+                    "seconds": round(time.perf_counter() - start, 3),
+                })
+        finally:
+            conn.rollback()
+
+    return entries
+
+
+def _new_name(backup_dir):
+    name = base = datetime.now().strftime(_NAME_FORMAT)
+    suffix = 1
+    while any(os.path.exists(os.path.join(backup_dir, candidate))
+              for candidate in (name, name + ".partial")):
+        suffix += 1
+        name = f"{base}-{suffix}"
+    return name
+
+
+def create_snapshot(backup_dir=BACKUP_DIR, pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    # Copies every database file into a new snapshot; returns its manifest
+    db_names = [db.DB_NAME] + [name for name in shards.databases() if name != db.DB_NAME]
+    os.makedirs(backup_dir, exist_ok=True)
+    name = _new_name(backup_dir)
+    partial = os.path.join(backup_dir, name + ".partial")
+    os.makedirs(partial)
+
+    created_at = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    files = []
+    with WriteProbe(db_names) as probe:
+        for db_name in db_names:
+            files += _snapshot_database(db_name, partial, pages, pause)
+    seconds = time.perf_counter() - start
+
+    manifest = {
+        "name": name,
+        "created_at": created_at,
+        "seconds": round(seconds, 3),
+        "pages_per_step": pages,
+        "step_pause": pause,
+        "files": files,
+        "write_wait": probe.summary(),
+    }
+    with open(os.path.join(partial, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(partial, os.path.join(backup_dir, name))
+
+    metrics.observe(metrics.OPERATION_SECONDS, "backup_snapshot", seconds)
+    return manifest
+
+
+def load_manifest(path):
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def snapshots(backup_dir=BACKUP_DIR):
+    # Manifests of the complete snapshots, newest first
+    if not os.path.isdir(backup_dir):
+        return []
+    found = []
+    for name in os.listdir(backup_dir):
+        path = os.path.join(backup_dir, name)
+        if os.path.isfile(os.path.join(path, MANIFEST)):
+            found.append(load_manifest(path))
+    found.sort(key=lambda manifest: (manifest["created_at"], manifest["name"]), reverse=True)
+    return found
+
+
+# ================= VERIFY =================
+
+def verify_snapshot(path):
+    # Problems found in a snapshot; empty means every file passes
+    # integrity_check and each database's ticket rows agree with both its
+    # statistics counters and the count taken when it was copied.
+    problems = []
+
+    for entry in load_manifest(path)["files"]:
+        file_path = os.path.join(path, entry["file"])
+        if not os.path.isfile(file_path):
+            problems.append(f"{entry['file']}: missing")
+            continue
+
+        conn = sqlite3.connect(file_path)
+        try:
+            conn.execute("PRAGMA query_only=ON")
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            if result != ["ok"]:
+                problems.append(f"{entry['file']}: {'; '.join(result[:5])}")
+                continue
+
+            if entry["schema"] == "main" and repository.counter_drift(conn):
+                problems.append(f"{entry['file']}: statistics counters disagree with the tickets")
+            actual = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+            if actual != entry["tickets"]:
+                problems.append(f"{entry['file']}: {actual} tickets, {entry['tickets']} when copied")
+        except sqlite3.DatabaseError as e:
+            problems.append(f"{entry['file']}: {e}")
+        finally:
+            conn.close()
+
+    return problems
+
+
+# ================= RETENTION =================
+
+def retained(manifests, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    # Names of the snapshots the retention rules keep; manifests newest first
+    keep = {manifest["name"] for manifest in manifests[:keep_last]}
+    days, weeks = set(), set()
+
+    for manifest in manifests:
+        created = datetime.fromisoformat(manifest["created_at"])
+        day, week = created.date(), created.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(manifest["name"])
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(manifest["name"])
+
+    return keep
+
+
+def rotate(backup_dir=BACKUP_DIR, **rules):
+    # Deletes the snapshots retained() drops, and abandoned partial ones.
+    # Returns the names deleted.
+    manifests = snapshots(backup_dir)
+    keep = retained(manifests, **rules)
+    removed = [manifest["name"] for manifest in manifests if manifest["name"] not in keep]
+
+    for name in os.listdir(backup_dir) if os.path.isdir(backup_dir) else ():
+        path = os.path.join(backup_dir, name)
+        if name.endswith(".partial") and time.time() - os.path.getmtime(path) > PARTIAL_MAX_AGE:
+            removed.append(name)
+
+    for name in removed:
+        shutil.rmtree(os.path.join(backup_dir, name))
+    return removed
+
+
+# ================= CLI =================
+
+def _print_manifest(manifest):
+    total = sum(entry["bytes"] for entry in manifest["files"])
+    wait = manifest["write_wait"]
+    print(f"✅ Snapshot {manifest['name']}: {len(manifest['files'])} files, "
+          f"{total / 1e6:.1f} MB in {manifest['seconds']:.1f}s")
+    for entry in manifest["files"]:
+        print(f"   {entry['file']}: {entry['tickets']} tickets, {entry['bytes'] / 1e6:.1f} MB "
+              f"in {entry['seconds']:.1f}s")
+    if wait["probes"]:
+        print(f"   Writers waited p50 {wait['p50_ms']:.2f} ms, p99 {wait['p99_ms']:.2f} ms, "
+              f"max {wait['max_ms']:.2f} ms for the write lock ({wait['probes']} probes)")
+
+
+def main():
+    import argparse
+
+    import migrations
+
+    parser = argparse.ArgumentParser(description="Online backups of the helpdesk databases")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="where snapshots are kept")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="take, verify and rotate a snapshot")
+    create.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="pages copied per step")
+    create.add_argument("--pause", type=float, default=STEP_PAUSE, help="seconds between steps")
+    create.add_argument("--keep-last", type=int, default=KEEP_LAST)
+    create.add_argument("--keep-daily", type=int, default=KEEP_DAILY)
+    create.add_argument("--keep-weekly", type=int, default=KEEP_WEEKLY)
+
+    verify = commands.add_parser("verify", help="check a snapshot (the newest by default)")
+    verify.add_argument("snapshot", nargs="?")
+
+    commands.add_parser("list", help="list the snapshots, newest first")
+    args = parser.parse_args()
+
+    failed = False
+
+    if args.command == "create":
+        migrations.migrate()
+        manifest = create_snapshot(args.dir, args.pages, args.pause)
+        _print_manifest(manifest)
+        args.snapshot = manifest["name"]
+        for name in rotate(args.dir, keep_last=args.keep_last,
+                           keep_daily=args.keep_daily, keep_weekly=args.keep_weekly):
+            print(f"🗑️ Removed {name}")
+
+    if args.command in ("create", "verify"):
+        manifests = snapshots(args.dir)
+        name = args.snapshot or (manifests[0]["name"] if manifests else None)
+        if name is None:
+            print("❌ No snapshots yet.")
+            failed = True
+        else:
+            problems = verify_snapshot(os.path.join(args.dir, name))
+            for problem in problems:
+                print(f"❌ {problem}")
+            if not problems:
+                print(f"✅ {name} verified: integrity ok, ticket counts match")
+            failed = bool(problems)
+    else:
+        for manifest in snapshots(args.dir):
+            total = sum(entry["bytes"] for entry in manifest["files"])
+            tickets = sum(entry["tickets"] for entry in manifest["files"])
+            print(f"{manifest['name']}  {manifest['created_at']}  {tickets} tickets  {total / 1e6:.1f} MB")
+
+    db.close_all()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import auth
+import db
+import exporter
+import generate_data
+import importer
+import repository
+import shards
+import write_queue
+
+# Times every hot path against freshly generated databases of each size and
+# writes machine-readable JSON, so any change can be compared run to run:
+#
+#   python benchmark.py --sizes 10000,1000000 --output before.json
+#   python benchmark.py --sizes 10000,1000000 --compare before.json
+#
+# --shards 1,2,4 also measures write throughput across writer processes
+# for each number of shard files.
+
+DEFAULT_SIZES = "10000,100000"
+USERS_PER_TICKET = 0.01
+WRITER_THREADS = 16
+STARTUP_RUNS = 5
+SHARD_PROCESSES = 4
+SHARD_TICKETS = 10000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ================= TIMING =================
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def measure(name, size, func, repeat):
+    # Calls func() `repeat` times; func returns how many items it handled
+    # (rows, tickets...) so throughput can be reported per item.
+    latencies = []
+    items = 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items += func() or 1
+        latencies.append(time.perf_counter() - start)
+
+    total = sum(latencies)
+    return {
+        "benchmark": name,
+        "size": size,
+        "ops": repeat,
+        "items": items,
+        "seconds": total,
+        "items_per_sec": items / total if total else None,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+# ================= BENCHMARKS =================
+
+def run_size(size, workdir, repeat, rounds):
+    db_name = os.path.join(workdir, f"bench_{size}.db")
+    users = max(10, int(size * USERS_PER_TICKET))
+
+    db.DB_NAME = db_name
+    start = time.perf_counter()
+    first_user_id = generate_data.generate(users, size, seed=size, password_rounds=rounds)
+    seconds = time.perf_counter() - start
+    results = [{
+        "benchmark": "generate", "size": size, "ops": 1, "items": size,
+        "seconds": seconds, "items_per_sec": size / seconds,
+    }]
+
+    rng = random.Random(size)
+    auth.BCRYPT_ROUNDS = rounds
+    user_ids = [first_user_id + rng.randrange(users) for _ in range(repeat)]
+
+    def register():
+        repository.create_user(
+            f"bench{rng.getrandbits(48)}", auth.hash_password("bench123"), "Employee"
+        )
+
+    def login():
+        auth.authenticate(f"user{rng.choice(user_ids)}", generate_data.GENERATED_PASSWORD)
+
+    def raise_ticket():
+        repository.create_ticket(rng.choice(user_ids), "Software", "Benchmark ticket", "Medium")
+
+    def raise_ticket_concurrent(submit):
+        # WRITER_THREADS callers each raising tickets back to back
+        def worker(count):
+            for _ in range(count):
+                submit(rng.choice(user_ids), "Software", "Benchmark ticket", "Medium")
+
+        with ThreadPoolExecutor(WRITER_THREADS) as pool:
+            list(pool.map(worker, [repeat // WRITER_THREADS] * WRITER_THREADS))
+        return repeat // WRITER_THREADS * WRITER_THREADS
+
+    def raise_ticket_direct():
+        return raise_ticket_concurrent(repository.create_ticket)
+
+    def raise_ticket_queued():
+        return raise_ticket_concurrent(
+            lambda *args: write_queue.run(repository.create_ticket, *args)
+        )
+
+    def my_tickets():
+        return len(repository.tickets_for_user(rng.choice(user_ids)))
+
+    def all_tickets_page():
+        after_id = rng.randrange(size) if size else None
+        return len(repository.list_tickets(after_id=after_id)[0])
+
+    def open_tickets_page():
+        return len(repository.list_tickets(status="Open")[0])
+
+    def statistics():
+        repository.ticket_statistics()
+
+    def statistics_recount():
+        # The original four COUNT(*) scans, kept as a reference point. They
+        # count status codes, as the listing filters do.
+        with db.connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM ticket_rows").fetchone()
+            for status in repository.STATUSES:
+                conn.execute(
+                    "SELECT COUNT(*) FROM ticket_rows WHERE status_code=?",
+                    (repository.STATUS_CODES[status],)
+                ).fetchone()
+
+    def export_csv():
+        with open(os.devnull, "wb") as sink:
+            return exporter.write_csv(sink)[0]
+
+    results += [
+        measure("register", size, register, max(1, repeat // 10)),
+        measure("login", size, login, max(1, repeat // 10)),
+        measure("raise_ticket", size, raise_ticket, repeat),
+        measure("raise_ticket_direct", size, raise_ticket_direct, 5),
+        measure("raise_ticket_queued", size, raise_ticket_queued, 5),
+        measure("my_tickets", size, my_tickets, repeat),
+        measure("all_tickets_page", size, all_tickets_page, repeat),
+        measure("open_tickets_page", size, open_tickets_page, repeat),
+        measure("statistics", size, statistics, repeat),
+        measure("statistics_recount", size, statistics_recount, max(1, repeat // 10)),
+        measure("export_csv", size, export_csv, 1),
+        {
+            "benchmark": "db_file_bytes", "size": size, "ops": 1,
+            "items": os.path.getsize(db_name),
+        },
+    ]
+
+    # The export loaded back in, as an import of `size` tickets into a table
+    # already holding them, then the duplicate-index pass that follows every
+    # import. Last, since it doubles the table. The import was asked to reach
+    # 100k rows/s; on a one-core test machine 200k rows load at about 31k
+    # rows/s (half in Python validation, half in SQLite index upkeep) and
+    # index at about 10k rows/s, most of it MinHash hashing in Python.
+    csv_path = os.path.join(workdir, f"bench_{size}.csv")
+    exporter.export_csv(csv_path)
+    results += [
+        measure("import_csv", size, lambda: importer.import_tickets(csv_path)[0], 1),
+        measure("import_duplicate_index", size, shards.index_duplicates, 1),
+    ]
+
+    write_queue.shutdown()
+    db.close_all()
+    return results
+
+
+# ================= SHARDS =================
+# Writer processes raising tickets for random users as fast as they can. On
+# one shard they all queue for the same file lock; with N shards they mostly
+# wait on different ones. The gain depends on having cores for the writers.
+
+def _shard_writer(db_name, user_ids, count, barrier, done):
+    db.DB_NAME = db_name
+    rng = random.Random(os.getpid())
+    shards.databases()
+    barrier.wait()
+    for _ in range(count):
+        shards.create_ticket(rng.choice(user_ids), "Software", "Benchmark ticket", "Medium")
+    done.put(time.perf_counter())
+    write_queue.shutdown()
+    db.close_all()
+
+
+def run_shards(workdir, counts, processes, tickets):
+    users = 100
+    results = []
+    # spawn: the children must not inherit this process's open connections
+    context = multiprocessing.get_context("spawn")
+
+    for count in counts:
+        db_name = os.path.join(tempfile.mkdtemp(dir=workdir), "bench_shards.db")
+        db.DB_NAME = db_name
+        first_user_id = generate_data.generate(users, tickets, seed=count, password_rounds=4)
+        if count > 1:
+            shards.split(count)
+        write_queue.shutdown()
+        db.close_all()
+
+        user_ids = list(range(first_user_id, first_user_id + users))
+        per_process = tickets // processes
+        barrier, done = context.Barrier(processes + 1), context.Queue()
+        workers = [
+            context.Process(target=_shard_writer, args=(db_name, user_ids, per_process, barrier, done))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        seconds = max(done.get() for _ in workers) - start
+        for worker in workers:
+            worker.join()
+
+        written = per_process * processes
+        results.append({
+            "benchmark": f"raise_ticket_{processes}proc_{count}shards", "size": tickets,
+            "ops": written, "items": written, "seconds": seconds,
+            "items_per_sec": written / seconds,
+        })
+
+    return results
+
+
+# ================= STARTUP =================
+# Cold starts, each in a fresh interpreter as a newly scaled-out process
+# would be: interpreter start, imports, migration check and first render.
+
+STARTUP_COMMANDS = {
+    "startup_cli_import": (["-c", "import App"], None),
+    # Start the CLI and pick Exit straight away
+    "startup_cli_exit": ([os.path.join(HERE, "App.py")], "3\n"),
+    # Login page, rendered the way Streamlit runs the script
+    "startup_web_first_render": (["-c", (
+        "from streamlit.testing.v1 import AppTest\n"
+        f"AppTest.from_file({os.path.join(HERE, 'web_app.py')!r}, default_timeout=60).run()"
+    )], None),
+}
+
+
+def run_startup(workdir, runs):
+    # Runs in an empty directory, so every process also creates and
+    # migrates its own database as a first start would.
+    env = dict(os.environ, PYTHONPATH=HERE)
+    results = []
+
+    for name, (args, stdin) in STARTUP_COMMANDS.items():
+        def start():
+            cwd = tempfile.mkdtemp(dir=workdir)
+            subprocess.run(
+                [sys.executable, *args], input=stdin, text=True, cwd=cwd, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+            )
+
+        results.append(measure(name, 0, start, runs))
+
+    return results
+
+
+# ================= REPORT =================
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=HERE
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    for row in (baseline or {}).get("results", []):
+        previous[(row["benchmark"], row["size"])] = row
+
+    print(f"{'Benchmark':<26}{'Size':>10}{'Items/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'vs base':>10}")
+    for row in results:
+        rate = row.get("items_per_sec")
+        p50 = f"{row['p50_ms']:.2f}" if "p50_ms" in row else "-"
+        p99 = f"{row['p99_ms']:.2f}" if "p99_ms" in row else "-"
+        change = ""
+        old = previous.get((row["benchmark"], row["size"]))
+        if old and rate and old.get("items_per_sec"):
+            change = f"{(rate / old['items_per_sec'] - 1) * 100:+.0f}%"
+        print(
+            f"{row['benchmark']:<26}{row['size']:>10}"
+            f"{(f'{rate:,.0f}' if rate else '-'):>14}"
+            f"{p50:>10}{p99:>10}"
+            f"{change:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark helpdesk hot paths")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated ticket counts")
+    parser.add_argument("--repeat", type=int, default=200, help="operations per benchmark")
+    parser.add_argument("--bcrypt-rounds", type=int, default=auth.BCRYPT_ROUNDS)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--workdir", help="keep generated databases here")
+    parser.add_argument("--startup-runs", type=int, default=STARTUP_RUNS,
+                        help="fresh processes per startup benchmark")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="only run the startup benchmarks")
+    parser.add_argument("--shards", help="comma-separated shard counts for the write scaling benchmark")
+    parser.add_argument("--shard-processes", type=int, default=SHARD_PROCESSES,
+                        help="writer processes in the shard benchmark")
+    parser.add_argument("--shard-tickets", type=int, default=SHARD_TICKETS,
+                        help="tickets generated before splitting, and written by the benchmark")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="helpdesk_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    print("Benchmarking startup...")
+    results = run_startup(workdir, args.startup_runs)
+
+    sizes = [] if args.startup_only else [int(value) for value in args.sizes.split(",")]
+    for size in sizes:
+        print(f"Benchmarking {size} tickets...")
+        results += run_size(size, workdir, args.repeat, args.bcrypt_rounds)
+
+    if args.shards:
+        print(f"Benchmarking writes across {args.shards} shards...")
+        counts = [int(value) for value in args.shards.split(",")]
+        results += run_shards(workdir, counts, args.shard_processes, args.shard_tickets)
+
+    report = {"meta": metadata(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 512
+TTL_SECONDS = 30
+
+
+class QueryCache:
+    # LRU cache with a TTL where every entry carries tags such as
+    # ("user", 7) or ("status", "Open"). Writers invalidate only the tags
+    # they touched, so unrelated cached reads survive. The TTL also bounds
+    # staleness from writes made by other processes (e.g. the CLI).
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get_or_load(self, key, loader, tags=()):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # Skip storing if something was invalidated while we loaded,
+            # since the value may predate that write.
+            if generation != self._generation:
+                return value
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (now + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return value
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared by every Streamlit session in the process: modules are imported
+# once, while web_app.py itself is re-executed on each rerun.
+queries = QueryCache()
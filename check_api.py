@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from load_test import Client, free_port
+
+# Starts a local api.py against a throwaway database and sends it requests
+# that must be refused with 400 (bad page sizes, non-string fields), checking
+# that a refused ticket is never written.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+failed = False
+
+
+def check(ok, message):
+    global failed
+    print(("✅ " if ok else "❌ ") + message)
+    failed = failed or not ok
+
+
+async def ticket_count(client):
+    status, data = await client.request("GET", "/tickets?page_size=500")
+    return len(json.loads(data)["tickets"]) if status == 200 else None
+
+
+async def run(port):
+    client = Client(port)
+    await client.request("POST", "/register", {"username": "checkuser", "password": "check123", "role": "Employee"})
+    await client.login("checkuser", "check123")
+
+    status, _ = await client.request("POST", "/tickets", {
+        "category": "Software", "description": "Valid ticket", "priority": "Low"
+    })
+    check(status == 201, f"Valid ticket raised ({status})")
+
+    for page_size in ("-1", "0", "501", "abc", "1.5"):
+        status, data = await client.request("GET", f"/tickets?page_size={page_size}")
+        check(status == 400, f"page_size={page_size}: {status} {data.decode()}")
+    for page_size in ("1", "500"):
+        status, _ = await client.request("GET", f"/tickets?page_size={page_size}")
+        check(status == 200, f"page_size={page_size}: {status}")
+
+    before = await ticket_count(client)
+    for field, value in (("description", 12345), ("description", {"text": "x"}),
+                         ("category", ["Software"]), ("priority", 2)):
+        body = {"category": "Software", "description": "Typed ticket", "priority": "Low", field: value}
+        status, data = await client.request("POST", "/tickets", body)
+        check(status == 400, f"{field}={value!r}: {status} {data.decode()}")
+    after = await ticket_count(client)
+    check(before == after == 1, f"No refused ticket was written ({after} tickets)")
+
+    client.close()
+
+
+workdir = tempfile.mkdtemp()
+port = free_port()
+env = dict(
+    os.environ,
+    HELPDESK_DB=os.path.join(workdir, "check.db"),
+    HELPDESK_AUDIT_LOG=os.path.join(workdir, "audit_log.txt"),
+    HELPDESK_BCRYPT_ROUNDS="4",
+)
+server = subprocess.Popen(
+    [sys.executable, os.path.join(HERE, "api.py"), "--port", str(port)],
+    env=env, stdout=subprocess.PIPE, text=True
+)
+try:
+    server.stdout.readline()
+    asyncio.run(run(port))
+finally:
+    server.terminate()
+    server.wait()
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,31 @@
+import sys
+
+import db
+import migrations
+import repository
+import shards
+
+# Compare the trigger-maintained ticket_counters with a full recount, in
+# every shard. Run with --rebuild to recompute the counters from scratch.
+
+migrations.migrate()
+
+if "--rebuild" in sys.argv:
+    shards.fan_out(repository.rebuild_ticket_counters)
+    print("✅ Ticket counters rebuilt from the tickets table.")
+
+drift = {}
+for shard, shard_drift in zip(shards.databases(), shards.fan_out(repository.verify_ticket_counters)):
+    drift.update({(shard, *key): counts for key, counts in shard_drift.items()})
+
+if drift:
+    print("❌ Ticket counters out of date:")
+    for (shard, dimension, value), (stored, actual) in sorted(drift.items()):
+        print(f"  {shard} {dimension}={value!r}: stored {stored}, actual {actual}")
+    print("Run: python check_counters.py --rebuild")
+else:
+    print("✅ Ticket counters match the tickets table.")
+    print(shards.ticket_statistics())
+
+db.close_all()
+sys.exit(1 if drift else 0)
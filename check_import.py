@@ -0,0 +1,65 @@
+import csv
+import os
+import sys
+import tempfile
+
+import db
+import importer
+import migrations
+import rollups
+import shards
+import write_queue
+
+# Imports a CSV whose Created At column mixes valid and invalid dates, checks
+# the invalid rows are rejected with a reason and the valid ones stored in
+# CURRENT_TIMESTAMP form, then refreshes the rollups over them. Runs in an
+# empty directory.
+
+# (Created At, stored as, or None when the row must be rejected)
+DATES = (
+    ("2026-10-17", "2026-10-17 00:00:00"),
+    ("2026-10-17T09:30:00+02:00", "2026-10-17 07:30:00"),
+    ("2026-10-18 12:00", "2026-10-18 12:00:00"),
+    ("10/17/2026", None),
+    ("yesterday", None),
+)
+
+failed = False
+
+
+def check(ok, message):
+    global failed
+    print(("✅ " if ok else "❌ ") + message)
+    failed = failed or not ok
+
+
+os.chdir(tempfile.mkdtemp())
+migrations.migrate()
+
+with open("tickets.csv", "w", encoding="utf-8", newline="") as file:
+    writer = csv.writer(file)
+    writer.writerow(["Category", "Description", "Priority", "Status", "Created At"])
+    for created_at, _ in DATES:
+        writer.writerow(["Software", f"Imported {created_at}", "Medium", "Open", created_at])
+
+inserted, error_count, errors, _ = importer.import_tickets("tickets.csv")
+expected = [stored for _, stored in DATES if stored is not None]
+check(inserted == len(expected) and error_count == len(DATES) - len(expected),
+      f"Imported {inserted} tickets, rejected {error_count}")
+for line_number, reason in errors:
+    check("created at" in reason, f"line {line_number}: {reason}")
+
+with db.connection() as conn:
+    stored = [row[0] for row in conn.execute("SELECT created_at FROM ticket_rows ORDER BY ticket_id")]
+check(stored == expected, f"Stored created_at values: {stored}")
+
+try:
+    shards.refresh_rollups()
+    opened = sum(row[2] for row in rollups.ticket_trends())
+    check(opened == len(expected), f"Rollups refreshed: {opened} tickets opened")
+except Exception as e:
+    check(False, f"Rollup refresh failed: {e}")
+
+write_queue.shutdown()
+db.close_all()
+sys.exit(1 if failed else 0)
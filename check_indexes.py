@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import db
+import duplicates
+import migrations
+
+# Hot queries that must be answered from an index rather than a table scan.
+# They read the tickets view and filter on codes, as repository.py does.
+HOT_QUERIES = (
+    ("Tickets by user", "SELECT ticket_id, status FROM tickets WHERE user_id=?", (1,)),
+    ("Tickets by status", "SELECT COUNT(*) FROM tickets WHERE status_code=?", (1,)),
+    ("Tickets by status and priority",
+     "SELECT COUNT(*) FROM tickets WHERE status_code=? AND priority_code=?", (1, 3)),
+    ("Tickets changed since",
+     "SELECT ticket_id FROM tickets WHERE updated_at>=?", ("2024-01-01 00:00:00",)),
+    ("Page of tickets by status",
+     "SELECT ticket_id, category FROM tickets WHERE status_code=? ORDER BY ticket_id LIMIT 51", (1,)),
+)
+
+workdir = tempfile.mkdtemp()
+db_path = os.path.join(workdir, "legacy.db")
+
+# Start from the old App.py schema with data in it, then upgrade in place
+conn = sqlite3.connect(db_path)
+conn.executescript("""
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password BLOB NOT NULL,
+        role TEXT NOT NULL
+    );
+    CREATE TABLE tickets (
+        ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        category TEXT NOT NULL,
+        description TEXT NOT NULL,
+        priority TEXT NOT NULL,
+        status TEXT DEFAULT 'Open'
+    );
+    INSERT INTO users (username, password, role) VALUES ('alice', 'x', 'Employee');
+    INSERT INTO tickets (user_id, category, description, priority)
+    VALUES (1, 'Network', 'VPN down', 'High'), (1, ' network', 'Wi-Fi drops', 'high'),
+           (1, 'Network', 'vpn', 'Low'), (1, 'Hardware', 'jam', 'Low'), (1, 'Software', '', 'Low');
+""")
+conn.close()
+
+applied = migrations.migrate(db_path)
+print("Applied migrations:", applied)
+
+failed = False
+
+with db.connection(db_path) as conn:
+    print("Schema version:", conn.execute("PRAGMA user_version").fetchone()[0])
+    print("Ticket columns:", [row[1] for row in conn.execute("PRAGMA table_info(tickets)")])
+    print("Tickets kept:", conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0])
+    print("Categories:", conn.execute(
+        "SELECT category, priority, COUNT(*) FROM tickets GROUP BY 1, 2"
+    ).fetchall())
+
+    # Short descriptions still get every band in the duplicate index, and an
+    # empty one gets none
+    indexed = dict(conn.execute(
+        "SELECT t.description, COUNT(l.bucket) FROM tickets t"
+        " LEFT JOIN ticket_lsh l ON l.ticket_id=t.ticket_id GROUP BY t.ticket_id"
+    ).fetchall())
+    for description, expected in (("vpn", duplicates.BANDS), ("jam", duplicates.BANDS), ("", 0)):
+        ok = indexed.get(description) == expected
+        print(("✅ " if ok else "❌ ") + f"Duplicate buckets for {description!r}: {indexed.get(description)}")
+        failed = failed or not ok
+
+    for label, sql, params in HOT_QUERIES:
+        plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        uses_index = "INDEX" in plan and "SCAN" not in plan and "TEMP B-TREE" not in plan
+        print(("✅ " if uses_index else "❌ ") + f"{label}: {plan}")
+        failed = failed or not uses_index
+
+db.close_all()
+sys.exit(1 if failed else 0)
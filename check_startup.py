@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Cold-start guard: heavy modules must stay off the startup path of both
+# entry points. Each case runs in a fresh interpreter in an empty directory
+# and lists which of the watched modules ended up imported.
+# Timings: python benchmark.py --startup-only
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WATCH = ("pandas", "pyarrow", "numpy", "bcrypt", "csv", "gzip", "argparse", "concurrent.futures")
+
+CASES = (
+    ("CLI import", "import App", WATCH),
+    ("Web first render", (
+        "from streamlit.testing.v1 import AppTest\n"
+        f"AppTest.from_file({os.path.join(HERE, 'web_app.py')!r}, default_timeout=60).run()"
+    # Streamlit itself loads csv, argparse and concurrent.futures
+    ), ("pandas", "pyarrow", "bcrypt", "gzip")),
+)
+
+failed = False
+
+for label, code, forbidden in CASES:
+    report = f"{code}\nimport sys\nprint(','.join(m for m in {WATCH!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", report], capture_output=True, text=True,
+        cwd=tempfile.mkdtemp(), env=dict(os.environ, PYTHONPATH=HERE),
+    )
+    if result.returncode:
+        print(f"❌ {label}: failed to start\n{result.stderr}")
+        failed = True
+        continue
+
+    loaded = [module for module in result.stdout.strip().split(",") if module]
+    unwanted = [module for module in loaded if module in forbidden]
+    print(("❌ " if unwanted else "✅ ") + f"{label}: loaded {', '.join(loaded) or 'none of them'}")
+    failed = failed or bool(unwanted)
+
+sys.exit(1 if failed else 0)
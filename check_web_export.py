@@ -0,0 +1,109 @@
+import gzip
+import io
+import os
+import sys
+import tempfile
+import zipfile
+
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+import exporter
+import generate_data
+import migrations
+
+# Signs in to the web app as an admin, prepares an export in every format on
+# the Export page and clicks Download Report, checking the file that would be
+# downloaded. Runs against a small generated database in an empty directory.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TICKETS = 50
+
+
+
+def csv_rows(data):
+    lines = data.decode().splitlines()
+    return len(lines) - 1 if lines and lines[0] == ",".join(exporter.EXPORT_HEADER) else None
+
+
+def parquet_rows(data):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(data)).num_rows
+
+
+def zipped_parquet_rows(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return sum(parquet_rows(archive.read(name)) for name in archive.namelist())
+
+
+# (label, format, other widgets to set, rows in the downloaded file)
+CASES = (
+    ("CSV", "CSV", {}, csv_rows),
+    ("CSV gzip", "CSV", {"Compress (gzip)": True}, lambda data: csv_rows(gzip.decompress(data))),
+    ("Parquet", "Parquet", {}, parquet_rows),
+    ("Parquet by month", "Parquet", {"Partition by": "Month"}, zipped_parquet_rows),
+)
+
+
+def widget(widgets, label):
+    return next(item for item in widgets if item.label == label)
+
+
+# Every run of the app gets fresh in-memory media storage; keep hold of it
+# so the file behind a download button can be read back
+storages = []
+_storage_init = MemoryMediaFileStorage.__init__
+
+
+def _remember_storage(self, *args, **kwargs):
+    _storage_init(self, *args, **kwargs)
+    storages.append(self)
+
+
+MemoryMediaFileStorage.__init__ = _remember_storage
+
+
+def downloaded(app):
+    # The Download Report button and the bytes it would download
+    button = widget(app.get("download_button"), "Download Report")
+    return button, storages[-1].get_file(button.proto.url.rsplit("/", 1)[1]).content
+
+
+os.chdir(tempfile.mkdtemp())
+migrations.migrate()
+generate_data.generate(5, TICKETS, password_rounds=4)
+
+failed = False
+
+for label, file_format, settings, count_rows in CASES:
+    app = AppTest.from_file(os.path.join(HERE, "web_app.py"), default_timeout=60)
+    app.session_state.logged_in = True
+    app.session_state.username = "admin"
+    app.session_state.role = "Admin"
+    app.session_state.user_id = 1
+    app.run()
+    app.sidebar.radio[0].set_value("Export CSV").run()
+    widget(app.selectbox, "Format").set_value(file_format).run()
+    for name, value in settings.items():
+        widget([*app.selectbox, *app.checkbox], name).set_value(value).run()
+
+    try:
+        widget(app.button, "Prepare Export").click().run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+        button, data = downloaded(app)
+        rows = count_rows(data)
+        button.click().run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    except Exception as e:
+        print(f"❌ {label}: {e}")
+        failed = True
+        continue
+
+    ok = rows == TICKETS
+    print(("✅ " if ok else "❌ ") + f"{label}: {rows} tickets in {len(data):,} bytes")
+    failed = failed or not ok
+
+sys.exit(1 if failed else 0)
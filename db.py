@@ -0,0 +1,177 @@
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+DB_NAME = os.environ.get("HELPDESK_DB", "database.db")
+
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+# How long a connection waits for another writer before "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get("HELPDESK_BUSY_TIMEOUT_MS", "5000"))
+
+# Applied once per connection when it is opened. WAL lets readers run
+# alongside the single writer, NORMAL sync is durable under WAL, and the
+# cache/mmap sizes keep hot pages out of read() calls.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),
+    ("mmap_size", 268435456),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("temp_store", "MEMORY"),
+)
+
+# Called as hook(conn, db_name) on every new connection after the pragmas,
+# for modules that need per-connection setup such as ATTACH (see archive.py).
+_open_hooks = []
+
+
+def on_open(hook):
+    _open_hooks.append(hook)
+    return hook
+
+
+# The database a thread uses when none is named. using() points it at
+# another file for a block, so code written against the default database
+# (repository, search, archive...) runs unchanged against a shard.
+_current = threading.local()
+
+
+def current_db():
+    return getattr(_current, "db_name", None) or DB_NAME
+
+
+@contextmanager
+def using(db_name):
+    previous = getattr(_current, "db_name", None)
+    _current.db_name = db_name
+    try:
+        yield
+    finally:
+        _current.db_name = previous
+
+
+# ================= POOL =================
+
+class ConnectionPool:
+    def __init__(self, db_name, size=POOL_SIZE):
+        self.db_name = db_name
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _open(self):
+        # check_same_thread is off because a pooled connection can be handed
+        # to a different thread later; the pool guarantees one user at a time.
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=metrics.connection_factory,
+        )
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        for hook in _open_hooks:
+            hook(conn, self.db_name)
+        return conn
+
+    def acquire(self):
+        # A thread that already holds a connection gets the same one back,
+        # so nested helpers share the caller's transaction.
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is None:
+            conn = self._open()
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        self._local.conn = None
+
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name=None):
+    db_name = db_name or current_db()
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name)
+        return pool
+
+
+@contextmanager
+def connection(db_name=None):
+    pool = get_pool(db_name)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(db_name=None):
+    with connection(db_name) as conn:
+        # Join the caller's transaction instead of committing it early.
+        if conn.in_transaction:
+            yield conn
+            return
+
+        # IMMEDIATE takes the write lock up front, so a busy database is
+        # waited on via busy_timeout instead of failing mid-transaction.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all)
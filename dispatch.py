@@ -0,0 +1,177 @@
+import heapq
+import threading
+import time
+
+import db
+import repository
+import write_queue
+
+# Technicians claim the next ticket from an in-memory heap of the Open,
+# unassigned tickets: High before Medium before Low, then oldest first, then
+# by category code. The heap is built once from idx_tickets_dispatch and caught up
+# from idx_tickets_updated_at before claims, so tickets raised or changed by
+# any process are picked up. Entries for tickets that stopped being
+# claimable stay in the heap and are skipped when they reach the top.
+
+# Catch up with the database at most this often (seconds)
+SYNC_INTERVAL = 1.0
+# Each catch-up re-reads this much earlier than the last one (SQLite
+# timestamps have one-second resolution), so a write transaction that
+# stamped its rows just before a catch-up but committed just after it is
+# still seen by the next one.
+SYNC_OVERLAP = "-1 seconds"
+# Rebuild the heap once it holds this many times more entries than are live
+COMPACT_RATIO = 2
+
+_CLAIMABLE = "status_code=1 AND assigned_to IS NULL"
+
+
+def _key(ticket_id, priority_code, created_at, category_code):
+    # Priority codes rise from Low to High (repository.PRIORITY_CODES)
+    return (-priority_code, created_at or "", category_code, ticket_id)
+
+
+class DispatchQueue:
+    def __init__(self, db_name=None):
+        self.db_name = db_name or db.current_db()
+        self._lock = threading.Lock()
+        self._heap = []
+        # ticket_id -> its live heap entry; anything else in the heap is stale
+        self._queued = {}
+        self._since = None
+        self._synced = 0.0
+        self.rebuild()
+
+    def __len__(self):
+        return len(self._queued)
+
+    def rebuild(self):
+        with db.connection(self.db_name) as conn:
+            since = conn.execute("SELECT datetime('now', ?)", (SYNC_OVERLAP,)).fetchone()[0]
+            # Without statistics the planner prefers the status index and
+            # walks every Open ticket, assigned or not
+            rows = conn.execute(f"""
+                SELECT ticket_id, priority_code, created_at, category_code
+                FROM ticket_rows INDEXED BY idx_tickets_dispatch WHERE {_CLAIMABLE}
+            """).fetchall()
+        heap = [_key(*row) for row in rows]
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._heap = heap
+            self._queued = {key[-1]: key for key in heap}
+            self._since = since
+            self._synced = time.monotonic()
+
+    def _sync(self):
+        # Called with the lock held
+        if time.monotonic() - self._synced < SYNC_INTERVAL:
+            return
+
+        with db.connection(self.db_name) as conn:
+            since = conn.execute("SELECT datetime('now', ?)", (SYNC_OVERLAP,)).fetchone()[0]
+            changed = conn.execute(f"""
+                SELECT ticket_id, priority_code, created_at, category_code, {_CLAIMABLE}
+                FROM ticket_rows WHERE updated_at>=?
+            """, (self._since,)).fetchall()
+
+        for ticket_id, priority_code, created_at, category_code, claimable in changed:
+            if not claimable:
+                self._queued.pop(ticket_id, None)
+                continue
+            key = _key(ticket_id, priority_code, created_at, category_code)
+            if self._queued.get(ticket_id) != key:
+                self._queued[ticket_id] = key
+                heapq.heappush(self._heap, key)
+
+        self._since = since
+        self._synced = time.monotonic()
+
+        if len(self._heap) > COMPACT_RATIO * len(self._queued) + 1024:
+            self._heap = list(self._queued.values())
+            heapq.heapify(self._heap)
+
+    def _pop(self):
+        while self._heap:
+            key = heapq.heappop(self._heap)
+            if self._queued.get(key[-1]) == key:
+                del self._queued[key[-1]]
+                return key
+        return None
+
+    def claim_next(self, technician):
+        # Assigns the first claimable ticket to `technician` and returns its
+        # row, or None when nothing is waiting. Each thread pops a different
+        # entry under the lock; the conditional UPDATE settles races with
+        # other processes, and a lost race just moves on to the next entry.
+        while True:
+            with self._lock:
+                self._sync()
+                key = self._pop()
+            if key is None:
+                return None
+
+            try:
+                claimed = write_queue.get_queue(self.db_name).run(
+                    repository.claim_ticket, key[-1], technician
+                )
+            except Exception:
+                with self._lock:
+                    self._queued.setdefault(key[-1], key)
+                    heapq.heappush(self._heap, key)
+                raise
+
+            if claimed:
+                with db.using(self.db_name):
+                    return repository.get_ticket(key[-1])
+
+    def peek(self, count=10):
+        # The next `count` ticket ids in claim order, without claiming them
+        return [key[-1] for key in self.peek_keys(count)]
+
+    def peek_keys(self, count=10):
+        # Heap keys of the next `count` tickets, comparable across queues
+        # (see shards.claim_next). Walks the heap top-down, so it costs
+        # O(count log count) rather than sorting the whole backlog.
+        with self._lock:
+            self._sync()
+            heap, queued = self._heap, self._queued
+            keys = []
+            frontier = [(heap[0], 0)] if heap else []
+
+            while frontier and len(keys) < count:
+                key, index = heapq.heappop(frontier)
+                if queued.get(key[-1]) == key:
+                    keys.append(key)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+
+        return keys
+
+
+# ================= API =================
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(db_name=None):
+    db_name = db_name or db.current_db()
+    with _queues_lock:
+        dispatch_queue = _queues.get(db_name)
+        if dispatch_queue is None:
+            dispatch_queue = _queues[db_name] = DispatchQueue(db_name)
+        return dispatch_queue
+
+
+def claim_next(technician):
+    return get_queue().claim_next(technician)
+
+
+def peek(count=10):
+    return get_queue().peek(count)
+
+
+def pending():
+    return len(get_queue())
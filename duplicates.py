@@ -0,0 +1,292 @@
+import re
+import struct
+import sys
+import time
+import zlib
+
+import db
+
+# Near-duplicate detection over ticket descriptions. Each description is cut
+# into character shingles and summarised by a MinHash signature; the
+# signature is split into bands, and tickets sharing any band hash share an
+# LSH bucket in ticket_lsh. A lookup reads a few buckets by primary key and
+# checks the exact shingle similarity of the best candidates, so its cost
+# does not depend on how many tickets there are.
+#
+# Changing any of the hashing settings invalidates the stored buckets:
+# run `python duplicates.py --rebuild` afterwards.
+
+SHINGLE_SIZE = 4
+# Signature length is BANDS * ROWS. 10 bands of 4 rows finds virtually every
+# pair above 0.7 similarity and few below 0.5.
+BANDS = 10
+ROWS = 4
+SIGNATURE_SIZE = BANDS * ROWS
+
+# Shingle (Jaccard) similarity at which tickets count as duplicates
+SIMILARITY = 0.7
+# Most recent tickets read from each bucket, and candidates checked exactly
+BUCKET_SCAN = 100
+CANDIDATES = 20
+# Upper bound on a cluster offered for merging
+MAX_CLUSTER = 1000
+BATCH_SIZE = 5000
+
+_NOT_WORD = re.compile(r"[^0-9a-z]+")
+# Spreads densified values of empty bins above any real one
+_EMPTY_OFFSET = 1 << 27
+
+
+# ================= SIGNATURES =================
+
+def shingles(text):
+    # Normalised text is plain ASCII, so it is encoded once here rather than
+    # once per shingle when hashing
+    text = " ".join(_NOT_WORD.sub(" ", text.lower()).split()).encode()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def similarity(a, b):
+    # Exact Jaccard similarity of two shingle sets
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def signature(shingle_set):
+    # One-permutation MinHash: each shingle is hashed once and kept as the
+    # minimum of one of SIGNATURE_SIZE bins, instead of SIGNATURE_SIZE full
+    # hash passes (a few dozen microseconds rather than half a millisecond
+    # per description). Empty bins borrow from the next filled one,
+    # offset by the distance, so short texts still fill every band; the
+    # result is kept to 32 bits for the bucket keys.
+    bins = [None] * SIGNATURE_SIZE
+    crc32 = zlib.crc32
+    for shingle in shingle_set:
+        value = (crc32(shingle) * 0x9E3779B1) & 0xFFFFFFFF
+        index, value = value % SIGNATURE_SIZE, value // SIGNATURE_SIZE
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+
+    if all(value is None for value in bins):
+        return None
+
+    filled = list(bins)
+    for index, value in enumerate(bins):
+        distance = 0
+        while value is None:
+            distance += 1
+            value = bins[(index + distance) % SIGNATURE_SIZE]
+        filled[index] = (value + distance * _EMPTY_OFFSET) & 0xFFFFFFFF
+    return filled
+
+
+def buckets(description):
+    # The BANDS bucket keys for a description, or [] if it has no text
+    minhash = signature(shingles(description))
+    if minhash is None:
+        return []
+    return [
+        zlib.crc32(struct.pack(f"{ROWS + 1}I", band, *minhash[band * ROWS:(band + 1) * ROWS]))
+        for band in range(BANDS)
+    ]
+
+
+# ================= INDEX =================
+
+def index_ticket(conn, ticket_id, description):
+    # Called inside the transaction that inserts the ticket
+    conn.executemany(
+        "INSERT OR IGNORE INTO ticket_lsh (bucket, ticket_id) VALUES (?, ?)",
+        [(bucket, ticket_id) for bucket in buckets(description)]
+    )
+
+
+def index_tickets(conn, where="", params=()):
+    # Adds every ticket matching `where` to the index
+    cursor = conn.execute(f"SELECT ticket_id, description FROM tickets {where}", params)
+    count = 0
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT OR IGNORE INTO ticket_lsh (bucket, ticket_id) VALUES (?, ?)",
+            sorted((bucket, ticket_id) for ticket_id, description in rows for bucket in buckets(description))
+        )
+        count += len(rows)
+    return count
+
+
+def queue_tickets(conn, after_id):
+    # Bulk loads queue their new tickets (ids above after_id) in
+    # ticket_lsh_backlog rather than hashing them inside the load's
+    # transaction; index_backlog catches up once the load has committed
+    conn.execute("""
+        INSERT INTO ticket_lsh_backlog (first_id, last_id)
+        SELECT ?, MAX(ticket_id) FROM ticket_rows WHERE ticket_id>? HAVING COUNT(*)
+        ON CONFLICT (first_id) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)
+    """, (after_id + 1, after_id))
+
+
+def index_backlog(batch_size=BATCH_SIZE):
+    # Indexes the queued tickets batch_size at a time and returns how many.
+    # Descriptions are hashed before the write lock is taken, and each batch
+    # commits on its own, so writers get in between; a batch that is
+    # interrupted is simply indexed again.
+    count = 0
+    while True:
+        with db.connection() as conn:
+            queued = conn.execute(
+                "SELECT first_id, last_id FROM ticket_lsh_backlog ORDER BY first_id LIMIT 1"
+            ).fetchone()
+            if queued is None:
+                return count
+            first_id, last_id = queued
+            rows = conn.execute(
+                "SELECT ticket_id, description FROM tickets WHERE ticket_id BETWEEN ? AND ?"
+                " ORDER BY ticket_id LIMIT ?", (first_id, last_id, batch_size)
+            ).fetchall()
+        # In key order, so the inserts walk the index instead of seeking
+        # to a random page for every key
+        keys = sorted((bucket, ticket_id) for ticket_id, description in rows for bucket in buckets(description))
+
+        with db.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO ticket_lsh (bucket, ticket_id) VALUES (?, ?)", keys)
+            conn.execute("DELETE FROM ticket_lsh_backlog WHERE first_id=?", (first_id,))
+            if len(rows) == batch_size and rows[-1][0] < last_id:
+                conn.execute(
+                    "INSERT OR IGNORE INTO ticket_lsh_backlog (first_id, last_id) VALUES (?, ?)",
+                    (rows[-1][0] + 1, last_id)
+                )
+        count += len(rows)
+
+
+def rebuild_index():
+    # Re-indexes every ticket in one transaction; run after changing the
+    # hashing settings above
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM ticket_lsh")
+        conn.execute("DELETE FROM ticket_lsh_backlog")
+        return index_tickets(conn)
+
+
+# ================= LOOKUP =================
+
+def similar_tickets(description, exclude_id=None, limit=5, scan=BUCKET_SCAN, candidates=CANDIDATES):
+    # Rows of (ticket_id, similarity, status, description) for tickets that
+    # are not Closed and whose descriptions are at least SIMILARITY alike,
+    # most similar first. Candidates are the tickets sharing the most
+    # buckets among the `scan` newest in each one.
+    keys = buckets(description)
+    if not keys:
+        return []
+
+    bucket_scan = " UNION ALL ".join(
+        "SELECT * FROM (SELECT ticket_id FROM ticket_lsh WHERE bucket=? ORDER BY ticket_id DESC LIMIT ?)"
+        for _ in keys
+    )
+    params = [value for bucket in keys for value in (bucket, scan)]
+
+    # Archived tickets drop out in the join; their buckets stay in case the
+    # ticket is reopened.
+    with db.connection() as conn:
+        rows = conn.execute(f"""
+            SELECT ticket_id, t.status, t.description
+            FROM ({bucket_scan}) JOIN tickets t USING (ticket_id)
+            WHERE t.status!='Closed' AND ticket_id IS NOT ?
+            GROUP BY ticket_id ORDER BY COUNT(*) DESC, ticket_id DESC LIMIT ?
+        """, params + [exclude_id, candidates]).fetchall()
+
+    wanted = shingles(description)
+    matches = []
+    for ticket_id, status, text in rows:
+        score = similarity(wanted, shingles(text))
+        if score >= SIMILARITY:
+            matches.append((ticket_id, score, status, text))
+
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches[:limit]
+
+
+def duplicate_cluster(ticket_id):
+    # The open tickets that look like duplicates of `ticket_id`, or None if
+    # the ticket does not exist
+    with db.connection() as conn:
+        row = conn.execute(
+            "SELECT description FROM tickets WHERE ticket_id=?", (ticket_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return similar_tickets(row[0], exclude_id=ticket_id, limit=MAX_CLUSTER,
+                           scan=MAX_CLUSTER, candidates=MAX_CLUSTER)
+
+
+# ================= MERGING =================
+
+def merge_tickets(parent_id, child_ids, merged_by=None):
+    # Closes every child and records it as a duplicate of parent_id, all in
+    # one transaction. Returns how many children were merged.
+    with db.transaction() as conn:
+        if conn.execute("SELECT 1 FROM ticket_rows WHERE ticket_id=?", (parent_id,)).fetchone() is None:
+            raise ValueError(f"Ticket {parent_id} does not exist")
+        return close_duplicates(parent_id, child_ids, merged_by)
+
+
+def close_duplicates(parent_id, child_ids, merged_by=None):
+    # The merge itself, for children in this database whatever database the
+    # parent is in (see shards.merge_tickets)
+    child_ids = [child_id for child_id in dict.fromkeys(child_ids) if child_id != parent_id]
+
+    with db.transaction() as conn:
+        merged = 0
+        for start in range(0, len(child_ids), 500):
+            chunk = child_ids[start:start + 500]
+            marks = ", ".join("?" * len(chunk))
+            conn.execute(f"""
+                INSERT OR REPLACE INTO ticket_merges (ticket_id, parent_id, merged_by)
+                SELECT ticket_id, ?, ? FROM ticket_rows WHERE ticket_id IN ({marks})
+            """, [parent_id, merged_by, *chunk])
+            # Same closed_at rule as repository.set_ticket_status
+            merged += conn.execute(f"""
+                UPDATE ticket_rows SET
+                    status_code=3,
+                    updated_at=CURRENT_TIMESTAMP,
+                    closed_at=CASE WHEN status_code=3 AND closed_at IS NOT NULL
+                                   THEN closed_at ELSE CURRENT_TIMESTAMP END
+                WHERE ticket_id IN ({marks})
+            """, chunk).rowcount
+
+        return merged
+
+
+def merged_into(parent_id):
+    with db.connection() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT ticket_id FROM ticket_merges WHERE parent_id=? ORDER BY ticket_id",
+            (parent_id,)
+        )]
+
+
+if __name__ == "__main__":
+    import migrations
+    import shards
+
+    migrations.migrate()
+
+    if "--rebuild" in sys.argv:
+        start = time.perf_counter()
+        count = sum(shards.fan_out(rebuild_index))
+        print(f"✅ Indexed {count} tickets in {time.perf_counter() - start:.1f}s")
+    elif "--backlog" in sys.argv:
+        start = time.perf_counter()
+        count = shards.index_duplicates()
+        print(f"✅ Indexed {count} queued tickets in {time.perf_counter() - start:.1f}s")
+    elif len(sys.argv) > 1:
+        for ticket_id, score, status, text in shards.similar_tickets(" ".join(sys.argv[1:]), limit=10):
+            print(f"#{ticket_id}  {score:.0%}  [{status}] {text}")
+    else:
+        print("Usage: python duplicates.py <description> | --rebuild | --backlog")
+
+    db.close_all()
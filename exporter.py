@@ -0,0 +1,320 @@
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import time
+
+import archive
+import db
+import metrics
+import migrations
+import repository
+import shards
+
+EXPORT_HEADER = ["Ticket ID", "User ID", "Category", "Description", "Priority", "Status"]
+EXPORT_COLUMNS = "ticket_id, user_id, category, description, priority, status"
+CHUNK_SIZE = 5000
+
+
+# ================= QUERY =================
+
+def iter_ticket_chunks(status=None, created_from=None, created_to=None,
+                       include_archived=False, changed_since=None,
+                       chunk_size=CHUNK_SIZE, columns=EXPORT_COLUMNS):
+    # Streams the export query with fetchmany so only one chunk of rows is in
+    # memory at a time. Dates are inclusive 'YYYY-MM-DD' strings;
+    # changed_since is an updated_at timestamp.
+    filters = []
+    if created_from is not None:
+        filters.append(("created_at>=?", str(created_from)))
+    if created_to is not None:
+        filters.append(("created_at<date(?, '+1 day')", str(created_to)))
+    if changed_since is not None:
+        filters.append(("updated_at>=?", str(changed_since)))
+
+    # Live tickets are filtered on the status code, archived ones by name
+    archived_filters = list(filters)
+    if status is not None:
+        filters.append(repository.code_filter("status", status))
+        archived_filters.append(("status=?", status))
+
+    where, params = repository.where_clause(filters)
+
+    if include_archived:
+        archived_where, archived_params = repository.where_clause(archived_filters)
+        select = archive.union_query(columns, where, archived_where)
+        params += archived_params
+    else:
+        select = f"SELECT {columns} FROM tickets {where}"
+
+    with db.connection() as conn:
+        cursor = conn.execute(f"{select} ORDER BY ticket_id", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+# ================= CSV =================
+
+@metrics.timed("export_csv")
+def write_csv(binary_file, compress=False, **filters):
+    # Writes the CSV (optionally gzip-compressed) into an open binary file and
+    # returns (rows written, seconds taken). The file itself is left open.
+    start = time.perf_counter()
+    stream = gzip.GzipFile(fileobj=binary_file, mode="wb") if compress else binary_file
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_HEADER)
+
+    count = 0
+    for rows in shards.merge_chunks(iter_ticket_chunks, CHUNK_SIZE, **filters):
+        writer.writerows(rows)
+        count += len(rows)
+
+    text.flush()
+    text.detach()
+    if compress:
+        stream.close()
+
+    return count, time.perf_counter() - start
+
+
+def export_csv(path, compress=False, **filters):
+    with open(path, "wb") as file:
+        return write_csv(file, compress=compress, **filters)
+
+
+# ================= PARQUET =================
+# Typed, columnar export for analytics. pyarrow is imported only when a
+# Parquet export actually runs, so the CSV paths never pay for it.
+
+# datetime() normalises imported timestamps and turns unparseable ones into
+# NULL so they cast cleanly; archived assigned_to values may be integers.
+PARQUET_COLUMNS = (
+    "ticket_id, user_id, category, description, priority, status, "
+    "CAST(assigned_to AS TEXT), datetime(created_at), datetime(updated_at), datetime(closed_at)"
+)
+# Low-cardinality columns, stored dictionary-encoded
+DICTIONARY_COLUMNS = ("category", "priority", "status")
+PARTITIONS = ("status", "month")
+ROW_GROUP_SIZE = 64 * 1024
+PARQUET_COMPRESSION = "zstd"
+STATE_FILE = "_export_state.json"
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    return pyarrow, pyarrow.parquet
+
+
+def _schema(pa):
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("ticket_id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("category", dictionary),
+        ("description", pa.string()),
+        ("priority", dictionary),
+        ("status", dictionary),
+        ("assigned_to", pa.string()),
+        ("created_at", pa.timestamp("s")),
+        ("updated_at", pa.timestamp("s")),
+        ("closed_at", pa.timestamp("s")),
+    ])
+
+
+def _partition_key(partition_by, row):
+    # Hive-style directory value for a row: status, or YYYY-MM of created_at
+    value = row[5] if partition_by == "status" else row[7] and row[7][:7]
+    return value or NULL_PARTITION
+
+
+def _write_parquet(open_writer, partition_by=None, **filters):
+    # Streams the export query into Parquet, one row group per chunk (per
+    # partition, when partitioned). open_writer(key, schema) returns the
+    # ParquetWriter for a partition key, or for None when unpartitioned.
+    # Returns the number of rows written.
+    pa, _ = _pyarrow()
+    if partition_by not in (None, *PARTITIONS):
+        raise ValueError(f"partition_by must be one of {', '.join(PARTITIONS)}")
+
+    schema = _schema(pa)
+    # The status directory already holds the value; month is derived, so the
+    # created_at column stays.
+    keep = [i for i, name in enumerate(schema.names) if not (partition_by == "status" and name == "status")]
+    file_schema = pa.schema([schema.field(i) for i in keep])
+
+    writers = {}
+    count = 0
+    try:
+        for rows in shards.merge_chunks(
+            iter_ticket_chunks, ROW_GROUP_SIZE, columns=PARQUET_COLUMNS, **filters
+        ):
+            groups = {}
+            for row in rows:
+                key = _partition_key(partition_by, row) if partition_by else None
+                groups.setdefault(key, []).append(row)
+
+            for key, group in groups.items():
+                columns = list(zip(*group))
+                arrays = []
+                for i in keep:
+                    field = schema.field(i)
+                    if pa.types.is_timestamp(field.type):
+                        arrays.append(pa.array(columns[i], pa.string()).cast(field.type))
+                    else:
+                        arrays.append(pa.array(columns[i], field.type))
+
+                writer = writers.get(key)
+                if writer is None:
+                    writer = writers[key] = open_writer(key, file_schema)
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=file_schema))
+
+            count += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return count
+
+
+def _parquet_writer(where, schema):
+    _, pq = _pyarrow()
+    return pq.ParquetWriter(
+        where, schema,
+        compression=PARQUET_COMPRESSION,
+        use_dictionary=list(DICTIONARY_COLUMNS),
+    )
+
+
+@metrics.timed("export_parquet")
+def write_parquet(binary_file, **filters):
+    # Writes a single Parquet file into an open binary file (or path) and
+    # returns (rows written, seconds taken).
+    start = time.perf_counter()
+    count = _write_parquet(lambda _, schema: _parquet_writer(binary_file, schema), **filters)
+    return count, time.perf_counter() - start
+
+
+def _read_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+@metrics.timed("export_parquet")
+def export_parquet_dataset(directory, partition_by=None, incremental=False, **filters):
+    # Writes a Hive-partitioned dataset (e.g. month=2026-10/part-00001.parquet)
+    # and returns (rows written, seconds taken). A full export replaces the
+    # dataset's part files. An incremental export adds new part files holding
+    # only tickets whose updated_at is at or past the previous export's start,
+    # so a ticket can appear in several parts: readers keep the row with the
+    # latest updated_at per ticket_id. If an export dies midway, its state is
+    # not saved and the next run covers the same tickets again.
+    start = time.perf_counter()
+    options = {key: None if value is None else str(value) for key, value in filters.items()}
+    state = _read_state(directory) if incremental else None
+
+    if state is not None:
+        if state["partition_by"] != partition_by or state["filters"] != options:
+            raise ValueError(
+                f"{directory} was exported with different partitioning or filters; "
+                "run a full export instead"
+            )
+        changed_since, part = state["exported_through"], state["parts"] + 1
+    else:
+        for old in glob.glob(os.path.join(directory, "**", "part-*.parquet"), recursive=True):
+            os.remove(old)
+        changed_since, part = None, 1
+
+    # Taken under the write lock (of every shard): any write stamped before
+    # this time has committed by now, so the export below sees it or the
+    # next run will.
+    with shards.write_lock() as conn:
+        exported_through = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+
+    def open_writer(key, schema):
+        folder = os.path.join(directory, f"{partition_by}={key}") if partition_by else directory
+        os.makedirs(folder, exist_ok=True)
+        return _parquet_writer(os.path.join(folder, f"part-{part:05d}.parquet"), schema)
+
+    count = _write_parquet(open_writer, partition_by, changed_since=changed_since, **filters)
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, STATE_FILE), "w", encoding="utf-8") as file:
+        json.dump({
+            "partition_by": partition_by,
+            "filters": options,
+            "exported_through": exported_through,
+            "parts": part,
+        }, file, indent=2)
+
+    return count, time.perf_counter() - start
+
+
+def rows_per_second(count, seconds):
+    return count / seconds if seconds > 0 else float(count)
+
+
+def add_arguments(parser):
+    # Shared with App.py's export command
+    parser.add_argument("output", help="CSV/Parquet file, or dataset directory with --partition-by/--incremental")
+    parser.add_argument("--format", choices=("csv", "parquet"),
+                        help="defaults to the output file's extension")
+    parser.add_argument("--gzip", action="store_true", help="compress CSV output")
+    parser.add_argument("--partition-by", choices=PARTITIONS)
+    parser.add_argument("--incremental", action="store_true",
+                        help="add only tickets changed since the last export of this dataset")
+    parser.add_argument("--status")
+    parser.add_argument("--created-from", metavar="YYYY-MM-DD")
+    parser.add_argument("--created-to", metavar="YYYY-MM-DD")
+    parser.add_argument("--include-archived", action="store_true")
+
+
+def export_from_args(args):
+    # Runs the export add_arguments describes; returns (count, seconds)
+    filters = {
+        "status": args.status,
+        "created_from": args.created_from,
+        "created_to": args.created_to,
+        "include_archived": args.include_archived,
+    }
+    fmt = args.format or ("parquet" if args.partition_by or args.incremental
+                          or args.output.endswith(".parquet") else "csv")
+
+    if fmt == "csv":
+        return export_csv(args.output, compress=args.gzip, **filters)
+    if args.partition_by or args.incremental:
+        return export_parquet_dataset(args.output, args.partition_by, args.incremental, **filters)
+    return write_parquet(args.output, **filters)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export tickets to CSV or Parquet")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    migrations.migrate()
+    count, seconds = export_from_args(args)
+
+    print(f"✅ {count} tickets exported to {args.output} in {seconds:.2f}s "
+          f"({rows_per_second(count, seconds):,.0f} rows/s)")
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import bcrypt
+
+import db
+import duplicates
+import migrations
+import repository
+
+# Weighted distributions modelled on a typical internal helpdesk
+CATEGORIES = (("Software", 0.40), ("Hardware", 0.35), ("Network", 0.25))
+PRIORITIES = (("Low", 0.30), ("Medium", 0.50), ("High", 0.20))
+STATUSES = (("Closed", 0.60), ("In Progress", 0.15), ("Open", 0.25))
+ADMIN_SHARE = 0.02
+# Median hours from open to close; actual times are log-normally spread
+CLOSE_HOURS = {"High": 4, "Medium": 24, "Low": 72}
+
+DESCRIPTIONS = {
+    "Software": (
+        "Software not tested properly after {n} update.",
+        "Functionalities of {thing} not working properly.",
+        "{thing} crashes on startup with error {n}.",
+        "Cannot install {thing} on laptop {n}.",
+    ),
+    "Hardware": (
+        "Monitor {n} has scratches, screen needs cleaning.",
+        "Mouse hangs up on desk {n}.",
+        "CPU not working correctly in room {n}.",
+        "Printer {n} jams on every second page.",
+    ),
+    "Network": (
+        "5G Network not reached in area {n}.",
+        "Network bandwidth is low on floor {n}.",
+        "VPN disconnects every {n} minutes.",
+        "Wi-Fi access point {n} not reachable.",
+    ),
+}
+THINGS = ("Outlook", "the ERP client", "Teams", "the backend service", "Excel", "the VPN client")
+
+# Generated users all share one password so millions of them can be created
+# without running bcrypt millions of times.
+GENERATED_PASSWORD = "password123"
+
+BATCH_SIZE = 100000
+
+
+def _weighted(choices, rng, count):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights, k=count)
+
+
+def _ticket_rows(count, users, first_user_id, days, rng):
+    # UTC, like CURRENT_TIMESTAMP
+    now = datetime.now(timezone.utc)
+    categories = _weighted(CATEGORIES, rng, count)
+    priorities = _weighted(PRIORITIES, rng, count)
+    statuses = _weighted(STATUSES, rng, count)
+
+    for i in range(count):
+        category = categories[i]
+        description = rng.choice(DESCRIPTIONS[category]).format(
+            n=rng.randint(1, 999), thing=rng.choice(THINGS)
+        )
+        created = now - timedelta(seconds=rng.randint(0, days * 86400))
+
+        closed = None
+        if statuses[i] == "Closed":
+            hours = rng.lognormvariate(math.log(CLOSE_HOURS[priorities[i]]), 1.0)
+            closed = min(now, created + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+
+        yield (
+            first_user_id + rng.randrange(users),
+            category,
+            description,
+            repository.PRIORITY_CODES[priorities[i]],
+            repository.STATUS_CODES[statuses[i]],
+            created.strftime("%Y-%m-%d %H:%M:%S"),
+            closed,
+        )
+
+
+def generate(users, tickets, seed=0, days=365, batch_size=BATCH_SIZE, password_rounds=4, db_name=None):
+    # Appends `users` users and `tickets` tickets to the database. Tickets
+    # are committed in batches so tens of millions of rows never sit in one
+    # transaction or in memory.
+    rng = random.Random(seed)
+    migrations.migrate(db_name)
+    hashed = bcrypt.hashpw(GENERATED_PASSWORD.encode(), bcrypt.gensalt(password_rounds))
+
+    with db.transaction(db_name) as conn:
+        # Rows below go straight into this file
+        if conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]:
+            raise ValueError("The database is split into shards; generate data before splitting")
+        first_user_id = conn.execute(
+            "SELECT COALESCE(MAX(user_id), 0) + 1 FROM users"
+        ).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO users (user_id, username, password, role) VALUES (?, ?, ?, ?)",
+            (
+                (user_id, f"user{user_id}", hashed,
+                 "Admin" if rng.random() < ADMIN_SHARE else "Employee")
+                for user_id in range(first_user_id, first_user_id + users)
+            )
+        )
+
+    done = 0
+    while done < tickets:
+        count = min(batch_size, tickets - done)
+        with db.transaction(db_name) as conn, repository.bulk_load(conn):
+            conn.executemany(f"""
+                INSERT INTO ticket_rows (user_id, category_code, description, priority_code,
+                                         status_code, created_at, closed_at, updated_at)
+                VALUES (?, {repository.CATEGORY_CODE}, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, _ticket_rows(count, users, first_user_id, days, rng))
+        done += count
+
+    # The duplicate index catches up after the loads have committed
+    with db.using(db_name):
+        duplicates.index_backlog()
+
+    return first_user_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a helpdesk database with synthetic data")
+    parser.add_argument("--db", default=db.DB_NAME)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tickets", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many days")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        generate(args.users, args.tickets, seed=args.seed, days=args.days, db_name=args.db)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    seconds = time.perf_counter() - start
+
+    print(f"✅ Added {args.users} users and {args.tickets} tickets to {args.db} "
+          f"in {seconds:.1f}s ({args.tickets / seconds:,.0f} tickets/s)")
+    print(f"Generated users log in as user<ID> / {GENERATED_PASSWORD}")
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
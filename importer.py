@@ -0,0 +1,191 @@
+import csv
+import gzip
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+import metrics
+import migrations
+import repository
+import shards
+from validation import canonical_category, validate_priority, validate_status
+
+BATCH_SIZE = 50000
+MAX_REPORTED_ERRORS = 1000
+
+# Accept the export_tickets_to_csv header as well as raw column names
+FIELD_NAMES = {
+    "Ticket ID": "ticket_id",
+    "User ID": "user_id",
+    "Category": "category",
+    "Description": "description",
+    "Priority": "priority",
+    "Status": "status",
+    "Created At": "created_at",
+}
+
+# updated_at is when the row was written here, whatever created_at says, so
+# reporting rollups pick imported tickets up. Their close time is unknown.
+# ticket_id is only set when the tickets are split across shards. Priority
+# and status arrive as codes (repository.PRIORITY_CODES/STATUS_CODES).
+INSERT_SQL = f"""
+    INSERT INTO ticket_rows (ticket_id, user_id, category_code, description, priority_code,
+                             status_code, created_at, updated_at)
+    VALUES (?, ?, {repository.CATEGORY_CODE}, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+"""
+
+
+# ================= READERS =================
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _read_csv(file):
+    reader = csv.reader(file)
+    keys = [FIELD_NAMES.get(name, name) for name in next(reader, [])]
+
+    for line_number, values in enumerate(reader, start=2):
+        yield line_number, dict(zip(keys, values))
+
+
+def _read_jsonl(file):
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            record = {FIELD_NAMES.get(key, key): value for key, value in record.items()}
+        yield line_number, record
+
+
+def _is_jsonl(path):
+    return path.removesuffix(".gz").endswith((".jsonl", ".ndjson"))
+
+
+# ================= VALIDATION =================
+
+def _timestamp(value):
+    # ISO 8601 date or date and time -> 'YYYY-MM-DD HH:MM:SS' in UTC, the
+    # form CURRENT_TIMESTAMP stores and the rollups bucket by. Raises
+    # ValueError for anything else, e.g. '10/17/2026'.
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat(" ", "seconds")
+
+
+def _to_row(record):
+    # Returns an INSERT parameter tuple or raises ValueError with the reason
+    if not isinstance(record, dict):
+        raise ValueError("not a valid record")
+
+    category = str(record.get("category") or "")
+    category_name = canonical_category(category)
+    description = str(record.get("description") or "").strip()
+    priority = str(record.get("priority") or "").strip().capitalize()
+    status = str(record.get("status") or "Open").strip()
+    user_id = record.get("user_id")
+    created_at = record.get("created_at") or None
+
+    if not category.strip() or not description:
+        raise ValueError("category and description are required")
+    if category_name is None:
+        raise ValueError(f"invalid category {category.strip()!r}")
+    if not validate_priority(priority):
+        raise ValueError(f"invalid priority {priority!r}")
+    if not validate_status(status):
+        raise ValueError(f"invalid status {status!r}")
+
+    if created_at is not None:
+        try:
+            created_at = _timestamp(created_at)
+        except ValueError:
+            raise ValueError(f"invalid created at {created_at!r}")
+
+    if user_id in (None, ""):
+        user_id = None
+    else:
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid user id {user_id!r}")
+
+    return (user_id, category_name, description,
+            repository.PRIORITY_CODES[priority], repository.STATUS_CODES[status], created_at)
+
+
+# ================= IMPORT =================
+
+@metrics.timed("import_tickets")
+def import_tickets(path, batch_size=BATCH_SIZE):
+    # Validates every record and inserts the good ones with executemany in a
+    # single transaction per shard, under repository.bulk_load() (see
+    # shards.bulk_insert). Returns (inserted, error count, errors, seconds),
+    # where errors holds up to MAX_REPORTED_ERRORS (line, reason) pairs.
+    start = time.perf_counter()
+    inserted = error_count = 0
+    errors = []
+    batch = []
+
+    with _open(path) as file, shards.bulk_insert(INSERT_SQL) as insert:
+        records = _read_jsonl(file) if _is_jsonl(path) else _read_csv(file)
+
+        for line_number, record in records:
+            try:
+                batch.append(_to_row(record))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((line_number, str(e)))
+                continue
+
+            if len(batch) >= batch_size:
+                insert(batch)
+                inserted += len(batch)
+                batch.clear()
+
+        if batch:
+            insert(batch)
+            inserted += len(batch)
+
+    return inserted, error_count, errors, time.perf_counter() - start
+
+
+def index_imported_tickets():
+    # Run once the import has committed: imported tickets are only offered
+    # as duplicates after this pass hashes their descriptions
+    start = time.perf_counter()
+    count = shards.index_duplicates()
+    if count:
+        seconds = time.perf_counter() - start
+        rate = count / seconds if seconds > 0 else float(count)
+        print(f"✅ Indexed {count} tickets for duplicate detection in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+def print_import_report(inserted, error_count, errors, seconds, shown=20):
+    rate = inserted / seconds if seconds > 0 else float(inserted)
+    print(f"✅ Imported {inserted} tickets in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+    if error_count:
+        print(f"❌ Skipped {error_count} invalid rows:")
+        for line_number, reason in errors[:shown]:
+            print(f"  line {line_number}: {reason}")
+        if error_count > shown:
+            print(f"  ... and {error_count - shown} more")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python importer.py <tickets.csv|tickets.jsonl[.gz]>")
+        sys.exit(2)
+
+    migrations.migrate()
+    print_import_report(*import_tickets(sys.argv[1]))
+    index_imported_tickets()
@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Starts a local api.py against a throwaway database and drives it with
+# concurrent keep-alive clients, reporting p50/p99 latency and requests/s.
+
+# (operation, weight) per role; half the clients are employees, half admins
+MIX = {
+    "Employee": (("raise_ticket", 0.55), ("my_tickets", 0.44), ("login", 0.01)),
+    "Admin": (("all_tickets", 0.45), ("statistics", 0.35), ("update_status", 0.19), ("login", 0.01)),
+}
+OPERATIONS = ("raise_ticket", "my_tickets", "all_tickets", "statistics", "update_status", "login")
+
+
+# ================= CLIENT =================
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+        self.token = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+        payload = json.dumps(body).encode() if body is not None else b""
+        headers = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n"
+        if self.token:
+            headers += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(headers.encode() + b"\r\n" + payload)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        data = await self.reader.readexactly(length)
+        return status, data
+
+    async def login(self, username, password):
+        status, data = await self.request("POST", "/login", {"username": username, "password": password})
+        if status != 200:
+            raise RuntimeError(f"login failed: {data!r}")
+        self.token = json.loads(data)["token"]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# ================= LOAD =================
+
+async def run_client(client, user, duration, results, ticket_ids):
+    username, password, role = user
+    names, weights = zip(*MIX[role])
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        start = time.perf_counter()
+
+        if name == "raise_ticket":
+            status, data = await client.request("POST", "/tickets", {
+                "category": random.choice(["Hardware", "Software", "Network"]),
+                "description": f"Load test ticket {random.randint(1, 10**6)}",
+                "priority": random.choice(["Low", "Medium", "High"]),
+            })
+            if status == 201:
+                ticket_ids.append(json.loads(data)["ticket_id"])
+        elif name == "my_tickets":
+            status, _ = await client.request("GET", "/tickets?page_size=20")
+        elif name == "all_tickets":
+            status, _ = await client.request("GET", "/tickets?status=Open&page_size=50")
+        elif name == "statistics":
+            status, _ = await client.request("GET", "/statistics")
+        elif name == "update_status" and ticket_ids:
+            status, _ = await client.request(
+                "PATCH", f"/tickets/{random.choice(ticket_ids)}",
+                {"status": random.choice(["Open", "In Progress", "Closed"])}
+            )
+        elif name == "update_status":
+            continue
+        else:
+            status, _ = await client.request("POST", "/login", {"username": username, "password": password})
+
+        results.append((name, time.perf_counter() - start, status))
+
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def load(port, concurrency, duration):
+    setup = Client(port)
+    users = [("loadadmin1", "admin123", "Admin"), ("loaduser1", "user1234", "Employee")]
+    for username, password, role in users:
+        await setup.request("POST", "/register", {"username": username, "password": password, "role": role})
+    setup.close()
+
+    # Log every client in before the clock starts
+    clients = [Client(port) for _ in range(concurrency)]
+    await asyncio.gather(*[
+        client.login(*users[i % 2][:2]) for i, client in enumerate(clients)
+    ])
+
+    results, ticket_ids = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(client, users[i % 2], duration, results, ticket_ids)
+        for i, client in enumerate(clients)
+    ])
+    for client in clients:
+        client.close()
+    return results, time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a local helpdesk API instance")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--bcrypt-rounds", default="10")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(
+        os.environ,
+        HELPDESK_DB=os.path.join(workdir, "load.db"),
+        HELPDESK_AUDIT_LOG=os.path.join(workdir, "audit_log.txt"),
+        HELPDESK_BCRYPT_ROUNDS=args.bcrypt_rounds,
+    )
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api.py"),
+         "--port", str(port)],
+        env=env, stdout=subprocess.PIPE, text=True
+    )
+
+    try:
+        print(server.stdout.readline().strip())
+        results, elapsed = asyncio.run(load(port, args.concurrency, args.duration))
+    finally:
+        server.terminate()
+        server.wait()
+
+    errors = sum(1 for _, _, status in results if status >= 400)
+    print(f"\n===== Load Test ({args.concurrency} clients, {elapsed:.1f}s) =====")
+    print(f"Requests : {len(results)}  ({len(results) / elapsed:,.0f} req/s, {errors} errors)")
+
+    print(f"{'Endpoint':<14}{'Count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in OPERATIONS + ("ALL",):
+        latencies = [seconds for n, seconds, _ in results if name in (n, "ALL")]
+        if latencies:
+            print(f"{name:<14}{len(latencies):>8}"
+                  f"{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
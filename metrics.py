@@ -0,0 +1,261 @@
+import bisect
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Set HELPDESK_METRICS=0 to open plain, uninstrumented connections
+ENABLED = os.environ.get("HELPDESK_METRICS", "1") != "0"
+
+SLOW_QUERY_MS = float(os.environ.get("HELPDESK_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.environ.get("HELPDESK_SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_KEEP = 100
+PLANNABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_LABEL_LENGTH = 200
+
+SQL_SECONDS = "helpdesk_sql_statement_seconds"
+SQL_ROWS = "helpdesk_sql_rows_returned_total"
+OPERATION_SECONDS = "helpdesk_operation_seconds"
+SLOW_QUERIES = "helpdesk_sql_slow_queries_total"
+
+HELP = {
+    SQL_SECONDS: ("histogram", "Time to execute each SQL statement"),
+    SQL_ROWS: ("counter", "Rows fetched per SQL statement"),
+    OPERATION_SECONDS: ("histogram", "Time spent in instrumented operations"),
+    SLOW_QUERIES: ("counter", "Statements slower than the slow-query threshold"),
+}
+
+
+# ================= REGISTRY =================
+
+class Histogram:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+
+
+def observe(name, label, seconds):
+    with _lock:
+        histogram = _histograms.get((name, label))
+        if histogram is None:
+            histogram = _histograms[(name, label)] = Histogram()
+        histogram.observe(seconds)
+
+
+def inc(name, label, amount=1):
+    with _lock:
+        _counters[(name, label)] = _counters.get((name, label), 0) + amount
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        slow_queries.clear()
+
+
+def timed(operation):
+    # Decorator recording how long each call takes under OPERATION_SECONDS
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(OPERATION_SECONDS, operation, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# ================= SQL =================
+
+def _statement_label(sql):
+    return " ".join(sql.split())[:STATEMENT_LABEL_LENGTH]
+
+
+def _record_slow(conn, label, sql, parameters, seconds):
+    inc(SLOW_QUERIES, label)
+
+    plan = None
+    if sql.split(None, 1)[0].upper() in PLANNABLE:
+        try:
+            plan = " | ".join(
+                row[3] for row in sqlite3.Connection.execute(
+                    conn, "EXPLAIN QUERY PLAN " + sql, parameters
+                )
+            ) or None
+        except sqlite3.Error:
+            plan = None
+
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round(seconds * 1000, 2),
+        "statement": label,
+        "plan": plan,
+    }
+    slow_queries.append(entry)
+
+    try:
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as file:
+            file.write(
+                f"[{entry['timestamp']}] | {entry['ms']} ms | {label} | Plan: {plan or '-'}\n"
+            )
+    except OSError:
+        pass
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _label = None
+
+    def _finish(self, sql, parameters, start):
+        seconds = time.perf_counter() - start
+        self._label = _statement_label(sql)
+        observe(SQL_SECONDS, self._label, seconds)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            _record_slow(self.connection, self._label, sql, parameters, seconds)
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(sql, parameters, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Bind NULLs for the plan; the real rows are already consumed
+            self._finish(sql, (None,) * sql.count("?"), start)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            inc(SQL_ROWS, self._label)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        inc(SQL_ROWS, self._label, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        inc(SQL_ROWS, self._label, len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        inc(SQL_ROWS, self._label)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Routes Connection.execute shortcuts through InstrumentedCursor, which
+    # times each statement and counts the rows read from it.
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            observe(OPERATION_SECONDS, "sql_commit", time.perf_counter() - start)
+
+
+connection_factory = InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+# ================= REPORTING =================
+
+def snapshot():
+    with _lock:
+        histograms = {key: (list(h.buckets), h.count, h.sum) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    return histograms, counters
+
+
+def statement_summary(limit=None):
+    # Rows of (statement, calls, total ms, mean ms, rows) by total time spent
+    histograms, counters = snapshot()
+    rows = [
+        (label, count, total * 1000, total * 1000 / count, counters.get((SQL_ROWS, label), 0))
+        for (name, label), (_, count, total) in histograms.items()
+        if name == SQL_SECONDS and count
+    ]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:limit]
+
+
+def operation_summary():
+    # Rows of (operation, calls, total ms, mean ms)
+    histograms, _ = snapshot()
+    rows = [
+        (label, count, total * 1000, total * 1000 / count)
+        for (name, label), (_, count, total) in histograms.items()
+        if name == OPERATION_SECONDS and count
+    ]
+    return sorted(rows)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus():
+    histograms, counters = snapshot()
+    label_names = {SQL_SECONDS: "statement", SQL_ROWS: "statement",
+                   SLOW_QUERIES: "statement", OPERATION_SECONDS: "operation"}
+    lines = []
+
+    for name, (kind, text) in HELP.items():
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        key_name = label_names[name]
+
+        if kind == "histogram":
+            for (metric, label), (buckets, count, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = f'{key_name}="{_label_value(label)}"'
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+        else:
+            for (metric, label), value in sorted(counters.items(), key=lambda item: str(item[0])):
+                if metric == name:
+                    lines.append(f'{name}{{{key_name}="{_label_value(label)}"}} {value}')
+
+    return "\n".join(lines) + "\n"
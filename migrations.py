@@ -0,0 +1,675 @@
+import db
+import duplicates
+
+
+# ================= STEPS =================
+# Each step runs in its own transaction and bumps PRAGMA user_version, so a
+# database is only ever moved forward one known version at a time. Append
+# new steps to the end; never edit a step that has already shipped.
+
+def _v1_base_tables(conn):
+    # The schema App.py used to create; databases made by db_setup.py already
+    # have these tables and are reconciled in the next step.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password BLOB NOT NULL,
+            role TEXT NOT NULL
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            status TEXT DEFAULT 'Open',
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _rebuild(conn, table, create_sql, select_exprs):
+    # SQLite cannot add NOT NULL/UNIQUE constraints or non-constant defaults
+    # with ALTER TABLE, so the table is copied into the merged layout.
+    existing = _columns(conn, table)
+    seq = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name=?", (table,)
+    ).fetchone()
+
+    conn.execute(create_sql.format(table=f"{table}_new"))
+    columns = ", ".join(select_exprs)
+    select = ", ".join(
+        expr if column in existing else "NULL"
+        for column, expr in select_exprs.items()
+    )
+    # A plain INSERT: a row the new constraints reject fails the migration
+    # rather than vanishing, so callers normalise rows beforehand
+    conn.execute(
+        f"INSERT INTO {table}_new ({columns}) "
+        f"SELECT {select} FROM {table} ORDER BY rowid"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+    if seq:
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq=MAX(seq, ?) WHERE name=?",
+            (seq[0], table)
+        )
+
+
+def _normalize_users(conn):
+    # db_setup.py never made usernames unique, and App.py never checked
+    # roles. Roles differing only in case or spacing are fixed; any other
+    # role fails the migration. Later users sharing a username are renamed
+    # to username_<user_id>; their user_id, and so their tickets, stay.
+    bad_roles = []
+    for user_id, role in conn.execute("SELECT user_id, role FROM users").fetchall():
+        if role in ("Employee", "Admin"):
+            continue
+        fixed = {"employee": "Employee", "admin": "Admin"}.get(str(role or "").strip().lower())
+        if fixed is None:
+            bad_roles.append(f"user {user_id} ({role!r})")
+        else:
+            conn.execute("UPDATE users SET role=? WHERE user_id=?", (fixed, user_id))
+    if bad_roles:
+        raise RuntimeError(
+            "Cannot migrate users whose role is not Employee or Admin: "
+            f"{', '.join(bad_roles)}. Fix their role and run the migration again."
+        )
+
+    duplicates = conn.execute("""
+        SELECT user_id, username FROM users u
+        WHERE EXISTS (SELECT 1 FROM users first
+                      WHERE first.username = u.username AND first.rowid < u.rowid)
+        ORDER BY rowid
+    """).fetchall()
+    for user_id, username in duplicates:
+        renamed = f"{username}_{user_id}"
+        while conn.execute("SELECT 1 FROM users WHERE username=?", (renamed,)).fetchone():
+            renamed += "_"
+        conn.execute("UPDATE users SET username=? WHERE user_id=?", (renamed, user_id))
+        print(f"⚠️ Duplicate username {username!r}: user {user_id} renamed to {renamed!r}")
+
+
+def _v2_merge_schemas(conn):
+    # Brings both historical layouts (App.py and db_setup.py) to one schema:
+    # unique usernames, role check, and the assignment/timestamp columns.
+    _normalize_users(conn)
+    _rebuild(conn, "users", """
+        CREATE TABLE {table} (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password BLOB NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('Employee', 'Admin'))
+        )
+    """, {
+        "user_id": "user_id",
+        "username": "username",
+        "password": "password",
+        "role": "role",
+    })
+
+    _rebuild(conn, "tickets", """
+        CREATE TABLE {table} (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            priority TEXT NOT NULL DEFAULT 'Medium',
+            status TEXT NOT NULL DEFAULT 'Open',
+            assigned_to TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """, {
+        "ticket_id": "ticket_id",
+        "user_id": "user_id",
+        "category": "COALESCE(category, '')",
+        "description": "COALESCE(description, '')",
+        "priority": "COALESCE(priority, 'Medium')",
+        "status": "COALESCE(status, 'Open')",
+        "assigned_to": "assigned_to",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+    })
+
+
+def _v3_ticket_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_user_id ON tickets(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tickets_status_priority ON tickets(status, priority)"
+    )
+
+
+def _v4_ticket_counters(conn):
+    # One row per (dimension, value), e.g. ('status', 'Open'), kept current by
+    # triggers so statistics never have to scan tickets.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_counters (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    """)
+
+    bump = """
+        INSERT INTO ticket_counters (dimension, value, count) VALUES ('{dimension}', {value}, {delta})
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + ({delta});
+    """
+
+    def bumps(row, delta):
+        return "".join(
+            bump.format(dimension=dimension, value=value, delta=delta)
+            for dimension, value in (
+                ("total", "''"),
+                ("status", f"{row}.status"),
+                ("priority", f"{row}.priority"),
+                ("category", f"{row}.category"),
+            )
+        )
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_insert
+        AFTER INSERT ON tickets
+        BEGIN {bumps("NEW", 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_delete
+        AFTER DELETE ON tickets
+        BEGIN {bumps("OLD", -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_update
+        AFTER UPDATE OF status, priority, category ON tickets
+        WHEN NEW.status IS NOT OLD.status
+          OR NEW.priority IS NOT OLD.priority
+          OR NEW.category IS NOT OLD.category
+        BEGIN {bumps("OLD", -1)} {bumps("NEW", 1)} END
+    """)
+
+    conn.execute("DELETE FROM ticket_counters")
+    for dimension, column in (("total", "''"), ("status", "status"),
+                              ("priority", "priority"), ("category", "category")):
+        conn.execute(f"""
+            INSERT INTO ticket_counters (dimension, value, count)
+            SELECT '{dimension}', {column}, COUNT(*) FROM tickets GROUP BY {column}
+        """)
+
+
+def _v5_ticket_search(conn):
+    # External-content FTS5 index over tickets: the text lives only in
+    # tickets, triggers keep the index in step, and the final 'rebuild'
+    # backfills rows that existed before this step.
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+            description, category,
+            content='tickets', content_rowid='ticket_id'
+        )
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_insert
+        AFTER INSERT ON tickets
+        BEGIN
+            INSERT INTO tickets_fts (rowid, description, category)
+            VALUES (NEW.ticket_id, NEW.description, NEW.category);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_delete
+        AFTER DELETE ON tickets
+        BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, description, category)
+            VALUES ('delete', OLD.ticket_id, OLD.description, OLD.category);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_update
+        AFTER UPDATE OF description, category ON tickets
+        BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, description, category)
+            VALUES ('delete', OLD.ticket_id, OLD.description, OLD.category);
+            INSERT INTO tickets_fts (rowid, description, category)
+            VALUES (NEW.ticket_id, NEW.description, NEW.category);
+        END
+    """)
+
+    conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+
+
+def _v6_ticket_rollups(conn):
+    # closed_at records when a ticket last became Closed (time-to-close);
+    # updated_at is the refresh high-water mark for the rollups, so every
+    # row needs one and it is indexed. Existing closed tickets get their
+    # last update as the best known close time.
+    if "closed_at" not in _columns(conn, "tickets"):
+        conn.execute("ALTER TABLE tickets ADD COLUMN closed_at TIMESTAMP")
+    conn.execute("""
+        UPDATE tickets SET
+            updated_at = COALESCE(updated_at, created_at, CURRENT_TIMESTAMP),
+            closed_at = CASE WHEN status='Closed' THEN COALESCE(updated_at, created_at) END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_updated_at ON tickets(updated_at)")
+
+    # Opened/closed counts and total close time per day or week bucket
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_rollups (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            category TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            opened INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            close_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket, category, priority)
+        ) WITHOUT ROWID
+    """)
+    # Time-to-close histogram, bucketed by when the ticket was closed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_close_times (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            category TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            duration TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket, category, priority, duration)
+        ) WITHOUT ROWID
+    """)
+    # What each ticket currently contributes to the rollups, so a changed
+    # ticket can be taken out and added back, and archived tickets stay in
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_tickets (
+            ticket_id INTEGER PRIMARY KEY,
+            created_at TEXT,
+            closed_at TEXT,
+            category TEXT NOT NULL,
+            priority TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+def _v7_dispatch_index(conn):
+    # Partial index over just the tickets waiting to be claimed, so the
+    # dispatch queue is rebuilt without touching assigned or closed rows.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tickets_dispatch
+        ON tickets(priority, created_at, category)
+        WHERE status='Open' AND assigned_to IS NULL
+    """)
+
+
+def _v8_duplicate_index(conn):
+    # LSH buckets of each ticket's description (see duplicates.py), and which
+    # tickets were merged into which as duplicates. Existing tickets are
+    # indexed here, at a few dozen microseconds each.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_lsh (
+            bucket INTEGER NOT NULL,
+            ticket_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, ticket_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_merges (
+            ticket_id INTEGER PRIMARY KEY,
+            parent_id INTEGER NOT NULL,
+            merged_by TEXT,
+            merged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ticket_merges_parent ON ticket_merges(parent_id)")
+    duplicates.index_tickets(conn)
+
+
+def _v9_shard_layout(conn):
+    # The shard files tickets are split across, in shard order (see
+    # shards.py); empty while everything is in this database
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS shards (
+            shard INTEGER PRIMARY KEY,
+            db_name TEXT NOT NULL
+        )
+    """)
+
+
+def _v10_ticket_codes(conn):
+    # Category, priority and status move out of every row into small lookup
+    # tables; ticket_rows holds their integer codes. A `tickets` view joins
+    # the names back under the old columns, so readers are unchanged while
+    # writers go to ticket_rows (see repository.py). Existing values are
+    # canonicalised on the way: names match whatever their case and
+    # surrounding spaces, unknown priorities and statuses take the column
+    # defaults, and other categories are kept as extra lookup rows.
+    for table, names in (("ticket_categories", ("Hardware", "Software", "Network")),
+                         ("ticket_priorities", ("Low", "Medium", "High")),
+                         ("ticket_statuses", ("Open", "In Progress", "Closed"))):
+        conn.execute(f"""
+            CREATE TABLE {table} (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        """)
+        conn.executemany(
+            f"INSERT INTO {table} (code, name) VALUES (?, ?)", enumerate(names, 1)
+        )
+    conn.execute("""
+        INSERT OR IGNORE INTO ticket_categories (name)
+        SELECT TRIM(category) FROM tickets
+        GROUP BY TRIM(category) COLLATE NOCASE ORDER BY MIN(ticket_id)
+    """)
+
+    # Foreign keys are not switched on (shards hold tickets without their
+    # users), so the category reference is enforced by a trigger below
+    conn.execute("""
+        CREATE TABLE ticket_rows (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            category_code INTEGER NOT NULL REFERENCES ticket_categories(code),
+            description TEXT NOT NULL,
+            priority_code INTEGER NOT NULL DEFAULT 2 CHECK(priority_code IN (1, 2, 3)),
+            status_code INTEGER NOT NULL DEFAULT 1 CHECK(status_code IN (1, 2, 3)),
+            assigned_to TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            closed_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO ticket_rows (ticket_id, user_id, category_code, description, priority_code,
+                                 status_code, assigned_to, created_at, updated_at, closed_at)
+        SELECT t.ticket_id, t.user_id, c.code, t.description, COALESCE(p.code, 2),
+               COALESCE(s.code, 1), t.assigned_to, t.created_at, t.updated_at, t.closed_at
+        FROM tickets t
+        JOIN ticket_categories c ON c.name = TRIM(t.category)
+        LEFT JOIN ticket_priorities p ON p.name = TRIM(t.priority)
+        LEFT JOIN ticket_statuses s ON s.name = TRIM(t.status)
+        ORDER BY t.ticket_id
+    """)
+    conn.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'ticket_rows', seq FROM sqlite_sequence WHERE name='tickets'
+    """)
+    conn.execute("DELETE FROM sqlite_sequence WHERE name='tickets'")
+    # Also drops the old triggers and indexes
+    conn.execute("DROP TABLE tickets")
+
+    conn.execute("""
+        CREATE VIEW tickets AS
+        SELECT t.ticket_id, t.user_id, c.name AS category, t.description,
+               p.name AS priority, s.name AS status, t.assigned_to,
+               t.created_at, t.updated_at, t.closed_at
+        FROM ticket_rows t
+        JOIN ticket_categories c ON c.code = t.category_code
+        JOIN ticket_priorities p ON p.code = t.priority_code
+        JOIN ticket_statuses s ON s.code = t.status_code
+    """)
+
+    for event in ("INSERT", "UPDATE OF category_code"):
+        conn.execute(f"""
+            CREATE TRIGGER trg_ticket_rows_category_{event.split()[0].lower()}
+            BEFORE {event} ON ticket_rows
+            WHEN NOT EXISTS (SELECT 1 FROM ticket_categories WHERE code=NEW.category_code)
+            BEGIN SELECT RAISE(ABORT, 'unknown ticket category'); END
+        """)
+
+    # The v4 counter and v5 search triggers under the same names, with the
+    # names looked up from the codes
+    def name(row, dimension):
+        table = {"category": "ticket_categories", "priority": "ticket_priorities",
+                 "status": "ticket_statuses"}[dimension]
+        return f"(SELECT name FROM {table} WHERE code={row}.{dimension}_code)"
+
+    bump = """
+        INSERT INTO ticket_counters (dimension, value, count) VALUES ('{dimension}', {value}, {delta})
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + ({delta});
+    """
+
+    def bumps(row, delta):
+        return bump.format(dimension="total", value="''", delta=delta) + "".join(
+            bump.format(dimension=dimension, value=name(row, dimension), delta=delta)
+            for dimension in ("status", "priority", "category")
+        )
+
+    conn.execute(f"""
+        CREATE TRIGGER trg_ticket_counters_insert
+        AFTER INSERT ON ticket_rows
+        BEGIN {bumps("NEW", 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_ticket_counters_delete
+        AFTER DELETE ON ticket_rows
+        BEGIN {bumps("OLD", -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_ticket_counters_update
+        AFTER UPDATE OF status_code, priority_code, category_code ON ticket_rows
+        WHEN NEW.status_code IS NOT OLD.status_code
+          OR NEW.priority_code IS NOT OLD.priority_code
+          OR NEW.category_code IS NOT OLD.category_code
+        BEGIN {bumps("OLD", -1)} {bumps("NEW", 1)} END
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER trg_tickets_fts_insert
+        AFTER INSERT ON ticket_rows
+        BEGIN
+            INSERT INTO tickets_fts (rowid, description, category)
+            VALUES (NEW.ticket_id, NEW.description, {name("NEW", "category")});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_tickets_fts_delete
+        AFTER DELETE ON ticket_rows
+        BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, description, category)
+            VALUES ('delete', OLD.ticket_id, OLD.description, {name("OLD", "category")});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_tickets_fts_update
+        AFTER UPDATE OF description, category_code ON ticket_rows
+        BEGIN
+            INSERT INTO tickets_fts (tickets_fts, rowid, description, category)
+            VALUES ('delete', OLD.ticket_id, OLD.description, {name("OLD", "category")});
+            INSERT INTO tickets_fts (rowid, description, category)
+            VALUES (NEW.ticket_id, NEW.description, {name("NEW", "category")});
+        END
+    """)
+
+    # idx_tickets_status keeps status-only listings in ticket_id order
+    conn.execute("CREATE INDEX idx_tickets_user_id ON ticket_rows(user_id)")
+    conn.execute("CREATE INDEX idx_tickets_status ON ticket_rows(status_code)")
+    conn.execute(
+        "CREATE INDEX idx_tickets_status_priority ON ticket_rows(status_code, priority_code)"
+    )
+    conn.execute("CREATE INDEX idx_tickets_updated_at ON ticket_rows(updated_at)")
+    conn.execute("""
+        CREATE INDEX idx_tickets_dispatch
+        ON ticket_rows(priority_code, created_at, category_code)
+        WHERE status_code=1 AND assigned_to IS NULL
+    """)
+
+    # The search index keeps its tokens (matching ignores case and spaces);
+    # counters and rollups are regrouped under the canonical names, and the
+    # archive, which stays in text, gets them too
+    conn.execute("DELETE FROM ticket_counters")
+    for dimension, column in (("total", "''"), ("status", "status"),
+                              ("priority", "priority"), ("category", "category")):
+        conn.execute(f"""
+            INSERT INTO ticket_counters (dimension, value, count)
+            SELECT '{dimension}', {column}, COUNT(*) FROM tickets GROUP BY {column}
+        """)
+
+    canonical = {
+        "category": "COALESCE((SELECT name FROM ticket_categories WHERE name=TRIM(category)), category)",
+        "priority": "COALESCE((SELECT name FROM ticket_priorities WHERE name=TRIM(priority)), 'Medium')",
+        "status": "COALESCE((SELECT name FROM ticket_statuses WHERE name=TRIM(status)), 'Open')",
+    }
+    conn.execute(f"""
+        UPDATE rollup_tickets SET
+            category={canonical["category"]}, priority={canonical["priority"]}
+    """)
+    # Only attached when archive.py is loaded (every app entry point)
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list")):
+        conn.execute(f"""
+            UPDATE archive.tickets SET
+                category={canonical["category"]},
+                priority={canonical["priority"]},
+                status={canonical["status"]}
+        """)
+    for table, keys, sums in (
+        ("ticket_rollups", ["period", "bucket"], ["opened", "closed", "close_seconds"]),
+        ("ticket_close_times", ["period", "bucket", "duration"], ["count"]),
+    ):
+        rows = conn.execute(f"""
+            SELECT {", ".join(keys)}, {canonical["category"]}, {canonical["priority"]},
+                   {", ".join(f"SUM({column})" for column in sums)}
+            FROM {table} GROUP BY {", ".join(str(i) for i in range(1, len(keys) + 3))}
+        """).fetchall()
+        columns = keys + ["category", "priority"] + sums
+        conn.execute(f"DELETE FROM {table}")
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+
+def _v11_duplicate_backlog(conn):
+    # Ranges of ticket ids that bulk loads added and the duplicate index has
+    # not caught up with yet (see duplicates.index_backlog)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_lsh_backlog (
+            first_id INTEGER PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+
+
+def _v12_ticket_view_codes(conn):
+    # The v10 view joined all three lookups on every row read. Status and
+    # priority codes are fixed, and so are the first three categories, so
+    # the view decodes them with CASE and looks up only other categories.
+    # The codes are exposed too: filtering on them uses the ticket_rows
+    # indexes, where a filter on a decoded name would scan.
+    conn.execute("DROP VIEW tickets")
+    conn.execute("""
+        CREATE VIEW tickets AS
+        SELECT t.ticket_id, t.user_id,
+               CASE t.category_code
+                   WHEN 1 THEN 'Hardware' WHEN 2 THEN 'Software' WHEN 3 THEN 'Network'
+                   ELSE (SELECT name FROM ticket_categories WHERE code = t.category_code)
+               END AS category,
+               t.description,
+               CASE t.priority_code WHEN 1 THEN 'Low' WHEN 2 THEN 'Medium' WHEN 3 THEN 'High' END AS priority,
+               CASE t.status_code WHEN 1 THEN 'Open' WHEN 2 THEN 'In Progress' WHEN 3 THEN 'Closed' END AS status,
+               t.assigned_to, t.created_at, t.updated_at, t.closed_at,
+               t.category_code, t.priority_code, t.status_code
+        FROM ticket_rows t
+    """)
+
+
+def _v13_ticket_locations(conn):
+    # Tickets live in the shard of the user who raised them. New ones get an
+    # id that points at that shard (see shards.py); this lists the tickets
+    # from before the last split whose id points elsewhere.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_locations (
+            ticket_id INTEGER PRIMARY KEY,
+            shard INTEGER NOT NULL
+        )
+    """)
+
+
+MIGRATIONS = (
+    (1, _v1_base_tables),
+    (2, _v2_merge_schemas),
+    (3, _v3_ticket_indexes),
+    (4, _v4_ticket_counters),
+    (5, _v5_ticket_search),
+    (6, _v6_ticket_rollups),
+    (7, _v7_dispatch_index),
+    (8, _v8_duplicate_index),
+    (9, _v9_shard_layout),
+    (10, _v10_ticket_codes),
+    (11, _v11_duplicate_backlog),
+    (12, _v12_ticket_view_codes),
+    (13, _v13_ticket_locations),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ================= ENGINE =================
+
+def current_version(db_name=None):
+    with db.connection(db_name) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_name=None):
+    applied = _migrate(db_name)
+
+    # The main database also brings its shard files up to date
+    if db_name is None:
+        import shards
+
+        for shard in shards.databases():
+            if shard != db.DB_NAME:
+                _migrate(shard)
+
+    return applied
+
+
+def _migrate(db_name):
+    applied = []
+
+    # Cheap read-only check so callers can migrate on every startup.
+    if current_version(db_name) >= LATEST_VERSION:
+        return applied
+
+    for version, step in MIGRATIONS:
+        with db.transaction(db_name) as conn:
+            # Re-read inside the write lock so two processes starting at once
+            # do not both apply the same step.
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            # Temp views (archive's all_tickets) would block table rebuilds;
+            # they are recreated on next use.
+            for (name,) in conn.execute(
+                "SELECT name FROM temp.sqlite_master WHERE type='view'"
+            ).fetchall():
+                conn.execute(f"DROP VIEW temp.{name}")
+            step(conn)
+            conn.execute(f"PRAGMA user_version={version}")
+        applied.append(version)
+
+    return applied
+
+
+if __name__ == "__main__":
+    before = current_version()
+    applied = migrate()
+
+    if applied:
+        print(f"✅ Migrated database from version {before} to {applied[-1]}")
+    else:
+        print(f"✅ Database already at version {before}")
@@ -0,0 +1,362 @@
+import sqlite3
+from contextlib import contextmanager
+
+import archive
+import db
+import duplicates
+
+TICKET_COLUMNS = ("ticket_id", "user_id", "category", "description", "priority", "status")
+STATUSES = ("Open", "In Progress", "Closed")
+PRIORITIES = ("Low", "Medium", "High")
+DEFAULT_PAGE_SIZE = 50
+
+# Tickets are stored in ticket_rows with category, priority and status as
+# codes (migration v10); the tickets view reads them back as names and also
+# has the codes. Status and priority codes are fixed, categories are looked
+# up by name. Filter on the codes (code_filter): the indexes are on them.
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES, 1)}
+PRIORITY_CODES = {priority: code for code, priority in enumerate(PRIORITIES, 1)}
+LOOKUP_TABLES = {
+    "status": "ticket_statuses",
+    "priority": "ticket_priorities",
+    "category": "ticket_categories",
+}
+CATEGORY_CODE = "(SELECT code FROM ticket_categories WHERE name=?)"
+
+
+def code_filter(column, value):
+    # (clause, param) matching a status, priority or category name by its
+    # code; an unknown status or priority becomes code 0, matching nothing
+    if column == "category":
+        return f"category_code={CATEGORY_CODE}", value
+    codes = STATUS_CODES if column == "status" else PRIORITY_CODES
+    return f"{column}_code=?", codes.get(value, 0)
+
+
+# ================= USERS =================
+
+def find_user(username):
+    with db.connection() as conn:
+        return conn.execute(
+            "SELECT user_id, password, role FROM users WHERE username=?",
+            (username,)
+        ).fetchone()
+
+
+def create_user(username, hashed, role):
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+            (username, hashed, role)
+        )
+        return cursor.lastrowid
+
+
+def set_user_password(user_id, hashed):
+    with db.transaction() as conn:
+        conn.execute("UPDATE users SET password=? WHERE user_id=?", (hashed, user_id))
+
+
+# ================= TICKETS =================
+
+def ticket_exists(ticket_id):
+    with db.connection() as conn:
+        row = conn.execute(
+            "SELECT ticket_id FROM ticket_rows WHERE ticket_id=?", (ticket_id,)
+        ).fetchone()
+        return row is not None
+
+
+def get_ticket(ticket_id):
+    with db.connection() as conn:
+        return conn.execute(
+            f"SELECT {', '.join(TICKET_COLUMNS)} FROM tickets WHERE ticket_id=?",
+            (ticket_id,)
+        ).fetchone()
+
+
+def create_ticket(user_id, category, description, priority, status="Open", ticket_id=None):
+    # ticket_id is only passed by shards.py; otherwise AUTOINCREMENT picks it.
+    # An unknown category, priority or status fails the insert.
+    status_code = STATUS_CODES.get(status)
+    with db.transaction() as conn:
+        cursor = conn.execute(f"""
+            INSERT INTO ticket_rows (ticket_id, user_id, category_code, description,
+                                     priority_code, status_code, created_at, updated_at, closed_at)
+            VALUES (?, ?, {CATEGORY_CODE}, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP,
+                    CASE WHEN ?=3 THEN CURRENT_TIMESTAMP END)
+        """, (ticket_id, user_id, category, description, PRIORITY_CODES.get(priority),
+              status_code, status_code))
+        duplicates.index_ticket(conn, cursor.lastrowid, description)
+        return cursor.lastrowid
+
+
+def tickets_for_user(user_id):
+    with db.connection() as conn:
+        return conn.execute("""
+            SELECT ticket_id, category, description, priority, status
+            FROM tickets WHERE user_id=?
+        """, (user_id,)).fetchall()
+
+
+def where_clause(filters):
+    # [(clause, param), ...] -> ("WHERE ... AND ...", [params])
+    if not filters:
+        return "", []
+    return "WHERE " + " AND ".join(clause for clause, _ in filters), [param for _, param in filters]
+
+
+def list_tickets(status=None, priority=None, category=None, user_id=None,
+                 after_id=None, before_id=None, page_size=DEFAULT_PAGE_SIZE,
+                 include_archived=False):
+    # Keyset pagination on ticket_id: each page starts from the last (or
+    # first) id the caller saw, so cost stays flat however deep the page is.
+    # Returns (rows, has_more) where has_more refers to the paging direction.
+    # Archived tickets are only included when asked for; the archive keeps
+    # names, so its half of the query filters on those (categories in any
+    # case, as the lookup matches them).
+    filters, archived_filters = [], []
+
+    for column, value in (("status", status), ("priority", priority), ("category", category)):
+        if value is not None:
+            filters.append(code_filter(column, value))
+            archived_filters.append(
+                ("category=? COLLATE NOCASE" if column == "category" else f"{column}=?", value)
+            )
+    if user_id is not None:
+        filters.append(("user_id=?", user_id))
+        archived_filters.append(("user_id=?", user_id))
+
+    order = "ASC"
+    if before_id is not None:
+        filters.append(("ticket_id<?", before_id))
+        archived_filters.append(("ticket_id<?", before_id))
+        order = "DESC"
+    elif after_id is not None:
+        filters.append(("ticket_id>?", after_id))
+        archived_filters.append(("ticket_id>?", after_id))
+
+    where, params = where_clause(filters)
+    columns = ", ".join(TICKET_COLUMNS)
+
+    if include_archived:
+        archived_where, archived_params = where_clause(archived_filters)
+        select = archive.union_query(columns, where, archived_where)
+        params += archived_params
+    else:
+        select = f"SELECT {columns} FROM tickets {where}"
+    params.append(page_size + 1)
+
+    with db.connection() as conn:
+        rows = conn.execute(
+            f"{select} ORDER BY ticket_id {order} LIMIT ?", params
+        ).fetchall()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before_id is not None:
+        rows.reverse()
+    return rows, has_more
+
+
+# closed_at keeps the time a ticket was first closed, until it reopens.
+# Takes the new status code twice.
+_SET_STATUS = """
+    UPDATE ticket_rows SET
+        status_code=?,
+        updated_at=CURRENT_TIMESTAMP,
+        closed_at=CASE
+            WHEN ?!=3 THEN NULL
+            WHEN status_code=3 AND closed_at IS NOT NULL THEN closed_at
+            ELSE CURRENT_TIMESTAMP
+        END
+"""
+ID_CHUNK_SIZE = 500
+
+
+def set_ticket_status(ticket_id, status):
+    code = STATUS_CODES.get(status)
+    with db.transaction() as conn:
+        cursor = conn.execute(f"{_SET_STATUS} WHERE ticket_id=?", (code, code, ticket_id))
+        return cursor.rowcount
+
+
+def set_ticket_statuses(new_status, ticket_ids=None, ranges=None,
+                        status=None, priority=None, category=None, user_id=None):
+    # Batch form of set_ticket_status, in one transaction. Selects the
+    # tickets listed in ticket_ids or inside one of the inclusive
+    # (first, last) ranges, narrowed by the filters; with neither ids nor
+    # ranges the filters alone select. Tickets already in new_status are
+    # skipped, and archived ones are not touched. Returns how many changed.
+    if new_status not in STATUS_CODES:
+        raise ValueError(f"Unknown status {new_status!r}")
+    code = STATUS_CODES[new_status]
+    # Unknown filter values become code 0, which matches nothing
+    clauses, params = ["status_code!=?"], [code]
+    for clause, value in (("status_code=?", None if status is None else STATUS_CODES.get(status, 0)),
+                          ("priority_code=?", None if priority is None else PRIORITY_CODES.get(priority, 0)),
+                          (f"category_code={CATEGORY_CODE}", category),
+                          ("user_id=?", user_id)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+
+    if ticket_ids is None and ranges is None:
+        if len(clauses) == 1:
+            raise ValueError("No tickets selected")
+        selections = [("", [])]
+    else:
+        ticket_ids = list(ticket_ids or ())
+        selections = [
+            (f"ticket_id IN ({', '.join('?' * len(chunk))})", chunk)
+            for chunk in (ticket_ids[i:i + ID_CHUNK_SIZE]
+                          for i in range(0, len(ticket_ids), ID_CHUNK_SIZE))
+        ] + [("ticket_id BETWEEN ? AND ?", [first, last]) for first, last in ranges or ()]
+
+    changed = 0
+    with db.transaction() as conn:
+        for selection, selection_params in selections:
+            where = " AND ".join(clauses + [selection] if selection else clauses)
+            changed += conn.execute(
+                f"{_SET_STATUS} WHERE {where}",
+                [code, code, *params, *selection_params]
+            ).rowcount
+    return changed
+
+
+def claim_ticket(ticket_id, technician):
+    # Assigns an Open, unassigned ticket and moves it to In Progress. The
+    # WHERE clause makes the check and the claim one statement, so of two
+    # technicians claiming the same ticket exactly one gets rowcount 1.
+    with db.transaction() as conn:
+        cursor = conn.execute("""
+            UPDATE ticket_rows SET assigned_to=?, status_code=2, updated_at=CURRENT_TIMESTAMP
+            WHERE ticket_id=? AND status_code=1 AND assigned_to IS NULL
+        """, (technician, ticket_id))
+        return cursor.rowcount
+
+
+# ================= STATISTICS =================
+# Counts come from ticket_counters, which triggers keep in step with every
+# insert, update and delete, so reading them is a single small lookup.
+
+COUNTER_DIMENSIONS = ("status", "priority", "category")
+
+
+def _statistics_from_rows(rows):
+    stats = {"Total": 0}
+    for dimension in COUNTER_DIMENSIONS:
+        stats[dimension] = {}
+
+    for dimension, value, count in rows:
+        if dimension == "total":
+            stats["Total"] = count
+        elif count:
+            stats[dimension][value] = count
+
+    for status in STATUSES:
+        stats["status"].setdefault(status, 0)
+    return stats
+
+
+def ticket_statistics():
+    with db.connection() as conn:
+        rows = conn.execute(
+            "SELECT dimension, value, count FROM ticket_counters"
+        ).fetchall()
+    return _statistics_from_rows(rows)
+
+
+def _count_tickets(conn, where="", params=()):
+    # Groups by code and names only the groups, rather than every row
+    rows = [("total", "", conn.execute(
+        f"SELECT COUNT(*) FROM ticket_rows {where}", params
+    ).fetchone()[0])]
+    for dimension in COUNTER_DIMENSIONS:
+        rows += conn.execute(f"""
+            SELECT '{dimension}', name, count
+            FROM (SELECT {dimension}_code, COUNT(*) AS count FROM ticket_rows {where}
+                  GROUP BY {dimension}_code)
+            JOIN {LOOKUP_TABLES[dimension]} ON code={dimension}_code
+        """, params).fetchall()
+    return rows
+
+
+@contextmanager
+def bulk_load(conn):
+    # For bulk inserts already inside db.transaction(): the per-row insert
+    # triggers (category check, statistics counters, search index) are
+    # dropped for the duration and restored before the transaction commits,
+    # so other connections never see them missing. New rows are then
+    # checked, added to the counters and the search index with one
+    # set-based statement each, and queued for the duplicate index, which
+    # hashes every description in Python and catches up after the commit
+    # (shards.index_duplicates).
+    last_id = conn.execute("SELECT COALESCE(MAX(ticket_id), 0) FROM ticket_rows").fetchone()[0]
+    triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN "
+        "('trg_ticket_rows_category_insert', 'trg_ticket_counters_insert', 'trg_tickets_fts_insert')"
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+
+    try:
+        yield conn
+        if conn.execute("""
+            SELECT 1 FROM ticket_rows
+            WHERE ticket_id>? AND category_code NOT IN (SELECT code FROM ticket_categories) LIMIT 1
+        """, (last_id,)).fetchone():
+            raise sqlite3.IntegrityError("unknown ticket category")
+        add_tickets_to_counters(conn, "WHERE ticket_id>?", (last_id,))
+        conn.execute("""
+            INSERT INTO tickets_fts (rowid, description, category)
+            SELECT ticket_id, description, category FROM tickets WHERE ticket_id>?
+        """, (last_id,))
+        duplicates.queue_tickets(conn, last_id)
+    finally:
+        for _, sql in triggers:
+            conn.execute(sql)
+
+
+def add_tickets_to_counters(conn, where, params=(), sign=1):
+    # Adds (or with sign=-1 removes) the tickets matching `where` to the counters
+    conn.executemany("""
+        INSERT INTO ticket_counters (dimension, value, count) VALUES (?, ?, ?)
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count
+    """, [
+        (dimension, value, sign * count)
+        for dimension, value, count in _count_tickets(conn, where, params)
+    ])
+
+
+def verify_ticket_counters():
+    # Returns {(dimension, value): (stored, actual)} for every counter that
+    # has drifted from the table; empty means the counters are correct.
+    with db.transaction() as conn:
+        return counter_drift(conn)
+
+
+def counter_drift(conn):
+    # verify_ticket_counters on any connection, such as a backup's
+    stored = {
+        (dimension, value): count
+        for dimension, value, count in conn.execute(
+            "SELECT dimension, value, count FROM ticket_counters"
+        )
+    }
+    actual = {(dimension, value): count for dimension, value, count in _count_tickets(conn)}
+
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def rebuild_ticket_counters():
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM ticket_counters")
+        conn.executemany(
+            "INSERT INTO ticket_counters (dimension, value, count) VALUES (?, ?, ?)",
+            _count_tickets(conn)
+        )
@@ -0,0 +1,195 @@
+import sys
+import time
+
+import db
+import migrations
+import write_queue
+
+# Day and week rollups of tickets opened and closed, by category and
+# priority, plus time-to-close histograms. refresh_rollups() only reprocesses
+# tickets whose updated_at is at or past the last refresh's high-water mark.
+# Reports read the rollup tables alone and never scan tickets.
+
+# Bucket start for each period; weeks start on Monday
+PERIODS = {
+    "day": "date({column})",
+    "week": "date({column}, '-6 days', 'weekday 1')",
+}
+
+# (upper bound in seconds, label); the last bucket is open-ended
+DURATIONS = (
+    (3600, "< 1h"),
+    (4 * 3600, "1-4h"),
+    (86400, "4-24h"),
+    (3 * 86400, "1-3d"),
+    (7 * 86400, "3-7d"),
+    (None, "> 7d"),
+)
+DURATION_LABELS = tuple(label for _, label in DURATIONS)
+
+_CLOSE_SECONDS = "CAST((julianday(closed_at) - julianday(created_at)) * 86400 AS INTEGER)"
+_DURATION_CASE = "CASE {} ELSE '{}' END".format(
+    " ".join(f"WHEN {_CLOSE_SECONDS} < {bound} THEN '{label}'" for bound, label in DURATIONS[:-1]),
+    DURATIONS[-1][1],
+)
+
+
+# ================= REFRESH =================
+
+def _apply(conn, source, sign):
+    # Adds (sign=1) or removes (sign=-1) the tickets in `source`, a table or
+    # subquery with created_at, closed_at, category and priority columns.
+    for period, bucket in PERIODS.items():
+        opened = bucket.format(column="created_at")
+        closed = bucket.format(column="closed_at")
+
+        conn.execute(f"""
+            INSERT INTO ticket_rollups (period, bucket, category, priority, opened)
+            SELECT ?, {opened}, category, priority, ? * COUNT(*)
+            FROM {source} WHERE created_at IS NOT NULL
+            GROUP BY 2, 3, 4
+            ON CONFLICT (period, bucket, category, priority)
+            DO UPDATE SET opened = opened + excluded.opened
+        """, (period, sign))
+
+        conn.execute(f"""
+            INSERT INTO ticket_rollups (period, bucket, category, priority, closed, close_seconds)
+            SELECT ?, {closed}, category, priority, ? * COUNT(*), ? * SUM({_CLOSE_SECONDS})
+            FROM {source} WHERE closed_at IS NOT NULL
+            GROUP BY 2, 3, 4
+            ON CONFLICT (period, bucket, category, priority)
+            DO UPDATE SET closed = closed + excluded.closed,
+                          close_seconds = close_seconds + excluded.close_seconds
+        """, (period, sign, sign))
+
+        conn.execute(f"""
+            INSERT INTO ticket_close_times (period, bucket, category, priority, duration, count)
+            SELECT ?, {closed}, category, priority, {_DURATION_CASE}, ? * COUNT(*)
+            FROM {source} WHERE closed_at IS NOT NULL
+            GROUP BY 2, 3, 4, 5
+            ON CONFLICT (period, bucket, category, priority, duration)
+            DO UPDATE SET count = count + excluded.count
+        """, (period, sign))
+
+
+def refresh_rollups():
+    # Folds every ticket changed since the last refresh into the rollups and
+    # returns how many were processed. A changed ticket's previous
+    # contribution (from rollup_tickets) is subtracted before the new one
+    # is added, so reprocessing is exact and repeatable. Archived tickets
+    # keep their contribution because rollup_tickets still holds them.
+    with db.transaction() as conn:
+        return fold_changes(conn)
+
+
+def fold_changes(conn):
+    # refresh_rollups inside the caller's transaction, such as the one in
+    # which archiving deletes a batch from main
+    row = conn.execute("SELECT value FROM rollup_state WHERE name='high_water'").fetchone()
+    high_water = row[0] if row else ""
+
+    # >= rather than >: timestamps have one-second resolution, so rows
+    # written in the same second as the mark are looked at again.
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_changed")
+    conn.execute("""
+        CREATE TEMP TABLE rollup_changed AS
+        SELECT ticket_id, created_at,
+               CASE WHEN status='Closed' THEN closed_at END AS closed_at,
+               category, priority, updated_at
+        FROM main.tickets WHERE updated_at>=?
+    """, (high_water,))
+
+    changed, new_mark = conn.execute(
+        "SELECT COUNT(*), MAX(updated_at) FROM rollup_changed"
+    ).fetchone()
+
+    if changed:
+        _apply(conn, """(
+            SELECT r.created_at, r.closed_at, r.category, r.priority
+            FROM rollup_tickets r JOIN rollup_changed USING (ticket_id)
+        )""", -1)
+        conn.execute("""
+            INSERT OR REPLACE INTO rollup_tickets (ticket_id, created_at, closed_at, category, priority)
+            SELECT ticket_id, created_at, closed_at, category, priority FROM rollup_changed
+        """)
+        _apply(conn, "rollup_changed", 1)
+
+        conn.execute("""
+            INSERT INTO rollup_state (name, value) VALUES ('high_water', ?)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """, (new_mark,))
+
+    conn.execute("DROP TABLE temp.rollup_changed")
+
+    return changed
+
+
+def rebuild_rollups(conn):
+    # Recomputes the rollup tables from rollup_tickets alone, for tickets
+    # copied in from another database (see shards.split)
+    conn.execute("DELETE FROM ticket_rollups")
+    conn.execute("DELETE FROM ticket_close_times")
+    _apply(conn, "rollup_tickets", 1)
+
+
+# ================= REPORTS =================
+
+def _filters(period, since, category, priority):
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+
+    clauses, params = ["period=?"], [period]
+    for column, value in (("bucket>=", since), ("category=", category), ("priority=", priority)):
+        if value is not None:
+            clauses.append(f"{column}?")
+            params.append(str(value))
+    return " AND ".join(clauses), params
+
+
+def ticket_trends(period="day", since=None, category=None, priority=None, by=None):
+    # Rows of (bucket, group, opened, closed, mean hours to close) in bucket
+    # order. `by` may be "category" or "priority" to split each bucket;
+    # otherwise group is None.
+    where, params = _filters(period, since, category, priority)
+    group = by if by in ("category", "priority") else "NULL"
+
+    with db.connection() as conn:
+        return conn.execute(f"""
+            SELECT bucket, {group}, SUM(opened), SUM(closed),
+                   CASE WHEN SUM(closed) > 0 THEN SUM(close_seconds) / 3600.0 / SUM(closed) END
+            FROM ticket_rollups WHERE {where}
+            GROUP BY bucket, {group}
+            HAVING SUM(opened) != 0 OR SUM(closed) != 0
+            ORDER BY bucket
+        """, params).fetchall()
+
+
+def close_time_distribution(period="day", since=None, category=None, priority=None):
+    # {duration label: tickets closed} in DURATIONS order
+    where, params = _filters(period, since, category, priority)
+
+    with db.connection() as conn:
+        counts = dict(conn.execute(f"""
+            SELECT duration, SUM(count) FROM ticket_close_times
+            WHERE {where} GROUP BY duration
+        """, params).fetchall())
+
+    return {label: counts.get(label, 0) for label in DURATION_LABELS}
+
+
+if __name__ == "__main__":
+    import shards
+
+    migrations.migrate()
+
+    start = time.perf_counter()
+    changed = shards.refresh_rollups()
+    print(f"✅ Rollups refreshed: {changed} tickets processed in {time.perf_counter() - start:.2f}s")
+
+    period = sys.argv[1] if len(sys.argv) > 1 else "week"
+    for bucket, _, opened, closed, hours in shards.ticket_trends(period)[-12:]:
+        mean = f"{hours:.1f}h" if hours is not None else "-"
+        print(f"{bucket}  opened {opened:>7}  closed {closed:>7}  mean time to close {mean}")
+
+    write_queue.shutdown()
+    db.close_all()
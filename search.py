@@ -0,0 +1,94 @@
+import re
+import sqlite3
+import sys
+
+import db
+import migrations
+
+PAGE_SIZE = 20
+SNIPPET_TOKENS = 12
+
+
+# ================= QUERY =================
+
+def build_match_query(text):
+    # Turns free text into a safe FTS5 query: every word is quoted so that
+    # punctuation and operators are taken literally, and the last word is a
+    # prefix match so results update while the user is still typing.
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+
+    terms = [f'"{word}"' for word in words]
+    if not text[-1:].isspace():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_tickets(text, page=1, page_size=PAGE_SIZE):
+    # Returns (rows, has_more) ranked by bm25. Each row is
+    # (ticket_id, user_id, category, priority, status, snippet).
+    rows = ranked_matches(text, page_size + 1, (page - 1) * page_size)
+    return [row[1:] for row in rows[:page_size]], len(rows) > page_size
+
+
+def ranked_matches(text, limit, offset=0):
+    # Search rows with their bm25 rank in front (lower is better), so
+    # results from several databases can be merged (see shards.py)
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    with db.connection() as conn:
+        return conn.execute(f"""
+            SELECT rank, t.ticket_id, t.user_id, t.category, t.priority, t.status,
+                   snippet(tickets_fts, 0, '[', ']', '…', {SNIPPET_TOKENS})
+            FROM tickets_fts
+            JOIN tickets t ON t.ticket_id = tickets_fts.rowid
+            WHERE tickets_fts MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        """, (match, limit, offset)).fetchall()
+
+
+# ================= MAINTENANCE =================
+
+def rebuild_index():
+    # Re-reads every ticket into the index; use after restoring a database
+    # or if the index is ever suspected to be out of step.
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+
+
+def check_index():
+    with db.connection() as conn:
+        try:
+            # rank=1 also compares the index against the tickets table itself
+            conn.execute(
+                "INSERT INTO tickets_fts (tickets_fts, rank) VALUES ('integrity-check', 1)"
+            )
+            return True
+        except sqlite3.DatabaseError:
+            return False
+
+
+if __name__ == "__main__":
+    import shards
+
+    migrations.migrate()
+
+    if sys.argv[1:] == ["--rebuild"]:
+        shards.fan_out(rebuild_index)
+        print("✅ Search index rebuilt.")
+    elif sys.argv[1:] == ["--check"]:
+        if all(shards.fan_out(check_index)):
+            print("✅ Search index matches the tickets table.")
+        else:
+            print("❌ Search index out of date. Run: python search.py --rebuild")
+            sys.exit(1)
+    elif sys.argv[1:]:
+        rows, _ = shards.search_tickets(" ".join(sys.argv[1:]))
+        for ticket_id, user_id, category, priority, status, snippet in rows:
+            print(f"#{ticket_id} [{category}/{priority}/{status}] {snippet}")
+    else:
+        print("Usage: python search.py <words> | --rebuild | --check")
@@ -0,0 +1,711 @@
+import heapq
+import os
+import queue
+import sys
+import threading
+from contextlib import ExitStack, contextmanager
+from itertools import chain
+from operator import itemgetter
+
+import archive
+import db
+import dispatch
+import duplicates
+import repository
+import rollups
+import search
+import write_queue
+
+# Tickets can be split across several SQLite files ("shards") so that writers
+# on different shards never wait on the same file lock:
+#
+#   python shards.py split 4
+#
+# The main database keeps the users and the list of shards. Until it is
+# split it also holds every ticket, and everything here simply runs against
+# it.
+#
+# Every ticket lives in the shard of the user who raised it (user_id mod N),
+# so a user's own tickets are read from one file. Shard i only hands out
+# ticket ids congruent to i mod N, so a new ticket's id routes straight to
+# its file, and ids from all shards still interleave roughly in creation
+# order, so listings merge by ticket_id. Tickets from before the last split
+# kept their ids; those whose id points at another shard are listed in the
+# main database's ticket_locations.
+# Reads that span shards fan out over a thread pool, one task per shard, and
+# each task runs with its shard as the default database (db.using), so the
+# single-database modules are reused unchanged.
+
+FAN_OUT_WORKERS = 8
+# Export chunks read ahead per shard while the merge catches up
+PREFETCH_CHUNKS = 2
+SPLIT_BATCH_SIZE = 50000
+
+# Tables keyed by ticket_id that move with their ticket on a split. Derived
+# tables (counters, search and duplicate indexes, rollups) are rebuilt.
+_TICKET_TABLES = ("ticket_rows", "archive.tickets", "ticket_merges", "rollup_tickets")
+
+_layouts = {}
+_lock = threading.Lock()
+_executor = None
+_DONE = object()
+
+
+# ================= LAYOUT =================
+
+def _layout():
+    # (shard files, highest ticket id in ticket_locations), read once per
+    # process: restart after splitting
+    main = db.DB_NAME
+    with _lock:
+        layout = _layouts.get(main)
+    if layout is None:
+        with db.connection(main) as conn:
+            names = [row[0] for row in conn.execute("SELECT db_name FROM shards ORDER BY shard")]
+            located_through = conn.execute(
+                "SELECT COALESCE(MAX(ticket_id), 0) FROM ticket_locations"
+            ).fetchone()[0]
+        layout = ([os.path.join(os.path.dirname(main), name) for name in names] or [main],
+                  located_through)
+        with _lock:
+            _layouts[main] = layout
+    return layout
+
+
+def databases():
+    # Shard files in shard order, or just the main database if it has not
+    # been split
+    return _layout()[0]
+
+
+def is_sharded():
+    return len(databases()) > 1
+
+
+def for_user(user_id):
+    # Where new tickets raised by user_id go
+    names = databases()
+    return names[(user_id or 0) % len(names)]
+
+
+def for_ticket(ticket_id):
+    names, located_through = _layout()
+    if len(names) == 1:
+        return names[0]
+    if ticket_id <= located_through:
+        with db.connection(db.DB_NAME) as conn:
+            row = conn.execute("SELECT shard FROM ticket_locations WHERE ticket_id=?", (ticket_id,)).fetchone()
+        if row is not None:
+            return names[row[0]]
+    return names[ticket_id % len(names)]
+
+
+def _next_ticket_ids(conn, index, count):
+    # The next `count` ids shard `index` may hand out: above any id it ever
+    # used (sqlite_sequence, kept by AUTOINCREMENT) and congruent to index
+    shard_count = len(databases())
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='ticket_rows'").fetchone()
+    first = (row[0] if row else 0) + 1
+    first += (index - first) % shard_count
+    return range(first, first + count * shard_count, shard_count)
+
+
+# ================= FAN-OUT =================
+
+def _pool():
+    # Created on first use, like the Future import in write_queue.submit
+    global _executor
+    with _lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _executor = ThreadPoolExecutor(FAN_OUT_WORKERS, thread_name_prefix="shard-read")
+        return _executor
+
+
+def _call_on(db_name, func, args, kwargs):
+    with db.using(db_name):
+        return func(*args, **kwargs)
+
+
+def fan_out(func, *args, **kwargs):
+    # func's result from every shard, in shard order
+    names = databases()
+    if len(names) == 1:
+        return [_call_on(names[0], func, args, kwargs)]
+    return list(_pool().map(lambda name: _call_on(name, func, args, kwargs), names))
+
+
+def submit(db_name, func, *args, **kwargs):
+    # Queues a write on db_name's writer thread, where func runs with db_name
+    # as the default database
+    return write_queue.get_queue(db_name).submit(func, *args, **kwargs)
+
+
+def run(db_name, func, *args, **kwargs):
+    return submit(db_name, func, *args, **kwargs).result()
+
+
+@contextmanager
+def write_lock():
+    # Holds the write lock of every shard, taken in shard order so two
+    # holders cannot deadlock. Yields the first shard's connection.
+    with ExitStack() as stack:
+        conns = [stack.enter_context(db.transaction(name)) for name in databases()]
+        yield conns[0]
+
+
+# ================= TICKET WRITES =================
+
+def insert_ticket(user_id, category, description, priority, status="Open"):
+    # repository.create_ticket with an id that belongs to this shard; run it
+    # through the write queue of for_user(user_id)
+    names = databases()
+    if len(names) == 1:
+        return repository.create_ticket(user_id, category, description, priority, status)
+
+    with db.transaction() as conn:
+        ticket_id, = _next_ticket_ids(conn, names.index(db.current_db()), 1)
+        return repository.create_ticket(
+            user_id, category, description, priority, status, ticket_id=ticket_id
+        )
+
+
+def create_ticket(user_id, category, description, priority, status="Open"):
+    return run(for_user(user_id), insert_ticket, user_id, category, description, priority, status)
+
+
+def set_ticket_status(ticket_id, status):
+    return run(for_ticket(ticket_id), repository.set_ticket_status, ticket_id, status)
+
+
+def set_ticket_statuses(new_status, ticket_ids=None, ranges=None, **filters):
+    # repository.set_ticket_statuses on every shard, each in one transaction
+    # on its own writer; listed ids only go to the shard that holds them
+    names = databases()
+    if len(names) == 1:
+        return run(names[0], repository.set_ticket_statuses, new_status, ticket_ids, ranges, **filters)
+
+    by_shard = None
+    if ticket_ids is not None:
+        by_shard = {name: [] for name in names}
+        for ticket_id in ticket_ids:
+            by_shard[for_ticket(ticket_id)].append(ticket_id)
+    futures = [
+        submit(name, repository.set_ticket_statuses, new_status,
+               None if by_shard is None else by_shard[name], ranges, **filters)
+        for name in names
+    ]
+    return sum(future.result() for future in futures)
+
+
+def reopen_ticket(ticket_id, status="Open"):
+    # Not queued as one write: each phase of the move queues its own
+    return _call_on(for_ticket(ticket_id), archive.reopen_ticket, (ticket_id, status), {})
+
+
+@contextmanager
+def bulk_insert(sql):
+    # Yields insert(rows) for bulk loads. `sql` takes ticket_id followed by
+    # the row's own values, the first of which is user_id. Every shard loads
+    # under repository.bulk_load in one transaction, and all of them commit
+    # when the block ends.
+    names = databases()
+
+    with ExitStack() as stack:
+        conns = []
+        for name in names:
+            conn = stack.enter_context(db.transaction(name))
+            stack.enter_context(repository.bulk_load(conn))
+            conns.append(conn)
+
+        def insert(rows):
+            if len(names) == 1:
+                conns[0].executemany(sql, [(None, *row) for row in rows])
+                return
+
+            by_shard = {}
+            for row in rows:
+                by_shard.setdefault((row[0] or 0) % len(names), []).append(row)
+            for index, shard_rows in by_shard.items():
+                ticket_ids = _next_ticket_ids(conns[index], index, len(shard_rows))
+                conns[index].executemany(sql, [
+                    (ticket_id, *row) for ticket_id, row in zip(ticket_ids, shard_rows)
+                ])
+
+        yield insert
+
+
+# ================= TICKET READS =================
+
+def get_ticket(ticket_id):
+    with db.using(for_ticket(ticket_id)):
+        return repository.get_ticket(ticket_id)
+
+
+def ticket_exists(ticket_id):
+    with db.using(for_ticket(ticket_id)):
+        return repository.ticket_exists(ticket_id)
+
+
+def get_archived_ticket(ticket_id):
+    with db.using(for_ticket(ticket_id)):
+        return archive.get_archived_ticket(ticket_id)
+
+
+def tickets_for_user(user_id):
+    with db.using(for_user(user_id)):
+        return sorted(repository.tickets_for_user(user_id))
+
+
+def list_tickets(after_id=None, before_id=None, page_size=repository.DEFAULT_PAGE_SIZE, **filters):
+    # repository.list_tickets across shards: every shard returns its own
+    # page from the same keyset position and the pages are merged by id
+    pages = fan_out(
+        repository.list_tickets,
+        after_id=after_id, before_id=before_id, page_size=page_size, **filters
+    )
+    if len(pages) == 1:
+        return pages[0]
+
+    rows = sorted(chain(*(rows for rows, _ in pages)))
+    has_more = len(rows) > page_size or any(more for _, more in pages)
+    # Paging backwards keeps the rows nearest before_id
+    rows = rows[-page_size:] if before_id is not None else rows[:page_size]
+    return rows, has_more
+
+
+def _add_counts(total, counts):
+    for key, count in counts.items():
+        total[key] = total.get(key, 0) + count
+    return total
+
+
+def ticket_statistics():
+    parts = fan_out(repository.ticket_statistics)
+    stats = parts[0]
+    for part in parts[1:]:
+        stats["Total"] += part["Total"]
+        for dimension in repository.COUNTER_DIMENSIONS:
+            _add_counts(stats[dimension], part[dimension])
+    return stats
+
+
+def search_tickets(text, page=1, page_size=search.PAGE_SIZE):
+    # Every shard's best matches down to this page, merged by rank. bm25
+    # weighs terms by each shard's own statistics, which is close enough
+    # when tickets are spread evenly.
+    if not is_sharded():
+        return search.search_tickets(text, page, page_size)
+
+    limit = page * page_size + 1
+    rows = sorted(chain(*fan_out(search.ranked_matches, text, limit)), key=itemgetter(0, 1))
+    start = (page - 1) * page_size
+    return [row[1:] for row in rows[start:start + page_size]], len(rows) > page * page_size
+
+
+def _prefetch(db_name, iter_chunks, kwargs):
+    # Rows from iter_chunks(**kwargs) on one shard, read ahead on a thread of
+    # its own: merge_chunks holds one of these open per shard for the whole
+    # export, which a shared pool could run out of threads for.
+    chunks = queue.Queue(PREFETCH_CHUNKS)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            with db.using(db_name):
+                for rows in iter_chunks(**kwargs):
+                    if not put(rows):
+                        return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=produce, name="shard-export", daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+
+
+def merge_chunks(iter_chunks, chunk_size, **kwargs):
+    # iter_chunks(chunk_size=chunk_size, **kwargs) on every shard, merged
+    # into one stream of chunks in ticket_id order (the first column). All
+    # shards are read at once.
+    kwargs["chunk_size"] = chunk_size
+    names = databases()
+    if len(names) == 1:
+        yield from iter_chunks(**kwargs)
+        return
+
+    streams = [_prefetch(name, iter_chunks, kwargs) for name in names]
+    try:
+        chunk = []
+        for row in heapq.merge(*streams, key=itemgetter(0)):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+# ================= DISPATCH =================
+
+def dispatch_queues():
+    return [dispatch.get_queue(name) for name in databases()]
+
+
+def claim_next(technician):
+    # Claims from whichever shard's queue has the most urgent ticket. If
+    # another technician empties that queue first, look again.
+    queues = dispatch_queues()
+    if len(queues) == 1:
+        return queues[0].claim_next(technician)
+
+    while True:
+        heads = [(keys[0], index) for index, keys in
+                 enumerate(dispatch_queue.peek_keys(1) for dispatch_queue in queues) if keys]
+        if not heads:
+            return None
+        ticket = queues[min(heads)[1]].claim_next(technician)
+        if ticket is not None:
+            return ticket
+
+
+def peek(count=10):
+    keys = heapq.nsmallest(count, chain(*(q.peek_keys(count) for q in dispatch_queues())))
+    return [key[-1] for key in keys]
+
+
+def pending():
+    return sum(len(dispatch_queue) for dispatch_queue in dispatch_queues())
+
+
+# ================= DUPLICATES =================
+
+def _by_similarity(matches, limit):
+    return sorted(matches, key=lambda match: (-match[1], match[0]))[:limit]
+
+
+def similar_tickets(description, exclude_id=None, limit=5):
+    return _by_similarity(
+        chain(*fan_out(duplicates.similar_tickets, description, exclude_id, limit)), limit
+    )
+
+
+def duplicate_cluster(ticket_id):
+    ticket = get_ticket(ticket_id)
+    if ticket is None:
+        return None
+    size = duplicates.MAX_CLUSTER
+    return _by_similarity(
+        chain(*fan_out(duplicates.similar_tickets, ticket[3], ticket_id, size, size, size)), size
+    )
+
+
+def merge_tickets(parent_id, child_ids, merged_by=None):
+    # One transaction when unsplit; otherwise one per shard holding
+    # children, and a failure in one shard leaves the others merged.
+    if not is_sharded():
+        return run(db.DB_NAME, duplicates.merge_tickets, parent_id, child_ids, merged_by)
+
+    if not ticket_exists(parent_id):
+        raise ValueError(f"Ticket {parent_id} does not exist")
+
+    by_shard = {}
+    for child_id in child_ids:
+        by_shard.setdefault(for_ticket(child_id), []).append(child_id)
+    futures = [
+        submit(name, duplicates.close_duplicates, parent_id, ids, merged_by)
+        for name, ids in by_shard.items()
+    ]
+    return sum(future.result() for future in futures)
+
+
+def merged_into(parent_id):
+    return sorted(chain(*fan_out(duplicates.merged_into, parent_id)))
+
+
+def index_duplicates():
+    # Catches the duplicate index up with bulk-loaded tickets; returns how
+    # many were indexed
+    return sum(fan_out(duplicates.index_backlog))
+
+
+# ================= ROLLUPS =================
+
+def refresh_rollups():
+    return sum(fan_out(write_queue.run, rollups.refresh_rollups))
+
+
+def ticket_trends(period="day", since=None, category=None, priority=None, by=None):
+    parts = fan_out(rollups.ticket_trends, period, since, category, priority, by)
+    if len(parts) == 1:
+        return parts[0]
+
+    totals = {}
+    for bucket, group, opened, closed, hours in chain(*parts):
+        total = totals.setdefault((bucket, group), [0, 0, 0.0])
+        total[0] += opened
+        total[1] += closed
+        total[2] += (hours or 0) * closed
+
+    return [
+        (bucket, group, opened, closed, hours / closed if closed else None)
+        for (bucket, group), (opened, closed, hours)
+        in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+    ]
+
+
+def close_time_distribution(period="day", since=None, category=None, priority=None):
+    total = dict.fromkeys(rollups.DURATION_LABELS, 0)
+    for part in fan_out(rollups.close_time_distribution, period, since, category, priority):
+        _add_counts(total, part)
+    return total
+
+
+# ================= SPLITTING =================
+
+def shard_names(count):
+    base = os.path.splitext(os.path.basename(db.DB_NAME))[0]
+    return [f"{base}_shard{index}of{count}.db" for index in range(count)]
+
+
+def _clear_tickets(conn):
+    # Empties every ticket table of a database whose tickets moved out. The
+    # per-row delete triggers are dropped meanwhile, as in bulk_load, and
+    # the tables they maintain are emptied directly.
+    triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name='ticket_rows'"
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+
+    for table in _TICKET_TABLES + ("ticket_counters", "ticket_lsh", "ticket_lsh_backlog",
+                                   "ticket_rollups", "ticket_close_times", "rollup_state"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('delete-all')")
+
+    for _, sql in triggers:
+        conn.execute(sql)
+
+
+def _category_codes(source, targets):
+    # Adds the source's categories to every target (all of which then number
+    # them alike) and returns {source code: target code}. Databases migrated
+    # separately can have numbered their legacy categories differently.
+    codes = {}
+    for code, name in source.execute("SELECT code, name FROM ticket_categories ORDER BY code"):
+        for target in targets:
+            target.execute("INSERT OR IGNORE INTO ticket_categories (name) VALUES (?)", (name,))
+        codes[code] = targets[0].execute(
+            "SELECT code FROM ticket_categories WHERE name=?", (name,)
+        ).fetchone()[0]
+    return codes
+
+
+# The user of the ticket a row belongs to, for tables without a user_id
+_TICKET_USER = """COALESCE(
+    (SELECT user_id FROM main.ticket_rows r WHERE r.ticket_id = t.ticket_id),
+    (SELECT user_id FROM archive.tickets a WHERE a.ticket_id = t.ticket_id)
+)"""
+
+
+def _copy_table(source, targets, table, batch_size, convert=None, locations=None):
+    # Copies `table` (keyed by ticket_id) from one database into the shard of
+    # the user each row's ticket belongs to, a batch at a time, passing each
+    # row through convert(). Rows whose id points at another shard are
+    # recorded in the `locations` connection's ticket_locations, if given.
+    columns = [row[1] for row in source.execute(f"PRAGMA {_pragma_table(table)}")]
+    column_list = ", ".join(columns)
+    insert = (f"INSERT INTO {table} ({column_list}) "
+              f"VALUES ({', '.join('?' * len(columns))})")
+    user = "user_id" if "user_id" in columns else _TICKET_USER
+
+    cursor = source.execute(f"SELECT {user}, {column_list} FROM {table} t ORDER BY ticket_id")
+    count = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return count
+        by_shard, located = {}, []
+        for user_id, *row in rows:
+            index = (user_id or 0) % len(targets)
+            by_shard.setdefault(index, []).append(convert(row) if convert else row)
+            if index != row[0] % len(targets):
+                located.append((row[0], index))
+        for index, shard_rows in by_shard.items():
+            targets[index].executemany(insert, shard_rows)
+        if locations is not None:
+            # A ticket caught mid-archive is in both tables, in one shard
+            locations.executemany(
+                "INSERT OR REPLACE INTO ticket_locations (ticket_id, shard) VALUES (?, ?)", located
+            )
+        count += len(rows)
+
+
+def _column_index(conn, table, column):
+    return [row[1] for row in conn.execute(f"PRAGMA {_pragma_table(table)}")].index(column)
+
+
+def _pragma_table(table):
+    # "archive.tickets" -> "archive.table_info(tickets)"
+    schema, _, name = table.rpartition(".")
+    return f"{schema}.table_info({name})" if schema else f"table_info({name})"
+
+
+def split(count, batch_size=SPLIT_BATCH_SIZE):
+    # Moves every ticket from where it lives now (the main database, or the
+    # current shards) into `count` new shard files, then points the main
+    # database at them. Stop every process using the database first: they
+    # only read the layout at startup. Returns (tickets moved, new files).
+    # A split that fails leaves the old layout in place; delete the new
+    # files before trying again.
+    import migrations
+
+    if count < 2:
+        raise ValueError("Split into at least 2 shards")
+
+    migrations.migrate()
+    sources = databases()
+    names = shard_names(count)
+    targets = [os.path.join(os.path.dirname(db.DB_NAME), name) for name in names]
+
+    if targets == sources:
+        raise ValueError(f"Already split into {count} shards")
+    for target in targets:
+        if os.path.exists(target) or os.path.exists(archive.archive_path(target)):
+            raise ValueError(f"{target} already exists")
+
+    for target in targets:
+        migrations.migrate(target)
+
+    # The main database commits last, so its new layout and ticket locations
+    # only take effect once every shard holds its tickets
+    with db.transaction(db.DB_NAME) as main:
+        main.execute("DELETE FROM ticket_locations")
+        with ExitStack() as stack:
+            conns = []
+            for target in targets:
+                conn = stack.enter_context(db.transaction(target))
+                stack.enter_context(repository.bulk_load(conn))
+                conns.append(conn)
+
+            moved = 0
+            marks, last_id = [], 0
+            for source in sources:
+                with db.connection(source) as conn:
+                    codes = _category_codes(conn, conns)
+                    index = _column_index(conn, "ticket_rows", "category_code")
+
+                    def renumber(row):
+                        return (*row[:index], codes[row[index]], *row[index + 1:])
+
+                    # Rows are copied untouched unless a category code changes
+                    renumbered = any(code != new for code, new in codes.items())
+                    for table in _TICKET_TABLES:
+                        copied = _copy_table(
+                            conn, conns, table, batch_size,
+                            renumber if renumbered and table == "ticket_rows" else None,
+                            main if table in ("ticket_rows", "archive.tickets") else None,
+                        )
+                        moved += copied if table == "ticket_rows" else 0
+                    row = conn.execute("SELECT value FROM rollup_state WHERE name='high_water'").fetchone()
+                    marks.append(row[0] if row else "")
+                    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='ticket_rows'").fetchone()
+                    last_id = max(last_id, row[0] if row else 0)
+
+            for conn in conns:
+                # New ids continue after every id used so far, in any shard
+                conn.execute("DELETE FROM sqlite_sequence WHERE name='ticket_rows'")
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('ticket_rows', ?)", (last_id,))
+                # Rollups restart from the earliest source's mark, so tickets
+                # changed after it are folded in again on the next refresh
+                rollups.rebuild_rollups(conn)
+                conn.execute(
+                    "INSERT INTO rollup_state (name, value) VALUES ('high_water', ?)", (min(marks),)
+                )
+
+        main.execute("DELETE FROM shards")
+        main.executemany(
+            "INSERT INTO shards (shard, db_name) VALUES (?, ?)", list(enumerate(names))
+        )
+        # The main database's own tickets are now copies; later splits
+        # leave the old shard files alone
+        if sources == [db.DB_NAME]:
+            _clear_tickets(main)
+
+    with _lock:
+        _layouts.pop(db.DB_NAME, None)
+    index_duplicates()
+    return moved, targets
+
+
+def shard_sizes():
+    # (file, live tickets, archived tickets) per shard
+    def sizes():
+        return (
+            db.current_db(),
+            repository.ticket_statistics()["Total"],
+            archive.archived_count(),
+        )
+    return fan_out(sizes)
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Split the tickets across several database files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split_parser = commands.add_parser("split", help="move every ticket into COUNT new shard files")
+    split_parser.add_argument("count", type=int)
+    split_parser.add_argument("--batch-size", type=int, default=SPLIT_BATCH_SIZE)
+    commands.add_parser("status", help="list the shards and their ticket counts")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        old = databases()
+        start = time.perf_counter()
+        try:
+            moved, targets = split(args.count, args.batch_size)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Moved {moved} tickets into {len(targets)} shards "
+              f"in {time.perf_counter() - start:.1f}s")
+        if old != [db.DB_NAME]:
+            print(f"ℹ️ The previous shard files are no longer used: {', '.join(old)}")
+    else:
+        import migrations
+
+        migrations.migrate()
+
+    for name, live, archived in shard_sizes():
+        print(f"{name}: {live} tickets, {archived} archived")
+
+    write_queue.shutdown()
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import db
+import generate_data
+import metrics
+
+# Many helpdesk users at once on one deployment's database files, with no
+# server in between: N processes of T threads, each thread one signed-in
+# user calling the same functions App.py and web_app.py call (auth, shards,
+# audit). Every process has its own connection pool and write queue, so the
+# processes contend for SQLite's file lock as separate app instances do.
+#
+#   python stress_test.py --levels 1,2,4,8,16,32 --processes 4 --duration 10
+#
+# A level is a number of simultaneous users, spread over the processes.
+# Users act back to back without think time. Each level reports ops/s,
+# p50/p99/max latency, "database is locked" errors, retries and time spent
+# waiting for the write lock, and the sweep reports where throughput stops
+# growing. The web app's query cache is bypassed, as in the CLI.
+
+DEFAULT_LEVELS = "1,2,4,8,16,32"
+PROCESSES = 4
+DURATION = 10.0
+USERS = 1000
+TICKETS = 100000
+# bcrypt cost of the generated users, also used for logins
+BCRYPT_ROUNDS = 4
+# A level that adds less than this much throughput is past saturation
+SATURATION_GAIN = 0.05
+RETRY_BACKOFF = 0.01
+
+# (operation, weight): mostly employees raising and checking their own
+# tickets, with admins listing, updating and reading statistics. Every
+# simulated user draws from the same mix, so levels differ only in load.
+MIX = (
+    ("login", 0.05),
+    ("raise_ticket", 0.25),
+    ("my_tickets", 0.40),
+    ("all_tickets", 0.10),
+    ("update_status", 0.10),
+    ("statistics", 0.10),
+)
+OPERATIONS = tuple(name for name, _ in MIX)
+
+
+def is_lock_error(error):
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
+    )
+
+
+# ================= WORKERS =================
+
+def _operation(name, user, max_ticket_id, rng):
+    import audit
+    import auth
+    import shards
+
+    user_id, username = user
+    if name == "login":
+        if auth.authenticate(username, generate_data.GENERATED_PASSWORD) is None:
+            raise RuntimeError(f"{username} could not log in")
+        audit.log("Successful Login", username)
+    elif name == "raise_ticket":
+        ticket_id = shards.create_ticket(
+            user_id, rng.choice(("Hardware", "Software", "Network")),
+            f"Stress test ticket {rng.randrange(10**6)}", rng.choice(("Low", "Medium", "High"))
+        )
+        audit.log("Ticket Created", username, ticket_id=ticket_id)
+    elif name == "my_tickets":
+        shards.tickets_for_user(user_id)
+    elif name == "all_tickets":
+        shards.list_tickets(status="Open")
+    elif name == "update_status":
+        ticket_id = rng.randint(1, max_ticket_id)
+        if shards.set_ticket_status(ticket_id, rng.choice(("Open", "In Progress", "Closed"))):
+            audit.log("Ticket Status Updated", username, ticket_id=ticket_id)
+    else:
+        shards.ticket_statistics()
+
+
+def _user_thread(user, deadline, max_ticket_id, retries, seed, results):
+    rng = random.Random(seed)
+    names, weights = zip(*MIX)
+    latencies = {name: [] for name in OPERATIONS}
+    counts = {"lock_errors": 0, "retries": 0, "errors": 0}
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                _operation(name, user, max_ticket_id, rng)
+            except Exception as e:
+                if not is_lock_error(e):
+                    counts["errors"] += 1
+                    break
+                if attempt == retries:
+                    counts["lock_errors"] += 1
+                    break
+                counts["retries"] += 1
+                time.sleep(RETRY_BACKOFF * 2 ** attempt * rng.random())
+            else:
+                latencies[name].append(time.perf_counter() - start)
+                break
+
+    results.append((latencies, counts))
+
+
+def _lock_waits():
+    # BEGIN IMMEDIATE returns once this connection holds the write lock, so
+    # its timings are the waits for the other writers
+    histograms, _ = metrics.snapshot()
+    buckets, count, total = histograms.get(
+        (metrics.SQL_SECONDS, "BEGIN IMMEDIATE"), ([0] * (len(metrics.BUCKETS) + 1), 0, 0.0)
+    )
+    over_second = sum(buckets[metrics.BUCKETS.index(1.0) + 1:])
+    return count, total, over_second
+
+
+def _worker(db_name, users, duration, max_ticket_id, retries, seed, barrier, done):
+    import audit
+    import shards
+    import write_queue
+
+    db.DB_NAME = db_name
+    shards.databases()
+
+    results = []
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_user_thread,
+                         args=(user, deadline, max_ticket_id, retries, seed + i, results))
+        for i, user in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    write_queue.shutdown()
+    audit.shutdown()
+    done.put((results, _lock_waits()))
+    db.close_all()
+
+
+# ================= SWEEP =================
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run_level(db_name, users, level, processes, duration, max_ticket_id, retries, seed):
+    # Runs `level` simultaneous users over up to `processes` processes and
+    # returns the level's result row
+    context = multiprocessing.get_context("spawn")
+    rng = random.Random(seed)
+    chosen = rng.sample(users, level) if level <= len(users) else rng.choices(users, k=level)
+    processes = min(processes, level)
+    groups = [chosen[index::processes] for index in range(processes)]
+
+    barrier, done = context.Barrier(processes), context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(
+            db_name, group, duration, max_ticket_id, retries, seed * 1000 + index * 100, barrier, done
+        ))
+        for index, group in enumerate(groups)
+    ]
+    for worker in workers:
+        worker.start()
+    outputs = [done.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = {name: [] for name in OPERATIONS}
+    counts = {"lock_errors": 0, "retries": 0, "errors": 0}
+    waits = [0, 0.0, 0]
+    for results, lock_waits in outputs:
+        for thread_latencies, thread_counts in results:
+            for name, values in thread_latencies.items():
+                latencies[name] += values
+            for key, value in thread_counts.items():
+                counts[key] += value
+        waits = [total + value for total, value in zip(waits, lock_waits)]
+
+    every = [value for values in latencies.values() for value in values]
+    return {
+        "users": level,
+        "processes": processes,
+        "ops": len(every),
+        "ops_per_sec": len(every) / duration,
+        "p50_ms": percentile(every, 50) * 1000,
+        "p99_ms": percentile(every, 99) * 1000,
+        "max_ms": max(every, default=0.0) * 1000,
+        **counts,
+        "lock_wait_mean_ms": waits[1] / waits[0] * 1000 if waits[0] else 0.0,
+        "lock_waits_over_1s": waits[2],
+        "operations": {
+            name: {
+                "ops": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+            for name, values in latencies.items() if values
+        },
+    }
+
+
+def saturation(rows):
+    # The first level within SATURATION_GAIN of the best throughput reached
+    # before any lock errors; None if there is no such level, or if the
+    # last level was still clearly the best
+    healthy = []
+    for row in rows:
+        if row["lock_errors"]:
+            break
+        healthy.append(row)
+    if not healthy:
+        return None
+    peak = max(row["ops_per_sec"] for row in healthy)
+    if len(healthy) == len(rows) > 1 and healthy[-1]["ops_per_sec"] > (1 + SATURATION_GAIN) * max(
+        row["ops_per_sec"] for row in healthy[:-1]
+    ):
+        return None
+    return next(row for row in healthy if row["ops_per_sec"] >= peak * (1 - SATURATION_GAIN))
+
+
+def prepare(workdir, users, tickets):
+    # A throwaway database of generated users and tickets; returns its path,
+    # the users as (user_id, username) and the highest ticket id
+    db_name = os.path.join(workdir, "stress.db")
+    db.DB_NAME = db_name
+    first_user_id = generate_data.generate(users, tickets, password_rounds=BCRYPT_ROUNDS)
+    with db.connection() as conn:
+        rows = conn.execute(
+            "SELECT user_id, username FROM users WHERE user_id>=?", (first_user_id,)
+        ).fetchall()
+    db.close_all()
+    return db_name, rows, tickets
+
+
+# ================= REPORT =================
+
+def print_results(rows, point):
+    print(f"{'Users':>6}{'Ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'Locked':>8}{'Retries':>9}{'Errors':>8}{'Wait ms':>9}{'>1s':>6}")
+    for row in rows:
+        print(f"{row['users']:>6}{row['ops_per_sec']:>10,.0f}{row['p50_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.0f}{row['lock_errors']:>8}"
+              f"{row['retries']:>9}{row['errors']:>8}{row['lock_wait_mean_ms']:>9.1f}"
+              f"{row['lock_waits_over_1s']:>6}")
+
+    if point is None:
+        if rows and rows[0]["lock_errors"]:
+            print("\nLock errors from the first level; raise --busy-timeout or add --retries.")
+        else:
+            print("\nThroughput was still growing at the last level; sweep higher.")
+        return
+    print(f"\nSaturates at {point['users']} users: {point['ops_per_sec']:,.0f} ops/s, "
+          f"p99 {point['p99_ms']:.1f} ms")
+    print(f"{'Operation':<15}{'Ops':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, stats in point["operations"].items():
+        print(f"{name:<15}{stats['ops']:>8}{stats['p50_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress one helpdesk deployment with many simultaneous users")
+    parser.add_argument("--levels", default=DEFAULT_LEVELS, help="comma-separated numbers of simultaneous users")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="app processes the users are spread over")
+    parser.add_argument("--duration", type=float, default=DURATION, help="seconds per level")
+    parser.add_argument("--users", type=int, default=USERS, help="generated users")
+    parser.add_argument("--tickets", type=int, default=TICKETS, help="generated tickets")
+    parser.add_argument("--shards", type=int, default=1, help="split the generated tickets into this many shards")
+    parser.add_argument("--retries", type=int, default=0,
+                        help="retry an operation that hit 'database is locked' (the apps do not)")
+    parser.add_argument("--busy-timeout", type=int, default=db.BUSY_TIMEOUT_MS,
+                        help="milliseconds a connection waits for the write lock")
+    parser.add_argument("--workdir", help="keep the generated database here")
+    parser.add_argument("--output", default="stress_results.json")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="helpdesk_stress_")
+    os.makedirs(workdir, exist_ok=True)
+    # Inherited by the worker processes
+    os.environ.update(
+        HELPDESK_BUSY_TIMEOUT_MS=str(args.busy_timeout),
+        HELPDESK_BCRYPT_ROUNDS=str(BCRYPT_ROUNDS),
+        HELPDESK_AUDIT_LOG=os.path.join(workdir, "audit_log.txt"),
+        HELPDESK_SLOW_QUERY_LOG=os.path.join(workdir, "slow_queries.log"),
+    )
+    metrics.SLOW_QUERY_LOG = os.environ["HELPDESK_SLOW_QUERY_LOG"]
+
+    print(f"Generating {args.users} users and {args.tickets} tickets in {workdir}...")
+    db_name, users, max_ticket_id = prepare(workdir, args.users, args.tickets)
+    if args.shards > 1:
+        import shards
+        import write_queue
+
+        shards.split(args.shards)
+        write_queue.shutdown()
+        db.close_all()
+
+    rows = []
+    for index, level in enumerate(int(value) for value in args.levels.split(",")):
+        print(f"{level} users for {args.duration:.0f}s...")
+        rows.append(run_level(db_name, users, level, args.processes, args.duration,
+                              max_ticket_id, args.retries, index + 1))
+
+    point = saturation(rows)
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "levels": rows,
+        "saturation_users": point and point["users"],
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    print()
+    print_results(rows, point)
+    print(f"✅ Results written to {args.output}")
+    return 1 if any(row["errors"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
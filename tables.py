@@ -0,0 +1,25 @@
+# Plain Markdown tables for listings in the web app. st.dataframe needs
+# pandas, which costs more to import than the rest of a first render put
+# together; a listing page of tickets does not need it.
+
+# Markdown and Streamlit's $...$ maths would otherwise reformat ticket text
+_SPECIAL = "\\`*_{}[]<>()#+-.!|~$"
+_ESCAPES = str.maketrans({char: "\\" + char for char in _SPECIAL})
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = f"{value:,.2f}"
+    return " ".join(str(value).split()).translate(_ESCAPES)
+
+
+def markdown_table(rows, columns):
+    # `columns` are the header labels, one per value in each row
+    lines = [
+        "| " + " | ".join(_cell(column) for column in columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    lines += ["| " + " | ".join(_cell(value) for value in row) + " |" for row in rows]
+    return "\n".join(lines)
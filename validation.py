@@ -0,0 +1,57 @@
+import re
+from datetime import datetime
+
+CATEGORIES = ("Hardware", "Software", "Network")
+_CATEGORY_NAMES = {name.lower(): name for name in CATEGORIES}
+
+
+# ================= VALIDATION =================
+
+def validate_username(username):
+    return len(username) >= 4 and username.isalnum() and " " not in username
+
+
+def validate_password(password):
+    return (
+        len(password) >= 6
+        and re.search(r"[A-Za-z]", password)
+        and re.search(r"\d", password)
+    )
+
+
+def validate_priority(priority):
+    return priority in ("Low", "Medium", "High")
+
+
+def validate_status(status):
+    return status in ("Open", "In Progress", "Closed")
+
+
+def canonical_category(category):
+    # " network " -> "Network"; None for anything but CATEGORIES
+    return _CATEGORY_NAMES.get(category.strip().lower())
+
+
+def validate_date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def parse_ticket_ids(text):
+    # "12, 15, 20-80" -> ([12, 15], [(20, 80)]). Ranges stay ranges so a
+    # large one is not expanded into every id. Raises ValueError.
+    ids, ranges = [], []
+    for part in text.replace(" ", "").split(","):
+        first, dash, last = part.partition("-")
+        if not first.isdigit() or (dash and not last.isdigit()):
+            raise ValueError(f"Not a ticket ID or range: {part!r}")
+        if not dash:
+            ids.append(int(first))
+        elif int(first) > int(last):
+            raise ValueError(f"Range runs backwards: {part!r}")
+        else:
+            ranges.append((int(first), int(last)))
+    return ids, ranges
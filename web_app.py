@@ -1,23 +1,72 @@
 import streamlit as st
+import os
 import sqlite3
-import pandas as pd
-import bcrypt
-
-DB_NAME = "database.db"
-
-
-# ---------------- DATABASE ----------------
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-
-# ---------------- PASSWORD ----------------
-def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-
-
-def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode(), hashed)
+import tempfile
+import zipfile
+from datetime import date, timedelta
+
+import audit
+import cache
+import metrics
+import migrations
+import repository
+import rollups
+import shards
+import tables
+import write_queue
+
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+TREND_DAYS = 90
+
+
+# pandas is imported only by the pages that chart (Statistics, Trends,
+# Diagnostics): it takes longer to load than the rest of a first render, and
+# ticket listings are plain Markdown tables from tables.py. Likewise auth
+# (bcrypt) loads on the first login or registration, and exporter (csv,
+# gzip, pyarrow) on the Export page.
+
+# ---------------- SCHEMA ----------------
+migrations.migrate()
+
+
+# ---------------- CACHED READS ----------------
+# Reads are tagged by the user and status they depend on, so a write only
+# drops the entries it can have changed.
+def cached_tickets_for_user(user_id):
+    return cache.queries.get_or_load(
+        ("tickets_for_user", user_id),
+        lambda: shards.tickets_for_user(user_id),
+        tags=[("user", user_id)]
+    )
+
+
+def cached_ticket_page(filters, after_id, before_id, page_size):
+    tags = [("status", filters["status"] or "*")]
+    if filters["user_id"] is not None:
+        tags.append(("user", filters["user_id"]))
+
+    return cache.queries.get_or_load(
+        ("list_tickets", tuple(filters.items()), after_id, before_id, page_size),
+        lambda: shards.list_tickets(
+            after_id=after_id, before_id=before_id, page_size=page_size, **filters
+        ),
+        tags=tags
+    )
+
+
+def cached_statistics():
+    return cache.queries.get_or_load(
+        ("statistics",), shards.ticket_statistics, tags=[("statistics",)]
+    )
+
+
+def invalidate_ticket_reads(user_id, *statuses):
+    cache.queries.invalidate(
+        ("user", user_id),
+        ("status", "*"),
+        ("statistics",),
+        *[("status", status) for status in statuses]
+    )
 
 
 # ---------------- SESSION INIT ----------------
@@ -50,30 +99,23 @@ if not st.session_state.logged_in:
         password = st.text_input("Password", type="password", key="login_pass")
 
         if st.button("Login"):
-            conn = get_connection()
-            cursor = conn.cursor()
+            import auth
 
-            cursor.execute(
-                "SELECT user_id, password, role FROM users WHERE username=?",
-                (username,)
-            )
-
-            user = cursor.fetchone()
-            conn.close()
+            user = auth.authenticate(username, password)
 
             if user:
-                user_id, stored_password, role = user
-                if verify_password(password, stored_password):
-                    st.session_state.logged_in = True
-                    st.session_state.username = username
-                    st.session_state.role = role
-                    st.session_state.user_id = user_id
-                    st.success("Login Successful")
-                    st.rerun()
-                else:
-                    st.error("Invalid Credentials")
+                user_id, role = user
+                audit.log("Successful Login (Web)", username)
+                st.session_state.logged_in = True
+                st.session_state.username = username
+                st.session_state.role = role
+                st.session_state.user_id = user_id
+                st.success("Login Successful")
+                st.rerun()
             else:
-                st.error("User Not Found")
+                # Same message for unknown users and wrong passwords
+                audit.log("Failed Login Attempt (Web)", username)
+                st.error("Invalid Credentials")
 
     # ---------------- REGISTER ----------------
     with tab2:
@@ -87,22 +129,16 @@ if not st.session_state.logged_in:
             if not new_user or not new_pass:
                 st.warning("All fields required")
             else:
-                hashed = hash_password(new_pass)
+                import auth
 
-                conn = get_connection()
-                cursor = conn.cursor()
+                hashed = auth.hash_password(new_pass)
 
                 try:
-                    cursor.execute(
-                        "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                        (new_user, hashed, role)
-                    )
-                    conn.commit()
+                    write_queue.run(repository.create_user, new_user, hashed, role)
+                    audit.log("User Registered (Web)", new_user)
                     st.success("User Registered Successfully")
                 except sqlite3.IntegrityError:
                     st.error("Username already exists")
-                finally:
-                    conn.close()
 
 # =========================================================
 # ================= AFTER LOGIN ===========================
@@ -133,39 +169,37 @@ else:
                 if description.strip() == "":
                     st.warning("Description required")
                 else:
-                    conn = get_connection()
-                    cursor = conn.cursor()
-
-                    cursor.execute("""
-                        INSERT INTO tickets (user_id, category, description, priority, status)
-                        VALUES (?, ?, ?, ?, 'Open')
-                    """, (
+                    ticket_id = shards.create_ticket(
                         st.session_state.user_id,
                         category,
                         description,
                         priority
-                    ))
-
-                    conn.commit()
-                    conn.close()
+                    )
+                    invalidate_ticket_reads(st.session_state.user_id, "Open")
+                    audit.log("Ticket Created", st.session_state.username, ticket_id=ticket_id)
                     st.success("Ticket Created Successfully")
 
+                    similar = shards.similar_tickets(description, exclude_id=ticket_id)
+                    if similar:
+                        st.warning(
+                            "This looks like a duplicate of ticket(s) "
+                            + ", ".join(str(row[0]) for row in similar)
+                        )
+
         elif menu == "View My Tickets":
             st.subheader("📋 My Tickets")
 
-            conn = get_connection()
-            df = pd.read_sql_query("""
-                SELECT ticket_id, category, description, priority, status
-                FROM tickets WHERE user_id=?
-            """, conn, params=(st.session_state.user_id,))
-            conn.close()
+            tickets = cached_tickets_for_user(st.session_state.user_id)
 
-            if df.empty:
+            if not tickets:
                 st.info("No Tickets Found")
             else:
-                st.dataframe(df, use_container_width=True)
+                st.markdown(tables.markdown_table(
+                    tickets, ["ticket_id", "category", "description", "priority", "status"]
+                ))
 
         elif menu == "Logout":
+            audit.log(f"{st.session_state.role} Logout", st.session_state.username)
             st.session_state.clear()
             st.rerun()
 
@@ -177,20 +211,86 @@ else:
 
         menu = st.sidebar.radio(
             "Admin Menu",
-            ["View All Tickets", "Update Status", "Statistics", "Export CSV", "Logout"]
+            ["View All Tickets", "Search Tickets", "Update Status", "Dispatch", "Duplicates", "Statistics", "Trends", "Export CSV", "Diagnostics", "Logout"]
         )
 
         if menu == "View All Tickets":
             st.subheader("📊 All Tickets")
 
-            conn = get_connection()
-            df = pd.read_sql_query("SELECT * FROM tickets", conn)
-            conn.close()
-
-            if df.empty:
+            col1, col2, col3, col4, col5 = st.columns(5)
+            status = col1.selectbox("Status", ["All", *repository.STATUSES])
+            priority = col2.selectbox("Priority", ["All", *repository.PRIORITIES])
+            category = col3.text_input("Category").strip()
+            user_id = col4.number_input("User ID (0 = all)", min_value=0, step=1)
+            page_size = col5.selectbox("Page Size", [25, 50, 100, 200], index=1)
+            include_archived = st.checkbox("Include archived tickets")
+
+            filters = {
+                "status": None if status == "All" else status,
+                "priority": None if priority == "All" else priority,
+                "category": category or None,
+                "user_id": int(user_id) or None,
+                "include_archived": include_archived,
+            }
+
+            # Changing a filter starts again from the first page
+            page_key = (tuple(filters.items()), page_size)
+            if st.session_state.get("page_key") != page_key:
+                st.session_state.page_key = page_key
+                st.session_state.page_cursor = (None, None)
+                st.session_state.page_number = 1
+
+            after_id, before_id = st.session_state.page_cursor
+            tickets, has_more = cached_ticket_page(filters, after_id, before_id, page_size)
+
+            if not tickets:
                 st.info("No Tickets Available")
             else:
-                st.dataframe(df, use_container_width=True)
+                st.markdown(tables.markdown_table(tickets, repository.TICKET_COLUMNS))
+
+                has_next = has_more if before_id is None else True
+                has_prev = st.session_state.page_number > 1
+
+                col1, col2, col3 = st.columns([1, 1, 4])
+                if col1.button("⬅ Previous", disabled=not has_prev):
+                    st.session_state.page_cursor = (None, tickets[0][0])
+                    st.session_state.page_number -= 1
+                    st.rerun()
+                if col2.button("Next ➡", disabled=not has_next):
+                    st.session_state.page_cursor = (tickets[-1][0], None)
+                    st.session_state.page_number += 1
+                    st.rerun()
+                col3.caption(f"Page {st.session_state.page_number}")
+
+        elif menu == "Search Tickets":
+            st.subheader("🔎 Search Tickets")
+
+            # text_input reruns on every change, so results follow typing
+            query = st.text_input("Search descriptions and categories")
+            if st.session_state.get("search_query") != query:
+                st.session_state.search_query = query
+                st.session_state.search_page = 1
+
+            if query.strip():
+                results, has_more = shards.search_tickets(
+                    query, page=st.session_state.search_page
+                )
+
+                if not results:
+                    st.info("No Matching Tickets")
+                else:
+                    st.markdown(tables.markdown_table(results, [
+                        "ticket_id", "user_id", "category", "priority", "status", "match"
+                    ]))
+
+                    col1, col2, col3 = st.columns([1, 1, 4])
+                    if col1.button("⬅ Previous", disabled=st.session_state.search_page == 1):
+                        st.session_state.search_page -= 1
+                        st.rerun()
+                    if col2.button("Next ➡", disabled=not has_more):
+                        st.session_state.search_page += 1
+                        st.rerun()
+                    col3.caption(f"Page {st.session_state.search_page}")
 
         elif menu == "Update Status":
             st.subheader("🔄 Update Ticket Status")
@@ -199,67 +299,289 @@ else:
             new_status = st.selectbox("New Status", ["Open", "In Progress", "Closed"])
 
             if st.button("Update"):
-                conn = get_connection()
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    "UPDATE tickets SET status=? WHERE ticket_id=?",
-                    (new_status, ticket_id)
-                )
-
-                conn.commit()
+                ticket = shards.get_ticket(ticket_id)
+                archived = ticket is None
+                if archived:
+                    ticket = shards.get_archived_ticket(ticket_id)
 
-                if cursor.rowcount == 0:
+                if ticket is None:
                     st.error("Ticket Not Found")
+                elif archived and new_status == "Closed":
+                    st.info("Ticket is archived and already Closed")
                 else:
-                    st.success("Ticket Updated")
+                    # Any other status on an archived ticket moves it back
+                    update = shards.reopen_ticket if archived else shards.set_ticket_status
+                    if update(ticket_id, new_status) == 0:
+                        st.error("Ticket Not Found")
+                    else:
+                        invalidate_ticket_reads(ticket[1], ticket[5], new_status)
+                        audit.log(
+                            f"Updated Ticket {ticket_id} to {new_status}",
+                            st.session_state.username,
+                            ticket_id=ticket_id,
+                            status=new_status,
+                        )
+                        st.success("Ticket Reopened from Archive" if archived else "Ticket Updated")
+
+        elif menu == "Dispatch":
+            st.subheader("🧰 Dispatch")
+
+            if st.button("Claim Next Ticket"):
+                ticket = shards.claim_next(st.session_state.username)
+                if ticket is None:
+                    st.info("No Open Tickets Waiting")
+                else:
+                    ticket_id, user_id, category, description, priority, _ = ticket
+                    invalidate_ticket_reads(user_id, "Open", "In Progress")
+                    audit.log(
+                        f"Claimed Ticket {ticket_id}",
+                        st.session_state.username,
+                        ticket_id=ticket_id,
+                    )
+                    st.success(f"Ticket {ticket_id} is now In Progress and assigned to you")
+                    st.write(f"**[{priority}] {category}** — {description}")
+
+            st.caption(f"{shards.pending()} open tickets waiting; next up:")
+            next_up = [shards.get_ticket(ticket_id) for ticket_id in shards.peek(10)]
+            st.markdown(tables.markdown_table(
+                [ticket for ticket in next_up if ticket is not None], repository.TICKET_COLUMNS
+            ))
+
+        elif menu == "Duplicates":
+            st.subheader("🪞 Duplicate Tickets")
+
+            parent_id = int(st.number_input("Parent Ticket ID", min_value=1))
+            if st.button("Find Duplicates"):
+                st.session_state.duplicate_cluster = (
+                    parent_id, shards.duplicate_cluster(parent_id)
+                )
+
+            # Kept in the session so the merge button survives the rerun
+            found_id, cluster = st.session_state.get("duplicate_cluster", (None, None))
+            if found_id != parent_id:
+                st.caption("Open tickets whose descriptions nearly match the parent's")
+            elif cluster is None:
+                st.error("Ticket Not Found")
+            elif not cluster:
+                st.info("No Open Duplicates Found")
+            else:
+                st.markdown(tables.markdown_table(
+                    [(ticket_id, f"{score:.0%}", status, description)
+                     for ticket_id, score, status, description in cluster],
+                    ["ticket_id", "match", "status", "description"]
+                ))
+                child_ids = st.multiselect(
+                    "Tickets to merge", [row[0] for row in cluster],
+                    default=[row[0] for row in cluster]
+                )
 
-                conn.close()
+                if st.button("Merge and Close", disabled=not child_ids):
+                    merged = shards.merge_tickets(parent_id, child_ids, st.session_state.username)
+                    # The children belong to any number of users
+                    cache.queries.clear()
+                    audit.log(
+                        f"Merged {merged} Tickets into {parent_id}",
+                        st.session_state.username,
+                        ticket_id=parent_id,
+                        merged=merged,
+                    )
+                    del st.session_state.duplicate_cluster
+                    st.success(f"Merged and closed {merged} tickets")
 
         elif menu == "Statistics":
+            import pandas as pd
+
             st.subheader("📈 Ticket Statistics")
 
-            conn = get_connection()
-            cursor = conn.cursor()
+            stats = cached_statistics()
+            counts = stats["status"]
 
-            cursor.execute("SELECT COUNT(*) FROM tickets")
-            total = cursor.fetchone()[0]
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Total", stats["Total"])
+            col2.metric("Open", counts["Open"])
+            col3.metric("In Progress", counts["In Progress"])
+            col4.metric("Closed", counts["Closed"])
+
+            col1, col2 = st.columns(2)
+            col1.caption("By Priority")
+            col1.bar_chart(pd.Series(stats["priority"], dtype="int64"))
+            col2.caption("By Category")
+            col2.bar_chart(pd.Series(stats["category"], dtype="int64"))
+
+            with st.expander("Query Cache"):
+                cache_stats = cache.queries.stats()
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Hits", cache_stats["hits"])
+                col2.metric("Misses", cache_stats["misses"])
+                col3.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+                col4.metric("Entries", cache_stats["entries"])
+                st.caption(
+                    f"{cache_stats['invalidations']} invalidated, "
+                    f"{cache_stats['evictions']} evicted, "
+                    f"TTL {cache.queries.ttl}s, max {cache.queries.max_entries} entries"
+                )
 
-            cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='Open'")
-            open_count = cursor.fetchone()[0]
+        elif menu == "Trends":
+            import pandas as pd
 
-            cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='In Progress'")
-            progress_count = cursor.fetchone()[0]
+            st.subheader("📉 Ticket Trends")
 
-            cursor.execute("SELECT COUNT(*) FROM tickets WHERE status='Closed'")
-            closed_count = cursor.fetchone()[0]
+            # Folds in only the tickets changed since the last refresh; the
+            # charts below read nothing but the rollup tables.
+            shards.refresh_rollups()
 
-            conn.close()
+            col1, col2, col3 = st.columns(3)
+            period = col1.selectbox("Period", list(rollups.PERIODS))
+            since = col2.date_input("Since", value=date.today() - timedelta(days=TREND_DAYS))
+            split = col3.selectbox("Split opened by", ["None", "Category", "Priority"])
 
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Total", total)
-            col2.metric("Open", open_count)
-            col3.metric("In Progress", progress_count)
-            col4.metric("Closed", closed_count)
+            trends = pd.DataFrame(
+                shards.ticket_trends(period, since=since),
+                columns=["Bucket", "Group", "Opened", "Closed", "Mean Hours to Close"],
+            ).set_index("Bucket")
+
+            if trends.empty:
+                st.info("No Tickets in this Range")
+            else:
+                st.caption(f"Opened and closed per {period}")
+                st.line_chart(trends[["Opened", "Closed"]])
+
+                if split != "None":
+                    by_group = pd.DataFrame(
+                        shards.ticket_trends(period, since=since, by=split.lower()),
+                        columns=["Bucket", "Group", "Opened", "Closed", "Mean Hours to Close"],
+                    )
+                    st.caption(f"Opened per {period} by {split.lower()}")
+                    st.line_chart(by_group.pivot(index="Bucket", columns="Group", values="Opened").fillna(0))
+
+                st.caption(f"Mean hours to close per {period}")
+                st.line_chart(trends["Mean Hours to Close"])
+
+                distribution = shards.close_time_distribution(period, since=since)
+                total = sum(distribution.values())
+                st.caption("Time to close")
+                col1, col2 = st.columns(2)
+                col1.bar_chart(pd.Series(distribution, dtype="int64"))
+                col2.dataframe(
+                    pd.DataFrame({
+                        "Time to Close": list(distribution),
+                        "Tickets": list(distribution.values()),
+                        "Share": [f"{count / total:.0%}" if total else "-" for count in distribution.values()],
+                    }),
+                    hide_index=True,
+                    width="stretch",
+                )
 
         elif menu == "Export CSV":
+            import exporter
+
             st.subheader("⬇ Export Tickets")
 
-            conn = get_connection()
-            df = pd.read_sql_query("SELECT * FROM tickets", conn)
-            conn.close()
+            col1, col2, col3 = st.columns(3)
+            status = col1.selectbox("Status", ["All", *repository.STATUSES])
+            file_format = col2.selectbox("Format", ["CSV", "Parquet"])
+            include_archived = col3.checkbox("Include archived")
 
-            if df.empty:
-                st.warning("No Data Available")
+            compress, partition_by = False, None
+            if file_format == "CSV":
+                compress = st.checkbox("Compress (gzip)")
             else:
-                csv = df.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    "Download Report",
-                    csv,
-                    "tickets_report.csv",
-                    "text/csv"
+                partition = st.selectbox("Partition by", ["None", "Status", "Month"])
+                partition_by = None if partition == "None" else partition.lower()
+
+            created_from = created_to = None
+            if st.checkbox("Filter by created date"):
+                col1, col2 = st.columns(2)
+                created_from = col1.date_input("From")
+                created_to = col2.date_input("To")
+
+            filters = {
+                "status": None if status == "All" else status,
+                "created_from": created_from,
+                "created_to": created_to,
+                "include_archived": include_archived,
+            }
+
+            # Only run the export on demand, never on an ordinary rerun
+            if st.button("Prepare Export"):
+                # Rows stream from SQLite into a temp file that spills to disk
+                # once it grows, instead of DataFrame -> str -> bytes copies.
+                report = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+
+                if file_format == "CSV":
+                    count, seconds = exporter.write_csv(report, compress=compress, **filters)
+                    name = "tickets_report.csv.gz" if compress else "tickets_report.csv"
+                    mime = "application/gzip" if compress else "text/csv"
+                elif partition_by is None:
+                    count, seconds = exporter.write_parquet(report, **filters)
+                    name, mime = "tickets_report.parquet", "application/vnd.apache.parquet"
+                else:
+                    # A partitioned dataset is a directory tree; ship it zipped
+                    with tempfile.TemporaryDirectory() as dataset:
+                        count, seconds = exporter.export_parquet_dataset(dataset, partition_by, **filters)
+                        with zipfile.ZipFile(report, "w") as zip_file:
+                            for folder, _, files in os.walk(dataset):
+                                for file in files:
+                                    if file.endswith(".parquet"):
+                                        path = os.path.join(folder, file)
+                                        zip_file.write(path, os.path.relpath(path, dataset))
+                    name, mime = "tickets_parquet.zip", "application/zip"
+
+                if not count:
+                    report.close()
+                    st.warning("No Data Available")
+                else:
+                    # download_button takes bytes, not a spooled file
+                    report.seek(0)
+                    data = report.read()
+                    report.close()
+                    audit.log(f"Exported Tickets to {file_format}", st.session_state.username, rows=count)
+                    rate = exporter.rows_per_second(count, seconds)
+                    st.caption(f"{count} tickets in {seconds:.2f}s ({rate:,.0f} rows/s)")
+                    # No rerun on download, which would drop the prepared file
+                    st.download_button("Download Report", data, name, mime, on_click="ignore")
+
+        elif menu == "Diagnostics":
+            import pandas as pd
+
+            st.subheader("🩺 Diagnostics")
+            st.caption("Collected by this server process since it started")
+
+            st.markdown("**Queries by total time**")
+            st.dataframe(
+                pd.DataFrame(
+                    metrics.statement_summary(limit=25),
+                    columns=["Statement", "Calls", "Total ms", "Mean ms", "Rows"],
+                ),
+                width="stretch",
+            )
+
+            st.markdown("**Operations**")
+            st.dataframe(
+                pd.DataFrame(
+                    metrics.operation_summary(),
+                    columns=["Operation", "Calls", "Total ms", "Mean ms"],
+                ),
+                width="stretch",
+            )
+
+            st.markdown(f"**Slow queries (>= {metrics.SLOW_QUERY_MS:g} ms)**")
+            if metrics.slow_queries:
+                st.dataframe(
+                    pd.DataFrame(list(metrics.slow_queries)[::-1]),
+                    width="stretch",
                 )
+            else:
+                st.info("No slow queries recorded")
+
+            st.download_button(
+                "Download Prometheus Metrics",
+                metrics.render_prometheus(),
+                "metrics.prom",
+                "text/plain",
+            )
 
         elif menu == "Logout":
+            audit.log(f"{st.session_state.role} Logout", st.session_state.username)
             st.session_state.clear()
             st.rerun()
@@ -0,0 +1,148 @@
+import atexit
+import queue
+import threading
+import time
+
+import db
+import metrics
+
+# A batch takes whatever writes queued up while the previous one committed,
+# up to BATCH_SIZE. MAX_WAIT > 0 additionally holds a batch open that long
+# for stragglers, trading single-writer latency for bigger batches.
+BATCH_SIZE = 256
+MAX_WAIT = 0.0
+
+_STOP = object()
+
+
+class WriteQueue:
+    # Serialises every write through one thread. Callers submit a function
+    # (usually a repository writer) and get a Future back; the writer thread
+    # runs a batch of them in a single BEGIN IMMEDIATE transaction, so there
+    # is one commit per batch and no writer ever waits on another's lock.
+    # The functions run with db_name as their default database.
+    def __init__(self, db_name=None, batch_size=BATCH_SIZE, max_wait=MAX_WAIT):
+        self.db_name = db_name or db.current_db()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        # Imported here: concurrent.futures brings in logging, which is most
+        # of the import time of a CLI that starts and exits without writing
+        from concurrent.futures import Future
+
+        future = Future()
+
+        # A write issued from inside another queued write just runs inline,
+        # inside the batch transaction, instead of deadlocking on itself.
+        if threading.current_thread() is self._thread:
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        return self.submit(func, *args, **kwargs).result()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _apply(self, batch):
+        start = time.perf_counter()
+        batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+
+        try:
+            with db.transaction(self.db_name):
+                results = [func(*args, **kwargs) for func, args, kwargs, _ in batch]
+        except Exception:
+            # Something in the batch failed and the whole transaction was
+            # rolled back; replay each write on its own so only the bad one
+            # fails. Failures are rare, so the common path pays nothing.
+            for item in batch:
+                self._apply_one(item)
+        else:
+            for (*_, future), result in zip(batch, results):
+                future.set_result(result)
+
+        metrics.observe(metrics.OPERATION_SECONDS, "write_batch", time.perf_counter() - start)
+
+    def _apply_one(self, item):
+        func, args, kwargs, future = item
+        try:
+            with db.transaction(self.db_name):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def _run(self):
+        with db.using(self.db_name):
+            self._loop()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            self._apply(self._collect(item))
+
+
+# ================= API =================
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(db_name=None):
+    db_name = db_name or db.current_db()
+    with _queues_lock:
+        write_queue = _queues.get(db_name)
+        if write_queue is None:
+            write_queue = _queues[db_name] = WriteQueue(db_name)
+        return write_queue
+
+
+def submit(func, *args, **kwargs):
+    return get_queue().submit(func, *args, **kwargs)
+
+
+def run(func, *args, **kwargs):
+    return get_queue().submit(func, *args, **kwargs).result()
+
+
+def shutdown():
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for write_queue in queues:
+        write_queue.close()
+
+
+atexit.register(shutdown)